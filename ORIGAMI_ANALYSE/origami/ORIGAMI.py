@@ -22,6 +22,7 @@ from copy import deepcopy
 
 # Import libraries
 import gc
+import multiprocessing
 import numpy as np
 import os
 import pandas as pd
@@ -61,6 +62,8 @@ from help import OrigamiHelp as help
 import readers.io_waters_raw as io_waters
 import readers.io_text_files as io_text
 import readers.io_document as io_document
+from readers.io_array_store import ArrayStore
+from readers.io_text_cache import TextCache, set_text_cache
 import processing.spectra as pr_spectra
 import processing.heatmap as pr_heatmap
 import processing.origami_ms as pr_origami
@@ -141,6 +144,13 @@ class ORIGAMI(object):
             os.makedirs(temp_data_folder)
         self.config.temporary_data = temp_data_folder
         
+        # Set shared array store
+        self.array_store = ArrayStore()
+        
+        # Set cache of parsed text files
+        if self.config.text_cache:
+            set_text_cache(TextCache(max_nbytes=self.config.text_cache_size * 1024 * 1024))
+        
 
         # Setup plot style
         self.view.panelPlots.onChangePlotStyle(evt=None)
@@ -1371,25 +1381,63 @@ class ORIGAMI(object):
         if dlg.ShowModal() == wx.ID_OK:
             pathlist = dlg.GetPaths()
             filenames = dlg.GetFilenames()
-            for (filepath, filename) in zip(pathlist,filenames):
-                outcome = self.view.panelMultipleText.onCheckDuplicates(fileName=filename)
-                if outcome: continue
-                # Load data for each file
-                imsData2D, xAxisLabels, yAxisLabels = io_text.text_heatmap_open(path=filepath)
-                imsData1D = np.sum(imsData2D, axis=1).T
-                rtDataY = np.sum(imsData2D, axis=0)
+            dlg.Destroy()
+        else:
+            dlg.Destroy()
+            return
+        
+        # files which are already in the table are skipped
+        file_list = [(filepath, filename) for (filepath, filename) in zip(pathlist, filenames)
+                     if not self.view.panelMultipleText.onCheckDuplicates(fileName=filename)]
+        if len(file_list) == 0:
+            return
+        
+        if self.config.threading:
+            th = threading.Thread(target=self.on_open_multiple_text_2D_fcn, args=(file_list,))
+            th.start()
+        else:
+            self.on_open_multiple_text_2D_fcn(file_list)
+            
+    def on_open_multiple_text_2D_fcn(self, file_list):
+        """
+        Load text heatmaps in pool of processes and add them to the document tree
+        in one go
+        ---
+        file_list : list of (filepath, filename)
+        """
+        tstart = time.clock()
+        wx.CallAfter(self.onThreading, None, ("Loading {} text files...".format(len(file_list)), 4), 
+                     action='updateStatusbar')
+        results = io_text.text_heatmaps_open([filepath for filepath, __ in file_list])
+        if self.config.threading:
+            wx.CallAfter(self.on_add_text_2D_documents, file_list, results, tstart)
+        else:
+            self.on_add_text_2D_documents(file_list, results, tstart)
+    
+    def on_add_text_2D_documents(self, file_list, results, tstart):
+        """
+        Create document for each loaded text heatmap and add all of them with a 
+        single refresh of the document tree and file table
+        """
+        documents_list, errors, missing_labels = [], [], []
+        tempList = self.view.panelMultipleText.filelist
+        tempList.Freeze()
+        try:
+            for (filepath, filename), (__, data, error) in zip(file_list, results):
+                if data is None or error is not None:
+                    errors.append("{}: {}".format(filename, error))
+                    continue
                 
+                imsData2D, xAxisLabels, yAxisLabels = data['zvals'], data['xvals'], data['yvals']
                 # Try to extract labels from the text file
                 if isempty(xAxisLabels) or isempty(yAxisLabels):
                     xAxisLabels, yAxisLabels = "", ""
                     xlabel_start, xlabel_end = "", ""
-                    
-                    msg = "Missing x/y-axis labels for %s! Consider adding x/y-axis to your file to obtain full functionality." % (filename)
-                    dialogs.dlgBox(exceptionTitle='Missing data', 
-                                   exceptionMsg= msg,
-                                   type="Warning")
+                    missing_labels.append(filename)
                 else:
                     xlabel_start, xlabel_end = xAxisLabels[0], xAxisLabels[-1]
+                    # Set XY limits
+                    self.setXYlimitsRMSD2D(xAxisLabels, yAxisLabels)
                 
                 add_dict = {'energy_start':xlabel_start, 
                             'energy_end':xlabel_end,
@@ -1405,37 +1453,53 @@ class ORIGAMI(object):
                 color = self.view.panelMultipleText.on_add_to_table(add_dict, return_color=True)
                 color = convertRGB255to1(color)
                     
-                # Set XY limits
-                self.setXYlimitsRMSD2D(xAxisLabels, yAxisLabels)
                 # Split filename to get path
                 path, __ = os.path.split(filepath)
                 # Add data to document
-                self.docs = documents()  
-                self.docs.title = filename
-                self.docs.path = path
-                self.docs.userParameters = self.config.userParameters
-                self.docs.userParameters['date'] = getTime()
-                self.docs.dataType = 'Type: 2D IM-MS'
-                self.docs.fileFormat = 'Format: Text (.csv/.txt)'
-                self.docs.got2DIMS = True
-                self.docs.IMS2D = {'zvals':imsData2D,
-                                   'xvals':xAxisLabels,
-                                   'xlabels':'Collision Voltage (V)',
-                                   'yvals':yAxisLabels,
-                                   'yvals1D':imsData1D,
-                                   'yvalsRT':rtDataY,
-                                   'ylabels':'Drift time (bins)',
-                                   'cmap':self.config.currentCmap,
-                                   'mask':self.config.overlay_defaultMask,
-                                   'alpha':self.config.overlay_defaultAlpha,
-                                   'min_threshold':0,
-                                   'max_threshold':1,
-                                   'color':color}
-                
-                # Update document
-                self.view.updateRecentFiles(path={'file_type':'Text', 'file_path':path})
-                self.OnUpdateDocument(self.docs, 'document')
-        dlg.Destroy()
+                document = documents()  
+                document.title = filename
+                document.path = path
+                document.userParameters = self.config.userParameters
+                document.userParameters['date'] = getTime()
+                document.dataType = 'Type: 2D IM-MS'
+                document.fileFormat = 'Format: Text (.csv/.txt)'
+                document.got2DIMS = True
+                document.IMS2D = {'zvals':imsData2D,
+                                  'xvals':xAxisLabels,
+                                  'xlabels':'Collision Voltage (V)',
+                                  'yvals':yAxisLabels,
+                                  'yvals1D':data['yvals1D'],
+                                  'yvalsRT':data['yvalsRT'],
+                                  'ylabels':'Drift time (bins)',
+                                  'cmap':self.config.currentCmap,
+                                  'mask':self.config.overlay_defaultMask,
+                                  'alpha':self.config.overlay_defaultAlpha,
+                                  'min_threshold':0,
+                                  'max_threshold':1,
+                                  'color':color}
+                documents_list.append(document)
+        finally:
+            tempList.Thaw()
+        
+        # Update documents
+        if len(documents_list) > 0:
+            self.docs = documents_list[-1]
+            self.view.updateRecentFiles(path={'file_type':'Text', 'file_path':self.docs.path})
+            self.OnUpdateDocuments(documents_list)
+        
+        if len(missing_labels) > 0:
+            msg = "Missing x/y-axis labels for %s! Consider adding x/y-axis to your file to obtain full functionality." % (", ".join(missing_labels))
+            dialogs.dlgBox(exceptionTitle='Missing data', 
+                           exceptionMsg= msg,
+                           type="Warning")
+        if len(errors) > 0:
+            dialogs.dlgBox(exceptionTitle='Could not load files', 
+                           exceptionMsg= "\n".join(errors),
+                           type="Error")
+            
+        tend = time.clock()
+        msg = "Loaded {} text files. It took: {} seconds.".format(len(documents_list), np.round(tend-tstart, 2))
+        self.onThreading(None, (msg, 4), action='updateStatusbar')
               
     def on_extract_2D_from_mass_range(self, extract_type="all"):
         """ extract multiple ions = threaded """
@@ -1851,29 +1915,29 @@ class ORIGAMI(object):
                 kwargs = {'auto_range':self.config.ms_auto_range,
                           'mz_min':xlimits[0], 'mz_max':xlimits[1],
                           'linearization_mode':self.config.ms_linearization_mode}
-                msDict = io_waters.rawMassLynx_MS_bin(filename=str(document.path), function=1, 
-                                                      startScan=startScan, endScan=endScan, 
-                                                      binData=self.config.import_binOnImport, 
-                                                      mzStart=xlimits[0], mzEnd=xlimits[1], # override any settings as this is a accidental extraction 
-                                                      binsize=self.config.ms_mzBinSize,
-                                                      **kwargs)
-                msX, msY = pr_spectra.sum_1D_dictionary(ydict=msDict)
+                msX, msY = io_waters.rawMassLynx_MS_bin(filename=str(document.path), function=1, 
+                                                        startScan=startScan, endScan=endScan, 
+                                                        binData=self.config.import_binOnImport, 
+                                                        mzStart=xlimits[0], mzEnd=xlimits[1], # override any settings as this is a accidental extraction 
+                                                        binsize=self.config.ms_mzBinSize,
+                                                        sum_scans=True,
+                                                        **kwargs)
                 
             xlimits = [np.min(msX), np.max(msX)]
         else:
             kwargs = {'auto_range':self.config.ms_auto_range,
                       'mz_min':xlimits[0], 'mz_max':xlimits[1],
                       'linearization_mode':self.config.ms_linearization_mode}
-            msDict = io_waters.rawMassLynx_MS_bin(filename=str(document.path), 
-                                                  function=1, 
-                                                  startScan=startScan, endScan=endScan, 
-                                                  binData=self.config.import_binOnImport, 
-                                                  mzStart=self.config.ms_mzStart, 
-                                                  mzEnd=self.config.ms_mzEnd, 
-                                                  binsize=self.config.ms_mzBinSize,
-                                                  **kwargs)
+            msX, msY = io_waters.rawMassLynx_MS_bin(filename=str(document.path), 
+                                                    function=1, 
+                                                    startScan=startScan, endScan=endScan, 
+                                                    binData=self.config.import_binOnImport, 
+                                                    mzStart=self.config.ms_mzStart, 
+                                                    mzEnd=self.config.ms_mzEnd, 
+                                                    binsize=self.config.ms_mzBinSize,
+                                                    sum_scans=True,
+                                                    **kwargs)
             
-            msX, msY = pr_spectra.sum_1D_dictionary(ydict=msDict)
             xlimits = [np.min(msX), np.max(msX)]
                                                                             
         # Add data to dictionary
@@ -2260,15 +2324,15 @@ class ORIGAMI(object):
         for counter, item in enumerate(splitlist):
             itemName = "Scans: %s-%s | CV: %s V" % (item[0], item[1], item[2])
             if self.config.binCVdata or scantime == None:
-                msDict = io_waters.rawMassLynx_MS_bin(filename=str(document.path), 
-                                                      function=1, 
-                                                      startScan=item[0], endScan=item[1], 
-                                                      binData=self.config.import_binOnImport, 
-                                                      mzStart=self.config.ms_mzStart, 
-                                                      mzEnd=self.config.ms_mzEnd, 
-                                                      binsize=self.config.ms_mzBinSize,
-                                                      **kwargs)
-                msX, msY = pr_spectra.sum_1D_dictionary(ydict=msDict)
+                msX, msY = io_waters.rawMassLynx_MS_bin(filename=str(document.path), 
+                                                        function=1, 
+                                                        startScan=item[0], endScan=item[1], 
+                                                        binData=self.config.import_binOnImport, 
+                                                        mzStart=self.config.ms_mzStart, 
+                                                        mzEnd=self.config.ms_mzEnd, 
+                                                        binsize=self.config.ms_mzBinSize,
+                                                        sum_scans=True,
+                                                        **kwargs)
                 xlimits = [self.config.ms_mzStart, self.config.ms_mzEnd]   
             elif not self.config.binCVdata and scantime != None:
                 # Mass spectra
@@ -4000,7 +4064,6 @@ class ORIGAMI(object):
         
         if self.docs.dataType == 'Type: MANUAL' and self.docs.gotMultipleMS:
             # Sum all mass spectra into one
-            counter = 0
             # Bin MS data
             binsize = self.config.binMSbinsize
             msBinList = np.arange(self.docs.parameters['startMS'], 
@@ -4008,22 +4071,13 @@ class ORIGAMI(object):
                                   binsize)
             
             msCentre = msBinList[:-1]+(binsize/2)
-            for key in self.docs.multipleMassSpectrum:
-                if counter == 0:
-                    tempArray = pr_spectra.bin_1D(x=self.docs.multipleMassSpectrum[key]['xvals'],
-                                                  y=self.docs.multipleMassSpectrum[key]['yvals'],
-                                                  bins=msBinList)
-                    counter = counter+1
-                else:
-                    msList = pr_spectra.bin_1D(x=self.docs.multipleMassSpectrum[key]['xvals'],
-                                               y=self.docs.multipleMassSpectrum[key]['yvals'],
-                                               bins=msBinList)
-                    tempArray = np.concatenate((tempArray, msList), axis=0)
-                    counter = counter+1
-            # Reshape the list 
-            combMS = tempArray.reshape((len(msList), int(counter)), order='F') 
+            uniform = pr_spectra.check_uniform_bins(msBinList)
             # Sum y-axis data
-            msDataY = np.sum(combMS, axis=1)
+            msDataY = np.zeros(len(msCentre))
+            for key in self.docs.multipleMassSpectrum:
+                pr_spectra.bin_1D(x=self.docs.multipleMassSpectrum[key]['xvals'],
+                                  y=self.docs.multipleMassSpectrum[key]['yvals'],
+                                  bins=msBinList, out=msDataY, uniform=uniform)
             msDataY = pr_spectra.normalize_1D(inputData = msDataY)
             xlimits = self.docs.massSpectrum['xlimits']
             # Add info to document 
@@ -6650,7 +6704,10 @@ class ORIGAMI(object):
         if dlg.ShowModal() == wx.ID_OK:
             saveFileName = dlg.GetPath()          
             # Save
-            io_document.save_py_object(filename=saveFileName, saveFile=document)
+            io_document.save_py_object(filename=saveFileName, saveFile=document,
+                                        policy=self.config.get_compact_storage_policy(),
+                                        external_arrays=self.config.document_external_arrays,
+                                        array_store=self.get_array_store())
             self.view.updateRecentFiles(path={'file_type':'pickle',
                                               'file_path': saveFileName})
             
@@ -6671,7 +6728,10 @@ class ORIGAMI(object):
             if dlg.ShowModal() == wx.ID_OK:
                 saveFileName = dlg.GetPath()          
                 # Save
-                io_document.save_py_object(filename=saveFileName, saveFile=self.documentsDict[document])
+                io_document.save_py_object(filename=saveFileName, saveFile=self.documentsDict[document],
+                                            policy=self.config.get_compact_storage_policy(),
+                                            external_arrays=self.config.document_external_arrays,
+                                            array_store=self.get_array_store())
                 self.view.updateRecentFiles(path={'file_type':'pickle',
                                                   'file_path': saveFileName})
             else: continue
@@ -6692,9 +6752,15 @@ class ORIGAMI(object):
             if dlg.ShowModal() == wx.ID_OK:
                 pathlist = dlg.GetPaths()
                 filenames = dlg.GetFilenames()
+                # open multiple documents concurrently
+                if self.config.threading and len(pathlist) > 1:
+                    th = threading.Thread(target=self.on_open_multiple_documents, args=(pathlist,))
+                    th.start()
+                    return
+                
                 for (file_path, file_name) in zip(pathlist, filenames):
                     tstart = time.clock()
-                    document = openObject(filename=file_path)
+                    document = io_document.open_py_object(filename=file_path)
                     if document is None:
                         self.onThreading(None, ("Could not load {}".format(file_path), 4), action='updateStatusbar')
                         continue
@@ -6707,7 +6773,7 @@ class ORIGAMI(object):
             else: return
         elif file_path != None:
             try:
-                self.loadDocumentData(document=openObject(filename=file_path))
+                self.loadDocumentData(document=io_document.open_py_object(filename=file_path))
             except (ValueError, AttributeError, TypeError, IOError), e:
                 dialogs.dlgBox(exceptionTitle='Failed to load document on load.', 
                                exceptionMsg= str(e),
@@ -6720,54 +6786,100 @@ class ORIGAMI(object):
         else: 
             return
          
-    def loadDocumentData(self, document=None):
+    def on_open_multiple_documents(self, pathlist):
+        """
+        Open documents in worker threads. Each document is added to the document
+        tree as soon as it is opened and only the last one is plotted.
+        """
+        tstart = time.clock()
+        opened = []
+        
+        def on_opened(file_path, document):
+            if document is None:
+                wx.CallAfter(self.onThreading, None, ("Could not load {}".format(file_path), 4), 
+                             action='updateStatusbar')
+                return
+            opened.append(document)
+            wx.CallAfter(self.on_add_opened_document, document, file_path)
+            
+        io_document.open_py_objects(pathlist, callback=on_opened)
+        if len(opened) > 0:
+            wx.CallAfter(self.on_plot_document_data, opened[-1])
+        
+        tend = time.clock()
+        msg = "Opened {} documents. It took: {} seconds.".format(len(opened), np.round(tend-tstart, 2))
+        wx.CallAfter(self.onThreading, None, (msg, 4), action='updateStatusbar')
+        
+    def get_array_store(self):
+        """ Return shared array store if it is enabled """
+        if self.config.document_shared_arrays:
+            return self.array_store
+        return None
+    
+    def on_add_opened_document(self, document, file_path):
+        self.loadDocumentData(document=document, plot=False)
+        self.view.updateRecentFiles(path={'file_type':'pickle',
+                                          'file_path': file_path})
+         
+    def on_plot_document_data(self, document):
+        """
+        Plot MS, 1D, RT and 2D data of the document
+        """
+        if document.gotMS:
+            self.onThreading(None, ("Loaded mass spectra", 4), action='updateStatusbar')
+            msX = document.massSpectrum['xvals']
+            msY = document.massSpectrum['yvals']
+            color = document.lineColour
+            try: xlimits = document.massSpectrum['xlimits']
+            except KeyError: 
+                xlimits = [document.parameters['startMS'],document.parameters['endMS']]
+            if document.dataType != 'Type: CALIBRANT':
+                name_kwargs = {"document":document.title, "dataset": "Mass Spectrum"}
+                self.view.panelPlots.on_plot_MS(msX, msY, xlimits=xlimits, **name_kwargs)
+            else:
+                self.onPlotMSDTCalibration(msX=msX, msY=msY, color=color, xlimits=xlimits,
+                                                 plotType='MS')
+        if document.got1DT:
+            self.onThreading(None, ("Loaded mobiligrams (1D)", 4), action='updateStatusbar')
+            dtX = document.DT['xvals']
+            dtY = document.DT['yvals']
+            xlabel = document.DT['xlabels']
+            color = document.lineColour
+            if document.dataType != 'Type: CALIBRANT':
+                self.view.panelPlots.on_plot_1D(dtX, dtY, xlabel)
+            else:
+                self.onPlotMSDTCalibration(dtX=dtX, dtY=dtY, color=color,
+                                           xlabelDT=xlabel, plotType='1DT')
+        if document.got1RT:
+            self.onThreading(None, ("Loaded chromatograms", 4), action='updateStatusbar')
+            rtX = document.RT['xvals']
+            rtY = document.RT['yvals']
+            xlabel = document.RT['xlabels']
+            color = document.lineColour
+            self.view.panelPlots.on_plot_RT(rtX, rtY, xlabel)
+            
+        if document.got2DIMS:
+            self.onThreading(None, ("Loaded mobiligrams (2D)", 4), action='updateStatusbar')
+            dataOut = self.get2DdataFromDictionary(dictionary=document.IMS2D,
+                                                             dataType='plot',
+                                                             compact=True)
+            self.view.panelPlots.on_plot_2D_data(data=dataOut)
+            
+    def loadDocumentData(self, document=None, plot=True):
         """
         Function to iterate over the whole document to ensure complete loading of the data
         Once document is re-loaded, data and GUI are restored to appropriate format
+        ---
+        plot : plot data of the document
         """
         if document != None:
             idName = document.title
             self.documentsDict[idName] = document
-             
-            if document.gotMS:
-                self.onThreading(None, ("Loaded mass spectra", 4), action='updateStatusbar')
-                msX = document.massSpectrum['xvals']
-                msY = document.massSpectrum['yvals']
-                color = document.lineColour
-                try: xlimits = document.massSpectrum['xlimits']
-                except KeyError: 
-                    xlimits = [document.parameters['startMS'],document.parameters['endMS']]
-                if document.dataType != 'Type: CALIBRANT':
-                    name_kwargs = {"document":document.title, "dataset": "Mass Spectrum"}
-                    self.view.panelPlots.on_plot_MS(msX, msY, xlimits=xlimits, **name_kwargs)
-                else:
-                    self.onPlotMSDTCalibration(msX=msX, msY=msY, color=color, xlimits=xlimits,
-                                                     plotType='MS')
-            if document.got1DT:
-                self.onThreading(None, ("Loaded mobiligrams (1D)", 4), action='updateStatusbar')
-                dtX = document.DT['xvals']
-                dtY = document.DT['yvals']
-                xlabel = document.DT['xlabels']
-                color = document.lineColour
-                if document.dataType != 'Type: CALIBRANT':
-                    self.view.panelPlots.on_plot_1D(dtX, dtY, xlabel)
-                else:
-                    self.onPlotMSDTCalibration(dtX=dtX, dtY=dtY, color=color,
-                                               xlabelDT=xlabel, plotType='1DT')
-            if document.got1RT:
-                self.onThreading(None, ("Loaded chromatograms", 4), action='updateStatusbar')
-                rtX = document.RT['xvals']
-                rtY = document.RT['yvals']
-                xlabel = document.RT['xlabels']
-                color = document.lineColour
-                self.view.panelPlots.on_plot_RT(rtX, rtY, xlabel)
-                
-            if document.got2DIMS:
-                self.onThreading(None, ("Loaded mobiligrams (2D)", 4), action='updateStatusbar')
-                dataOut = self.get2DdataFromDictionary(dictionary=document.IMS2D,
-                                                                 dataType='plot',
-                                                                 compact=True)
-                self.view.panelPlots.on_plot_2D_data(data=dataOut)
+            if self.config.document_shared_arrays:
+                self.array_store.update_document(document)
+            
+            if plot:
+                self.on_plot_document_data(document)
             
             # Restore ion list
             if (any([document.gotExtractedIons, document.got2DprocessIons, 
@@ -6919,6 +7031,18 @@ class ORIGAMI(object):
                    
     def OnUpdateDocument(self, document, expand_item='document', expand_item_title=None):
         
+        # share heatmaps which were copied between documents
+        if self.config.document_shared_arrays:
+            self.array_store.update_document(document)
+            
+        # index dataset which was extracted or changed
+        expand_item_groups = {'ions':'IMS2Dions', 'combined_ions':'IMS2DCombIons', 
+                              'processed_ions':'IMS2DionsProcess', 'ions_1D':'multipleDT', 
+                              'comparison_data':'IMS2DcompData', 'mass_spectra':'multipleMassSpectrum', 
+                              'overlay':'IMS2DoverlayData'}
+        if expand_item_title is not None and expand_item in expand_item_groups:
+            document.get_index().add(expand_item_groups[expand_item], expand_item_title)
+        
         if expand_item == 'document':
             self.view.panelDocuments.topP.documents.addDocument(docData=document, 
                                                                 expandItem=document)
@@ -6978,7 +7102,7 @@ class ORIGAMI(object):
                                                                     expandItem=document.IMS2DoverlayData[expand_item_title])
         # just set data
         elif expand_item == 'no_refresh':
-            self.view.panelDocuments.topP.documents.setDocument(document_old=self.documentsDict[document.title], 
+            self.view.panelDocuments.topP.documents.setDocument(document_old=self.documentsDict[document.title],
                                                                 document_new=document)
             
         
@@ -6986,6 +7110,28 @@ class ORIGAMI(object):
         self.documentsDict[document.title] = document
         self.currentDoc = document.title
                 
+    def OnUpdateDocuments(self, documents_list):
+        """
+        Add multiple documents to the document tree, which is only refreshed once
+        """
+        if len(documents_list) == 0:
+            return
+        
+        tree = self.view.panelDocuments.topP.documents
+        tree.Freeze()
+        try:
+            for document in documents_list:
+                if self.config.document_shared_arrays:
+                    self.array_store.update_document(document)
+                tree.addDocument(docData=document, refresh=False)
+                self.documentsDict[document.title] = document
+            
+            # highlight and expand the last document
+            tree.on_enable_document(loadingData=True, evt=None)
+            self.currentDoc = documents_list[-1].title
+        finally:
+            tree.Thaw()
+        
     def onAddBlankDocument(self, evt, document_type=None):
         """
         Adds blank document of specific type
@@ -7158,6 +7304,8 @@ class ORIGAMI(object):
         
         
 if __name__ == '__main__':
+    # text files are loaded in pool of processes
+    multiprocessing.freeze_support()
     app = ORIGAMI(redirect=False)
     app.start()
     
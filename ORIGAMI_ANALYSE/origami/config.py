@@ -70,6 +70,21 @@ class OrigamiConfig:
         self.import_duplicate_action = "merge"
         self.import_duplicate_ask = False
 
+        # compact document storage (see readers.io_compact)
+        self.document_compact_storage = False
+        self.document_compact_float32 = True
+        self.document_compact_axis = True
+        self.document_compact_sparse = True
+        self.document_compact_sparse_density = 0.25
+        # large arrays are saved next to the document (in .arrays directory) and loaded when needed, so 
+        # documents open with their metadata only
+        self.document_external_arrays = True
+        # heatmaps copied between documents are shared (and saved once in the array store)
+        self.document_shared_arrays = False
+        # parsed text files are cached in the user cache directory (size in MB)
+        self.text_cache = True
+        self.text_cache_size = 1024
+
         self.watermark = '<p><span style="color: #808080;">This document was generated using ORIGAMI (v. {}) which is an Open-Source software for the analysis of MS and IM-MS datasets. If you would like more information, have a look <a href="https://doi.org/10.1016/j.ijms.2017.08.014">here</a> and to download it for free, have a look <a href="https://github.com/lukasz-migas/ORIGAMI/releases">here</a>.</span></p>'.format(self.version)
         # Populate GUI
         self.overlayChoices = sorted(["Mask", "Transparent", "RGB", "Mean",
@@ -1270,6 +1285,16 @@ class OrigamiConfig:
                 else:
                     self.plot2D_smooth_window = self.plot2D_smooth_polynomial + 2
 
+    def get_compact_storage_policy(self):
+        """ Return compact storage policy or None if it is disabled """
+        if not self.document_compact_storage:
+            return None
+
+        return {'float32': self.document_compact_float32,
+                'axis': self.document_compact_axis,
+                'sparse': self.document_compact_sparse,
+                'sparse_density': self.document_compact_sparse_density}
+
     def initilizeColormaps(self):
         self.colormapMode = 0
 
@@ -1553,6 +1578,15 @@ class OrigamiConfig:
         buff += '    <param name="overlay_usedProcessed" value="%s" type="bool" />\n' % (bool(self.overlay_usedProcessed))
         buff += '    <param name="import_duplicate_action" value="%s" type="unicode" choices="%s" />\n' % (self.import_duplicate_action, ["override", "merge", "duplicate"])
         buff += '    <param name="import_duplicate_ask" value="%s" type="bool" />\n' % (bool(self.import_duplicate_ask))
+        buff += '    <param name="document_compact_storage" value="%s" type="bool" />\n' % (bool(self.document_compact_storage))
+        buff += '    <param name="document_compact_float32" value="%s" type="bool" />\n' % (bool(self.document_compact_float32))
+        buff += '    <param name="document_compact_axis" value="%s" type="bool" />\n' % (bool(self.document_compact_axis))
+        buff += '    <param name="document_compact_sparse" value="%s" type="bool" />\n' % (bool(self.document_compact_sparse))
+        buff += '    <param name="document_compact_sparse_density" value="%.2f" type="float" />\n' % (float(self.document_compact_sparse_density))
+        buff += '    <param name="document_external_arrays" value="%s" type="bool" />\n' % (bool(self.document_external_arrays))
+        buff += '    <param name="document_shared_arrays" value="%s" type="bool" />\n' % (bool(self.document_shared_arrays))
+        buff += '    <param name="text_cache" value="%s" type="bool" />\n' % (bool(self.text_cache))
+        buff += '    <param name="text_cache_size" value="%d" type="int" />\n' % (int(self.text_cache_size))
         buff += '  </presets_gui>\n\n'
 
         # Plot sizes in GUI
@@ -1,4 +1,234 @@
-from collections import OrderedDict
+from collections import OrderedDict, Mapping
+from natsort import natsorted
+
+# version of the document format, increment when migration is added (see readers.io_migrations)
+DOCUMENT_SCHEMA_VERSION = 2
+
+# attributes of the document which hold datasets. Value is True if the attribute
+# is a collection of named datasets and False if it is a single dataset
+DATASET_GROUPS = OrderedDict([('massSpectrum', False),
+                              ('smoothMS', False),
+                              ('multipleMassSpectrum', True),
+                              ('DT', False),
+                              ('multipleDT', True),
+                              ('RT', False),
+                              ('multipleRT', True),
+                              ('IMS2D', False),
+                              ('IMS2Dprocess', False),
+                              ('IMS2Dions', True),
+                              ('IMS2DionsProcess', True),
+                              ('IMS1DdriftTimes', True),
+                              ('DTMZ', False),
+                              ('DTMZions', True),
+                              ('IMSRTCombIons', True),
+                              ('IMS2DCombIons', True),
+                              ('IMS2DcompData', True),
+                              ('IMS2DoverlayData', True),
+                              ('IMS2DstatsData', True),
+                              ('other_data', True),
+                              ('tandem_spectra', True),
+                              ])
+
+# labels of the dataset groups as they are shown in the document tree
+DATASET_LABELS = OrderedDict([('massSpectrum', 'Mass Spectrum'),
+                              ('smoothMS', 'Mass Spectrum (processed)'),
+                              ('multipleMassSpectrum', 'Mass Spectra'),
+                              ('DT', 'Drift time (1D)'),
+                              ('multipleDT', 'Drift time (1D, EIC)'),
+                              ('RT', 'Chromatogram'),
+                              ('multipleRT', 'Chromatograms (EIC)'),
+                              ('IMS2D', 'Drift time (2D)'),
+                              ('IMS2Dprocess', 'Drift time (2D, processed)'),
+                              ('IMS2Dions', 'Drift time (2D, EIC)'),
+                              ('IMS2DionsProcess', 'Drift time (2D, processed, EIC)'),
+                              ('IMS1DdriftTimes', 'Drift time (1D, EIC, DT-IMS)'),
+                              ('DTMZ', 'DT/MS'),
+                              ('DTMZions', 'DT/MS (EIC)'),
+                              ('IMSRTCombIons', 'Chromatograms (combined voltages, EIC)'),
+                              ('IMS2DCombIons', 'Drift time (2D, combined voltages, EIC)'),
+                              ('IMS2DcompData', 'Input data'),
+                              ('IMS2DoverlayData', 'Overlay'),
+                              ('IMS2DstatsData', 'Statistical'),
+                              ('other_data', 'Annotated data'),
+                              ('tandem_spectra', 'Tandem Mass Spectra'),
+                              ])
+
+# dataset groups of the document tree labels
+DATASET_ATTRIBUTES = OrderedDict([(label, attribute) for attribute, label in DATASET_LABELS.items()])
+
+# order in which the main array of dataset is looked for
+_PRIMARY_KEYS = ['zvals', 'yvals', 'xvals']
+
+
+def is_dataset(value):
+    """ Dataset dictionary, either dict or LazyDataset (see readers.io_compact) """
+    return isinstance(value, Mapping)
+
+
+def get_raw_values(dataset):
+    """ Dictionary which holds values of the dataset, lazy values are not loaded """
+    if isinstance(dataset, dict):
+        return dataset
+    return dataset.data
+
+
+def _get_nbytes(value):
+    """ Size of all arrays in the (nested) dataset, without loading lazy values """
+    if is_dataset(value):
+        return sum([_get_nbytes(item) for item in get_raw_values(value).values()])
+    return getattr(value, 'nbytes', 0)
+
+
+class DocumentIndex():
+    """
+    Index of all datasets in the document. Each entry holds the dataset path,
+    type, shape, dtype, size in bytes and tags so the document tree and tables
+    do not need to walk the document. Queries only read the entries; the index
+    is updated by the code which adds, removes, renames or edits datasets (add,
+    remove and rename). The whole index is only built (refresh) when the document
+    is opened or migrated.
+    """
+    
+    def __init__(self, document):
+        self.document = document
+        self.entries = OrderedDict()
+        self._sorted_names = {}
+        
+        for attribute in DATASET_GROUPS:
+            self.entries[attribute] = OrderedDict()
+            
+    def _get_group(self, attribute):
+        group = getattr(self.document, attribute, None)
+        if not is_dataset(group):
+            return {}
+        
+        if DATASET_GROUPS[attribute]:
+            return group
+        # single datasets are stored under empty name
+        if len(group) == 0:
+            return {}
+        return {'': group}
+    
+    def _make_entry(self, attribute, name, dataset):
+        shape, dtype = (), None
+        values = get_raw_values(dataset)
+        for key in _PRIMARY_KEYS:
+            if key in values:
+                array = values[key]
+                shape = getattr(array, 'shape', (len(array),) if hasattr(array, '__len__') else ())
+                dtype = getattr(array, 'dtype', None)
+                break
+            
+        tags = {'label': values.get('label', ""),
+                'charge': values.get('charge', ""),
+                'unidec': 'unidec' in values,
+                'annotations': len(values.get('annotations', None) or [])}
+        
+        return {'path': (attribute, name),
+                'type': DATASET_LABELS[attribute],
+                'shape': tuple(shape),
+                'dtype': str(dtype) if dtype is not None else "",
+                'nbytes': _get_nbytes(dataset),
+                'tags': tags}
+    
+    def add(self, attribute, name=''):
+        """ Add or update single dataset, e.g. after its label was changed """
+        dataset = self._get_group(attribute).get(name, None)
+        if not is_dataset(dataset):
+            return self.remove(attribute, name)
+        
+        if name not in self.entries[attribute]:
+            self._sorted_names.pop(attribute, None)
+        self.entries[attribute][name] = self._make_entry(attribute, name, dataset)
+        
+    def remove(self, attribute, name=''):
+        """ Remove single dataset """
+        if name in self.entries[attribute]:
+            del self.entries[attribute][name]
+            self._sorted_names.pop(attribute, None)
+            
+    def rename(self, attribute, name, new_name):
+        """ Move entry of renamed dataset """
+        self.remove(attribute, name)
+        self.add(attribute, new_name)
+        
+    def sync(self):
+        """ 
+        Add entries of datasets which were added and remove entries of datasets
+        which were removed without the index being told. Entries of datasets
+        which are already indexed are not rebuilt
+        """
+        for attribute in DATASET_GROUPS:
+            group = self._get_group(attribute)
+            entries = self.entries[attribute]
+            if len(group) == len(entries) and all([name in group for name in entries]):
+                continue
+            for name in [name for name in entries if name not in group]:
+                self.remove(attribute, name)
+            for name in [name for name in group if name not in entries]:
+                self.add(attribute, name)
+            
+    def refresh(self, attribute=None):
+        """ 
+        Rebuild entries of the group from the document
+        ---
+        attribute : name of the group, if None, all groups are rebuilt
+        """
+        if attribute is None:
+            attributes = DATASET_GROUPS.keys()
+        else:
+            attributes = [attribute]
+            
+        for attribute in attributes:
+            entries = OrderedDict()
+            for name, dataset in self._get_group(attribute).iteritems():
+                if is_dataset(dataset):
+                    entries[name] = self._make_entry(attribute, name, dataset)
+            self.entries[attribute] = entries
+            self._sorted_names.pop(attribute, None)
+
+    def get_names(self, attribute, sort=True):
+        """ Return (naturally sorted) names of datasets in the group """
+        if not sort:
+            return self.entries[attribute].keys()
+        if attribute not in self._sorted_names:
+            self._sorted_names[attribute] = natsorted(self.entries[attribute].keys())
+        return self._sorted_names[attribute]
+    
+    def get_entry(self, attribute, name=''):
+        return self.entries[attribute].get(name, None)
+    
+    def get_dataset(self, attribute, name=''):
+        """ Return dataset without walking the document """
+        if not DATASET_GROUPS[attribute]:
+            return getattr(self.document, attribute)
+        if name not in self.entries[attribute]:
+            return None
+        return getattr(self.document, attribute)[name]
+    
+    def find(self, name=None, attribute=None, **tags):
+        """
+        Search for datasets
+        ---
+        name : part of the dataset name
+        attribute : name of the group
+        tags : tags of the dataset, e.g. charge=2
+        """
+        attributes = [attribute] if attribute is not None else self.entries.keys()
+        
+        found = []
+        for attribute in attributes:
+            for entry_name, entry in self.entries[attribute].iteritems():
+                if name is not None and name not in entry_name:
+                    continue
+                if any([entry['tags'].get(tag, None) != value for tag, value in tags.iteritems()]):
+                    continue
+                found.append(entry)
+        return found
+    
+    def get_nbytes(self):
+        return sum([entry['nbytes'] for group in self.entries.values() for entry in group.values()])
+
 
 class document():
     """
@@ -9,6 +239,7 @@ class document():
         
         # File info
         self.docVersion = "19-10-2018" # to keep track of new features: add as date: DD-MM-YYYY
+        self.schema_version = DOCUMENT_SCHEMA_VERSION
         
         self.last_saved = None # added in 19-10-2018 / v1.2.1
         self.title = ''
@@ -24,6 +255,10 @@ class document():
         
         self.saveHMTLpath = ''         
         
+        # compact storage policy used when saving document (see readers.io_compact)
+        # None = arrays are saved as they are 
+        self.compact_storage = None
+        
         # mass spectrum
         self.gotMS = False
         self.massSpectrum = {}
@@ -122,4 +357,19 @@ class document():
         self.colormap  = 'inferno'
         self.plot2Dtype = 'contour' # contour/imshow
         self.visible = True
+        
+    def get_index(self):
+        """ Return index of datasets in the document """
+        index = self.__dict__.get('_index', None)
+        if index is None:
+            index = DocumentIndex(self)
+            index.refresh()
+            self._index = index
+        return index
+    
+    def __getstate__(self):
+        # index is rebuilt when needed 
+        state = self.__dict__.copy()
+        state.pop('_index', None)
+        return state
     
\ No newline at end of file
@@ -29,6 +29,7 @@ from copy import deepcopy
 from natsort import natsorted
 
 from dialogs import panelRenameItem, panelSelectDataset, dlgBox
+from document import DATASET_ATTRIBUTES, DATASET_GROUPS
 from gui_elements.dialog_askOverride import dialogAskOverride
 from panelAnnotatePeaks import panelAnnotatePeaks
 from panelCompareMS import panelCompareMS
@@ -36,11 +37,12 @@ from panelInformation import panelDocumentInfo
 from panelTandemSpectra import panelTandemSpectra
 from ids import *
 from toolbox import (str2num, saveAsText, convertRGB255to1, randomIntegerGenerator,
-                             randomColorGenerator, convertRGB1to255, str2int, convertHEXtoRGB1,
-                             merge_two_dicts, determineFontColor, _replace_labels)
+                             randomColorGenerator, convertRGB1to255, str2int,
+                             merge_two_dicts, determineFontColor)
 import dialogs as dialogs
 from processing.spectra import normalize_1D, subtract_1D
 from readers.io_text_files import text_heatmap_open
+from readers.io_annotated_text_files import MetaTextReader
 from styles import makeMenuItem
 import readers.io_mgf as io_mgf
 import readers.io_mzid as io_mzid
@@ -657,261 +659,21 @@ class documentsTree(wx.TreeCtrl):
         self.presenter.OnUpdateDocument(document, 'document')
 
     def onLoadOtherData(self, fname):
-        if fname.endswith(".csv"):
-            df = pd.read_csv(fname, sep=',', engine='python', header=None)
-        elif fname.endswith(".txt"):
-            df = pd.read_csv(fname, sep='\t', engine='python', header=None)
-
-        title = os.path.basename(fname)
-        plot_type = "multi-line"
-        plot_modifiers = {}
-        if "title" in list(df.iloc[:, 0]):
-            idx = list(df.iloc[:, 0]).index("title")
-            title = list(df.iloc[idx, 1::])[0]
-
-        row_labels = list(df.iloc[:, 0])
-        if "plot_type" in row_labels:
-            idx = row_labels.index("plot_type")
-            plot_type = list(df.iloc[idx, 1::])[0]
-
-        if "x_label" in row_labels:
-            idx = row_labels.index("x_label")
-            x_label = list(df.iloc[idx, 1::])[0]
-        else: x_label = ""
-
-        if "y_label" in row_labels:
-            idx = row_labels.index("y_label")
-            y_label = list(df.iloc[idx, 1::])[0]
-        else: y_label = ""
-
-        if "x_unit" in row_labels:
-            idx = row_labels.index("x_unit")
-            x_unit = list(df.iloc[idx, 1::])[0]
-        else: x_unit = ""
-
-        if "y_unit" in row_labels:
-            idx = row_labels.index("y_unit")
-            y_unit = list(df.iloc[idx, 1::])[0]
-        else: y_unit = ""
-
-        if "order" in row_labels:
-            idx = row_labels.index("order")
-            order = list(df.iloc[idx, 1::])
-        else: order = []
-
-        if "label" in row_labels:
-            idx = row_labels.index("label")
-            labels = list(df.iloc[idx, 1::].dropna())
-        elif "labels" in row_labels:
-            idx = row_labels.index("labels")
-            labels = list(df.iloc[idx, 1::].dropna())
-        else: labels = []
-
-        if "x_labels" in row_labels:
-            idx = row_labels.index("x_labels")
-            x_labels = list(df.iloc[idx, 1::].dropna())
-        else: x_labels = []
-
-        if "y_labels" in row_labels:
-            idx = row_labels.index("y_labels")
-            y_labels = list(df.iloc[idx, 1::].dropna())
-        else: y_labels = []
-
-        if "xlimits" in row_labels:
-            idx = row_labels.index("xlimits")
-            xlimits = list(df.iloc[idx, 1:3].dropna().astype('float32'))
-        else: xlimits = [None, None]
-
-        if "ylimits" in row_labels:
-            idx = row_labels.index("ylimits")
-            ylimits = list(df.iloc[idx, 1:3].dropna().astype('float32'))
-        else: ylimits = [None, None]
-
-        if "color" in row_labels:
-            idx = row_labels.index("color")
-            colors = list(df.iloc[idx, 1::].dropna())
-        elif "colors" in row_labels:
-            idx = row_labels.index("colors")
-            colors = list(df.iloc[idx, 1::].dropna())
-        else: colors = []
-
-        if "column_type" in row_labels:
-            idx = row_labels.index("column_type")
-            column_types = list(df.iloc[idx, 1::].dropna())
-        else: column_types = []
-
-        if "legend_labels" in row_labels:
-            idx = row_labels.index("legend_labels")
-            legend_labels = list(df.iloc[idx, 1::].dropna())
-        else: legend_labels = []
-
-        if "legend_colors" in row_labels:
-            idx = row_labels.index("legend_colors")
-            legend_colors = list(df.iloc[idx, 1::].dropna())
-        else: legend_colors = []
-
-        if "hover_labels" in row_labels:
-            idx = row_labels.index("hover_labels")
-            hover_labels = list(df.iloc[idx, 1::].dropna())
-        else: hover_labels = []
-
-        plot_modifiers.update(legend_labels=legend_labels, legend_colors=legend_colors,
-                              xlimits=xlimits, ylimits=ylimits)
-        xvals, yvals, zvals, xvalsErr, yvalsErr, itemColors, itemLabels = [], [], [], [], [], [], []
-        xyvals, urls = [], []
-        axis_y_min, axis_y_max, axis_note = [], [], []
-        xy_labels = []
-
-        # get first index
-        first_num_idx = pd.to_numeric(df.iloc[:, 0], errors='coerce').notnull().idxmax()
-
-        # check if axis labels have been provided
-        for xy_axis in ["axis_x", "axis_y", "axis_xerr", "axis_yerr", "axis_color", "axis_colors",
-                        "axis_label", "axis_labels", "axis_y_min", "axis_y_max", "axis_xy",
-                        "axis_url"]:
-            if xy_axis in row_labels:
-                idx = row_labels.index(xy_axis)
-                xy_labels = list(df.iloc[idx, :])
-
-        if len(xy_labels) == df.shape[1]:
-            df = df.iloc[first_num_idx:, :]  # [pd.to_numeric(df.iloc[:,0], errors='coerce').notnull()]
-            for i, xy_label in enumerate(xy_labels):
-                if xy_label == "axis_x":
-                    xvals.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y":
-                    yvals.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_xerr":
-                    xvalsErr.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_yerr":
-                    yvalsErr.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y_min":
-                    axis_y_min.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y_max":
-                    axis_y_max.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label in ["axis_xy", "axis_yx"]:
-                    xyvals.append(np.asarray(df.iloc[:, i].dropna().astype('float32')))
-                if xy_label in ["axis_color", "axis_colors"]:
-                    _colors = list(df.iloc[:, i].dropna().astype("str"))
-                    _colorsRGB = []
-                    for _color in _colors:
-                        _colorsRGB.append(convertHEXtoRGB1(str(_color)))
-                    itemColors.append(_colorsRGB)
-                    plot_modifiers['color_items'] = True
-                if xy_label in ["axis_label", "axis_labels"]:
-                    itemLabels.append(list(df.iloc[:, i].replace(np.nan, '', regex=True).astype("str")))
-                    plot_modifiers['label_items'] = True
-                if xy_label == "axis_note":
-                    axis_note.append(np.asarray(df.iloc[:, i].replace(np.nan, '', regex=True).astype('str')))
-                if xy_label == "axis_url":
-                    urls.append(np.asarray(df.iloc[:, i].astype('str')))
-        else:
-            # drop all other non-numeric rows
-            df = df[pd.to_numeric(df.iloc[:, 0], errors='coerce').notnull()]
-            df = df.astype('float32')
+        try:
+            title, other_data = MetaTextReader(fname).extract_data()
+        except ValueError, e:
+            dialogs.dlgBox(exceptionTitle='Error', exceptionMsg=str(e),
+                           type="Error", exceptionPrint=True)
+            return None, None
 
-            # extract x, y and zvals
-            if df.shape[1] >= 2:
-                xvals = list(df.iloc[:, 0])
-            else:
-                return None, None
-
-            if df.shape[1] == 2:
-                yvals = list(df.iloc[:, 1])
-
-            if df.shape[1] > 2:
-                zvals = df.iloc[:, 1::].as_matrix()
-
-            if plot_type in ["multi-line", "waterfall", "scatter", "grid-line", "grid-scatter"]:
-                yvals_new = []
-                for item in xrange(zvals.shape[1]):
-                    yvals_new.append(zvals[:, item])
-
-                # replace
-                xvals = [xvals]
-                yvals = yvals_new
-                zvals = []
-                if len(labels) != len(yvals):
-                    labels = [""] * len(yvals)
-
-        # create combination of x y columns
-        if len(xyvals) > 0:
-            from itertools import product
-            xyproduct = list(product(xyvals, xyvals))
-            xvals, yvals = [], []
-            for iprod in xyproduct:
-                xvals.append(iprod[0])
-                yvals.append(iprod[1])
-            if len(x_labels) == len(xyvals) and len(y_labels) == len(xyvals):
-                xyproduct = list(product(x_labels, y_labels))
-                x_labels, y_labels = [], []
-                for iprod in xyproduct:
-                    x_labels.append(iprod[0])
-                    y_labels.append(iprod[1])
-
-        if plot_type in ["grid-line", "grid-scatter", "grid-mixed"]:
-            n_xvals = len(xvals)
-            n_yvals = len(yvals)
-            n_grid = max([n_xvals, n_yvals])
-            if n_grid in [2]: n_rows, n_cols = 1, 2
-            elif n_grid in [3, 4]: n_rows, n_cols = 2, 2
-            elif n_grid in [5, 6]: n_rows, n_cols = 2, 3
-            elif n_grid in [7, 8, 9]: n_rows, n_cols = 3, 3
-            elif n_grid in [10, 11, 12]: n_rows, n_cols = 3, 4
-            elif n_grid in [13, 14, 15, 16]: n_rows, n_cols = 4, 4
-            elif n_grid in [17, 18, 19, 20, 21, 22, 23, 24, 25]: n_rows, n_cols = 5, 5
-            else:
-                dialogs.dlgBox(exceptionTitle='Error',
-                               exceptionMsg="Cannot plot grid larger than 5 x 5 (25 cells). You have selected {}".format(n_grid),
-                               type="Error", exceptionPrint=True)
-                return
-            plot_modifiers.update(n_grid=n_grid, n_rows=n_rows, n_cols=n_cols)
+        if other_data is None:
+            return None, None
 
         # check if we need to add any metadata
-        if len(colors) == 0 or len(colors) < len(yvals):
-            colors = self.presenter.view.panelPlots.onChangePalette(None,
-                                                                    n_colors=len(yvals),
-                                                                    return_colors=True)
-
-        if len(labels) != len(yvals):
-            labels = [""] * len(yvals)
-
-        msg = "Item {} has: x-columns ({}), x-errors ({}), y-columns ({}), x-errors ({}), ".format(os.path.basename(fname), len(xvals), len(xvalsErr), len(yvals), len(yvalsErr)) + \
-              "labels ({}), colors ({})".format(len(labels), len(colors))
-        print(msg)
-
-        # update title
-        _plot_types = {"multi-line":"Multi-line", "scatter":"Scatter",
-                       "line":"Line", "waterfall":"Waterfall",
-                       "grid-line":"Grid-line", "grid-scatter":"Grid-scatter",
-                       "vertical-bar":"V-bar", "horizontal-bar":"H-bar"}
-
-        title = "{}: {}".format(_plot_types[plot_type], title)
-        other_data = {"plot_type":plot_type,
-                      "xvals":xvals,
-                      "yvals":yvals,
-                      "zvals":zvals,
-                      "xvalsErr":xvalsErr,
-                      "yvalsErr":yvalsErr,
-                      "yvals_min":axis_y_min,
-                      "yvals_max":axis_y_max,
-                      "itemColors":itemColors,
-                      "itemLabels":itemLabels,
-                      "xlabel":_replace_labels(x_label),
-                      "ylabel":_replace_labels(y_label),
-                      "xlimits":xlimits,
-                      "ylimits":ylimits,
-                      "xlabels":x_labels,
-                      "ylabels":y_labels,
-                      "hover_labels":hover_labels,
-                      "x_unit":x_unit,
-                      "y_unit":y_unit,
-                      "colors":colors,
-                      "labels":labels,
-                      "urls":urls,
-                      "column_types":column_types,
-                      "column_order":order,
-                      "path":fname,
-                      "plot_modifiers":plot_modifiers}
+        if len(other_data['colors']) == 0 or len(other_data['colors']) < len(other_data['yvals']):
+            other_data['colors'] = self.presenter.view.panelPlots.onChangePalette(None,
+                                                                                  n_colors=len(other_data['yvals']),
+                                                                                  return_colors=True)
 
         return title, other_data
 
@@ -1171,6 +933,24 @@ class documentsTree(wx.TreeCtrl):
                 if len(self.presenter.documentsDict[currentDoc].calibrationDataset) == 0:
                     self.presenter.documentsDict[currentDoc].gotCalibrationDataset = False
 
+        # Update index of the deleted dataset or group
+        index = document.get_index()
+        attribute = DATASET_ATTRIBUTES.get(self.itemType, None)
+        if attribute is not None:
+            if not DATASET_GROUPS[attribute]:
+                index.add(attribute)
+            elif self.extractData == self.itemType:
+                index.refresh(attribute)
+            else:
+                # item or its annotations/UniDec results were deleted
+                for name in [self.extractData, self.extractParent, self.extractGrandparent]:
+                    if index.get_entry(attribute, name) is not None:
+                        index.add(attribute, name)
+                        break
+        elif self.itemType == "UniDec":
+            index.add('massSpectrum')
+            index.remove('multipleMassSpectrum', 'temporary_unidec')
+
         # Add modified document to the dictionary
         self.presenter.documentsDict[currentDoc] = document
 
@@ -1333,6 +1113,20 @@ class documentsTree(wx.TreeCtrl):
 
         return document, annotations
 
+    def _get_annotated_dataset_path(self, dataset):
+        """ Return group and name of dataset with annotations (see onUpdateAnotations) """
+        if dataset == "Mass Spectrum":
+            return 'massSpectrum', ''
+        elif dataset == "Mass Spectrum (processed)":
+            return 'smoothMS', ''
+        elif "Waterfall (Raw):" in dataset:
+            return 'IMS2DoverlayData', dataset
+        elif ("Multi-line: " in dataset or "V-bar: " in dataset or
+              "H-bar: " in dataset or "Scatter: " in dataset or
+              "Waterfall: " in dataset or "Line: " in dataset):
+            return 'other_data', dataset
+        return 'multipleMassSpectrum', dataset
+
     def onUpdateAnotations(self, annotations, document, dataset, set_data_only=False):
         """
         Update annotations in specified document/dataset
@@ -1375,6 +1169,7 @@ class documentsTree(wx.TreeCtrl):
             item = self.getItemByData(document.multipleMassSpectrum[dataset])
             document.multipleMassSpectrum[dataset]['annotations'] = annotations
             annotation_data = document.multipleMassSpectrum[dataset]['annotations']
+        document.get_index().add(*self._get_annotated_dataset_path(dataset))
 
         if item is not False and not set_data_only:
             self.append_annotation(item, annotation_data)
@@ -1494,6 +1289,7 @@ class documentsTree(wx.TreeCtrl):
             item = self.getItemByData(duplicate_document.multipleMassSpectrum[duplicate_dataset])
             duplicate_document.multipleMassSpectrum[duplicate_dataset]["annotations"] = annotations
             annotation_data = duplicate_document.multipleMassSpectrum[duplicate_dataset]["annotations"]
+        duplicate_document.get_index().add(*self._get_annotated_dataset_path(duplicate_dataset))
 
         if item is not False:
             self.append_annotation(item, annotation_data)
@@ -3323,6 +3119,7 @@ class documentsTree(wx.TreeCtrl):
                 # Change dictionary key
                 self.presenter.documentsDict[title].multipleMassSpectrum[copy_name] = self.presenter.documentsDict[self.title].multipleMassSpectrum[self.extractData].copy()
                 document = self.presenter.documentsDict[title]
+                document.get_index().add('multipleMassSpectrum', copy_name)
                 self.presenter.OnUpdateDocument(document, 'document')
                 self.Expand(docItem)
         elif evtID == ID_docTree_duplicate_document:
@@ -3389,6 +3186,7 @@ class documentsTree(wx.TreeCtrl):
                 docItem.title = new_name
                 parent = self.GetItemParent(docItem)
                 del self.presenter.documentsDict[current_name]
+                self.presenter.array_store.rename(current_name, new_name)
                 self.SetItemText(docItem, new_name)
                 # Change dictionary key
                 self.presenter.OnUpdateDocument(document, 'document')
@@ -3420,6 +3218,7 @@ class documentsTree(wx.TreeCtrl):
                 self.SetItemText(docItem, new_name)
                 # Change dictionary key
                 self.presenter.documentsDict[self.title].IMS2DstatsData[new_name] = self.presenter.documentsDict[self.title].IMS2DstatsData.pop(self.extractData)
+                self.presenter.documentsDict[self.title].get_index().rename('IMS2DstatsData', self.extractData, new_name)
                 self.Expand(docItem)
             elif self.itemType == 'Overlay':
                 # Change document tree
@@ -3428,6 +3227,7 @@ class documentsTree(wx.TreeCtrl):
                 self.SetItemText(docItem, new_name)
                 # Change dictionary key
                 self.presenter.documentsDict[self.title].IMS2DoverlayData[new_name] = self.presenter.documentsDict[self.title].IMS2DoverlayData.pop(self.extractData)
+                self.presenter.documentsDict[self.title].get_index().rename('IMS2DoverlayData', self.extractData, new_name)
                 self.Expand(docItem)
             elif self.itemType == "Mass Spectra":
                 # Change document tree
@@ -3436,6 +3236,7 @@ class documentsTree(wx.TreeCtrl):
                 self.SetItemText(docItem, new_name)
                 # Change dictionary key
                 self.presenter.documentsDict[self.title].multipleMassSpectrum[new_name] = self.presenter.documentsDict[self.title].multipleMassSpectrum.pop(self.extractData)
+                self.presenter.documentsDict[self.title].get_index().rename('multipleMassSpectrum', self.extractData, new_name)
                 self.Expand(docItem)
                 # check if item is in other panels
                 try: self.presenter.view.panelMML.onRenameItem(current_name, new_name, item_type="filename")
@@ -3451,6 +3252,7 @@ class documentsTree(wx.TreeCtrl):
                 # TODO: check if iterm is in the peaklist
                 # Change dictionary key
                 self.presenter.documentsDict[self.title].IMS2Dions[new_name] = self.presenter.documentsDict[self.title].IMS2Dions.pop(self.extractData)
+                self.presenter.documentsDict[self.title].get_index().rename('IMS2Dions', self.extractData, new_name)
                 self.Expand(docItem)
             else:
                 return
@@ -4882,10 +4684,12 @@ class documentsTree(wx.TreeCtrl):
 
         self.panelInfo.Show()
 
-    def addDocument(self, docData, expandAll=False, expandItem=None):
+    def addDocument(self, docData, expandAll=False, expandItem=None, refresh=True):
         """
         Append document to tree
         expandItem : object data, to expand specified item
+        refresh : highlight and expand the document, set False when many documents
+            are added at once and the tree is refreshed afterwards
         """
         # Get title for added data
         title = docData.title
@@ -4900,28 +4704,12 @@ class documentsTree(wx.TreeCtrl):
                 self.Delete(item)
             item, cookie = self.GetNextChild(root, cookie)
 
-        # update document with new attributes
-        if not hasattr(docData, "other_data"):
-            setattr(docData, "other_data", {})
-            print("Added missing attributute ('other_data') to document")
-
-        if not hasattr(docData, "tandem_spectra"):
-            setattr(docData, "tandem_spectra", {})
-            print("Added missing attributute ('tandem_spectra') to document")
-
-        if not hasattr(docData, 'file_reader'):
-            setattr(docData, "file_reader", {})
-            print("Added missing attributute ('file_reader') to document")
+        # documents are updated to latest version when they are opened (see readers.io_migrations)
 
-        if not hasattr(docData, 'app_data'):
-            setattr(docData, "app_data", {})
-            print("Added missing attributute ('app_data') to document")
-
-        if not hasattr(docData, 'last_saved'):
-            setattr(docData, "last_saved", {})
-            print("Added missing attributute ('last_saved') to document")
-
-        # update document to latest version
+        # datasets are listed using the document index. Datasets are indexed by the code
+        # which changes them, sync only picks up datasets which were added or removed elsewhere
+        index = docData.get_index()
+        index.sync()
 
         # Add document
         docItem = self.AppendItem(self.GetRootItem(), title)
@@ -4997,7 +4785,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotMultipleMS == True:
             docIonItem = self.AppendItem(docItem, 'Mass Spectra')
             self.SetItemImage(docIonItem, self.bulets_dict["mass_spec"], wx.TreeItemIcon_Normal)
-            for annotData in docData.multipleMassSpectrum:
+            for annotData in index.get_names('multipleMassSpectrum', sort=False):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.multipleMassSpectrum[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["mass_spec_on"], wx.TreeItemIcon_Normal)
@@ -5039,7 +4827,7 @@ class documentsTree(wx.TreeCtrl):
             if docData.gotMultipleRT == True:
                 docIonItem = self.AppendItem(docItem, 'Chromatograms (EIC)')
                 self.SetItemImage(docIonItem, self.bulets_dict["rt"], wx.TreeItemIcon_Normal)
-                for annotData, __ in natsorted(docData.multipleRT.items()):
+                for annotData in index.get_names('multipleRT'):
                     annotsItem = self.AppendItem(docIonItem, annotData)
                     self.SetPyData(annotsItem, docData.multipleRT[annotData])
                     self.SetItemImage(annotsItem, self.bulets_dict["rt_on"], wx.TreeItemIcon_Normal)
@@ -5053,7 +4841,7 @@ class documentsTree(wx.TreeCtrl):
             if docData.gotMultipleDT == True:
                 docIonItem = self.AppendItem(docItem, 'Drift time (1D, EIC)')
                 self.SetItemImage(docIonItem, self.bulets_dict["drift_time"], wx.TreeItemIcon_Normal)
-                for annotData, __ in natsorted(docData.multipleDT.items()):
+                for annotData in index.get_names('multipleDT'):
                     annotsItem = self.AppendItem(docIonItem, annotData)
                     self.SetPyData(annotsItem, docData.multipleDT[annotData])
                     self.SetItemImage(annotsItem, self.bulets_dict["drift_time_on"], wx.TreeItemIcon_Normal)
@@ -5061,7 +4849,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotExtractedDriftTimes == True:
             docIonItem = self.AppendItem(docItem, 'Drift time (1D, EIC, DT-IMS)')
             self.SetItemImage(docIonItem, self.bulets_dict["drift_time"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS1DdriftTimes.items()):
+            for annotData in index.get_names('IMS1DdriftTimes'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS1DdriftTimes[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["drift_time_on"], wx.TreeItemIcon_Normal)
@@ -5079,14 +4867,14 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotExtractedIons == True:
             docIonItem = self.AppendItem(docItem, 'Drift time (2D, EIC)')
             self.SetItemImage(docIonItem, self.bulets_dict["heatmap"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2Dions.items()):
+            for annotData in index.get_names('IMS2Dions'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2Dions[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
         if docData.gotCombinedExtractedIons == True:
             docIonItem = self.AppendItem(docItem, 'Drift time (2D, combined voltages, EIC)')
             self.SetItemImage(docIonItem, self.bulets_dict["heatmap"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2DCombIons.items()):
+            for annotData in index.get_names('IMS2DCombIons'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2DCombIons[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
@@ -5094,7 +4882,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotCombinedExtractedIonsRT == True:
             docIonItem = self.AppendItem(docItem, 'Chromatograms (combined voltages, EIC)')
             self.SetItemImage(docIonItem, self.bulets_dict["rt"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMSRTCombIons.items()):
+            for annotData in index.get_names('IMSRTCombIons'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMSRTCombIons[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["rt_on"], wx.TreeItemIcon_Normal)
@@ -5102,7 +4890,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.got2DprocessIons == True:
             docIonItem = self.AppendItem(docItem, 'Drift time (2D, processed, EIC)')
             self.SetItemImage(docIonItem, self.bulets_dict["heatmap"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2DionsProcess.items()):
+            for annotData in index.get_names('IMS2DionsProcess'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2DionsProcess[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
@@ -5131,7 +4919,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotComparisonData == True:
             docIonItem = self.AppendItem(docItem, 'Input data')
             self.SetItemImage(docIonItem, self.bulets_dict["overlay"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2DcompData.items()):
+            for annotData in index.get_names('IMS2DcompData'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2DcompData[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
@@ -5139,7 +4927,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotOverlay == True or len(docData.IMS2DoverlayData) > 0:
             docIonItem = self.AppendItem(docItem, 'Overlay')
             self.SetItemImage(docIonItem, self.bulets_dict["overlay"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2DoverlayData.items()):
+            for annotData in index.get_names('IMS2DoverlayData'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2DoverlayData[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
@@ -5147,7 +4935,7 @@ class documentsTree(wx.TreeCtrl):
         if docData.gotStatsData == True:
             docIonItem = self.AppendItem(docItem, 'Statistical')
             self.SetItemImage(docIonItem, self.bulets_dict["overlay"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.IMS2DstatsData.items()):
+            for annotData in index.get_names('IMS2DstatsData'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.IMS2DstatsData[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["heatmap_on"], wx.TreeItemIcon_Normal)
@@ -5161,7 +4949,7 @@ class documentsTree(wx.TreeCtrl):
         if len(docData.other_data) > 0:
             docIonItem = self.AppendItem(docItem, 'Annotated data')
             self.SetItemImage(docIonItem, self.bulets_dict["calibration"], wx.TreeItemIcon_Normal)
-            for annotData, __ in natsorted(docData.other_data.items()):
+            for annotData in index.get_names('other_data'):
                 annotsItem = self.AppendItem(docIonItem, annotData)
                 self.SetPyData(annotsItem, docData.other_data[annotData])
                 self.SetItemImage(annotsItem, self.bulets_dict["calibration_on"], wx.TreeItemIcon_Normal)
@@ -5176,6 +4964,9 @@ class documentsTree(wx.TreeCtrl):
                         self.SetPyData(annotsAnnotItem, docData.other_data[annotData]['annotations'][annotNameData])
                         self.SetItemImage(annotsAnnotItem, self.bulets_dict["annot"], wx.TreeItemIcon_Normal)
 
+        if not refresh:
+            return
+
         # Recursively check currently selected document
         self.on_enable_document(loadingData=True, expandAll=expandAll, evt=None)
 
@@ -5256,6 +5047,9 @@ class documentsTree(wx.TreeCtrl):
                         # delete document
                         del self.presenter.documentsDict[title]
                         self.presenter.currentDoc = None
+                        # release heatmaps shared with other documents
+                        self.presenter.array_store.release(title)
+                        self.presenter.array_store.gc()
                         # go to the next document
                         if len(self.presenter.documentsDict) > 0:
                             self.presenter.currentDoc = self.presenter.documentsDict.keys()[0]
@@ -5524,7 +5318,8 @@ class documentsTree(wx.TreeCtrl):
             print("Created file reader. Loading scans...")
 
             basename = os.path.basename(path)
-            data = reader.get_n_scans(n_scans=50000)
+            # peaks are only parsed when spectrum is shown
+            data = reader.get_n_scans(n_scans=len(reader))
             kwargs = {'data_type':"Type: MS/MS", "file_format":"Format: .mgf"}
             document = self.presenter.on_create_document(basename, path, **kwargs)
 
@@ -5559,7 +5354,8 @@ class documentsTree(wx.TreeCtrl):
             print("Created file reader. Loading scans...")
 
             basename = os.path.basename(path)
-            data = reader.get_n_scans(n_scans=999999)
+            # peaks are only decoded when spectrum is shown
+            data = reader.get_n_scans(n_scans=len(reader))
             kwargs = {'data_type':"Type: MS/MS", "file_format":"Format: .mzML"}
             document = self.presenter.on_create_document(basename, path, **kwargs)
 
@@ -5567,10 +5363,12 @@ class documentsTree(wx.TreeCtrl):
             document.tandem_spectra = data
             document.file_reader = {'data_reader':reader}
 
-            title = "Precursor: {:.4f} [{}]".format(data["Scan 1"]['scan_info']['precursor_mz'],
-                                                    data["Scan 1"]['scan_info']['precursor_charge'])
-            self.presenter.view.panelPlots.on_plot_centroid_MS(data["Scan 1"]['xvals'],
-                                                               data["Scan 1"]['yvals'],
+            # first MS/MS scan (MS1 scans are skipped)
+            spectrum = data[data.keys()[0]]
+            title = "Precursor: {:.4f} [{}]".format(spectrum['scan_info']['precursor_mz'],
+                                                    spectrum['scan_info']['precursor_charge'])
+            self.presenter.view.panelPlots.on_plot_centroid_MS(spectrum['xvals'],
+                                                               spectrum['yvals'],
                                                                title=title)
 
             self.presenter.OnUpdateDocument(document, 'document')
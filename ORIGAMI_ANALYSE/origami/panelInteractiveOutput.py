@@ -72,6 +72,17 @@ from processing.spectra import linearize_data, crop_1D_data, normalize_1D
 # import holoviews as hv
 # hv.extension('bokeh')
 
+# item type in the table -> document attribute
+TABLE_SINGLE_KEYS = {'MS': 'massSpectrum', 'Processed MS': 'smoothMS', 'RT': 'RT',
+                     '1D': 'DT', '2D': 'IMS2D', '2D, processed': 'IMS2Dprocess'}
+TABLE_MULTIPLE_KEYS = {'MS, multiple': 'multipleMassSpectrum', '2D': 'IMS2Dions',
+                       'DT-IMS': 'IMS1DdriftTimes', '1D': 'IMS1DdriftTimes',
+                       '1D, multiple': 'multipleDT', 'RT, combined': 'IMSRTCombIons',
+                       'RT, multiple': 'multipleRT', '2D, combined': 'IMS2DCombIons',
+                       '2D, processed': 'IMS2DionsProcess', 'Overlay': 'IMS2DoverlayData',
+                       'Statistical': 'IMS2DstatsData', 'Annotated data': 'other_data'}
+TABLE_UNIDEC_KEYS = {'UniDec': 'massSpectrum', 'UniDec, processed': 'smoothMS'}
+
 import warnings
 # needed to avoid annoying warnings to be printed on console
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -2618,6 +2629,7 @@ class panelInteractiveOutput(wx.MiniFrame):
             for key in self.documentsDict:
                 data = []
                 docData = self.documentsDict[key]
+                index = docData.get_index()
                 if docData.gotMS == True:
                     data = docData.massSpectrum
                     if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
@@ -2669,14 +2681,14 @@ class panelInteractiveOutput(wx.MiniFrame):
                     self.append_to_table(data, key, "", "2D, processed", **kwargs)
 
                 if docData.gotExtractedIons == True:
-                    for innerKey in docData.IMS2Dions:
-                        data = docData.IMS2Dions[innerKey]
+                    for innerKey in index.get_names('IMS2Dions', sort=False):
+                        data = index.get_dataset('IMS2Dions', innerKey)
                         kwargs = {"toolset":"2D", "color":(179, 180, 180)}
                         self.append_to_table(data, key, innerKey, "2D", **kwargs)
 
                 if docData.gotMultipleMS == True:
-                    for innerKey in docData.multipleMassSpectrum:
-                        data = docData.multipleMassSpectrum[innerKey]
+                    for innerKey in index.get_names('multipleMassSpectrum', sort=False):
+                        data = index.get_dataset('multipleMassSpectrum', innerKey)
                         if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
                         kwargs = {"toolset":"MS", "color":(200, 236, 236)}
                         self.append_to_table(data, key, innerKey, "MS, multiple", **kwargs)
@@ -2690,52 +2702,52 @@ class panelInteractiveOutput(wx.MiniFrame):
                                 self.append_to_table(data, key, innerInnerKeyLabel, "UniDec, multiple", **kwargs)
 
                 if hasattr(docData, 'gotMultipleRT'):
-                    for innerKey in docData.multipleRT:
-                        data = docData.multipleRT[innerKey]
+                    for innerKey in index.get_names('multipleRT', sort=False):
+                        data = index.get_dataset('multipleRT', innerKey)
                         if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
                         kwargs = {"toolset":"1D", "color":(219, 209, 255)}
                         self.append_to_table(data, key, innerKey, "RT, multiple", **kwargs)
 
                 if hasattr(docData, 'gotMultipleDT'):
-                    for innerKey in docData.multipleDT:
-                        data = docData.multipleDT[innerKey]
+                    for innerKey in index.get_names('multipleDT', sort=False):
+                        data = index.get_dataset('multipleDT', innerKey)
                         if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
                         kwargs = {"toolset":"1D", "color":(255, 118, 117)}
                         self.append_to_table(data, key, innerKey, "1D, multiple", **kwargs)
 
 
                 if docData.gotExtractedDriftTimes == True:
-                    for innerKey in docData.IMS1DdriftTimes:
+                    for innerKey in index.get_names('IMS1DdriftTimes', sort=False):
                         if docData.dataType == 'Type: MANUAL': tableKey = '1D'
                         else: tableKey = 'DT-IMS'
-                        data = docData.IMS1DdriftTimes[innerKey]
+                        data = index.get_dataset('IMS1DdriftTimes', innerKey)
                         if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
                         kwargs = {"toolset":"1D", "color":(154, 236, 219)}
                         self.append_to_table(data, key, innerKey, tableKey, **kwargs)
 
                 if docData.gotCombinedExtractedIonsRT == True:
-                    for innerKey in docData.IMSRTCombIons:
-                        data = docData.IMSRTCombIons[innerKey]
+                    for innerKey in index.get_names('IMSRTCombIons', sort=False):
+                        data = index.get_dataset('IMSRTCombIons', innerKey)
                         if data.get('cmap', "") == "": data['cmap'] = self.config.interactive_line_color
                         kwargs = {"toolset":"RT", "color":(219, 209, 255)}
                         self.append_to_table(data, key, innerKey, "RT, combined", **kwargs)
 
                 if docData.gotCombinedExtractedIons == True:
-                    for innerKey in docData.IMS2DCombIons:
-                        data = docData.IMS2DCombIons[innerKey]
+                    for innerKey in index.get_names('IMS2DCombIons', sort=False):
+                        data = index.get_dataset('IMS2DCombIons', innerKey)
                         kwargs = {"toolset":"2D", "color":(255, 206, 252)}
                         self.append_to_table(data, key, innerKey, "2D, combined", **kwargs)
 
                 if docData.got2DprocessIons == True:
-                    for innerKey in docData.IMS2DionsProcess:
-                        data = docData.IMS2DionsProcess[innerKey]
+                    for innerKey in index.get_names('IMS2DionsProcess', sort=False):
+                        data = index.get_dataset('IMS2DionsProcess', innerKey)
                         kwargs = {"toolset":"2D", "color":(255, 206, 252)}
                         self.append_to_table(data, key, innerKey, "2D, processed", **kwargs)
 
                 # Overlay data
                 if docData.gotOverlay == True:
-                    for innerKey in docData.IMS2DoverlayData:
-                        data = docData.IMS2DoverlayData[innerKey]
+                    for innerKey in index.get_names('IMS2DoverlayData', sort=False):
+                        data = index.get_dataset('IMS2DoverlayData', innerKey)
                         overlayMethod = re.split('-|,|:|__', innerKey)
                         if overlayMethod[0] in ['Mask', 'Transparent']: color_label = "{}/{}".format(data['cmap1'], data['cmap2'])
                         else: color_label = data.get('cmap', "")
@@ -2743,15 +2755,15 @@ class panelInteractiveOutput(wx.MiniFrame):
                         self.append_to_table(data, key, innerKey, "Overlay", **kwargs)
 
                 if docData.gotStatsData == True:
-                    for innerKey in docData.IMS2DstatsData:
-                        data = docData.IMS2DstatsData[innerKey]
+                    for innerKey in index.get_names('IMS2DstatsData', sort=False):
+                        data = index.get_dataset('IMS2DstatsData', innerKey)
                         overlayMethod = re.split('-|,|:|__', innerKey)
                         kwargs = {"color":(222, 215, 255), "toolset":"2D"}
                         self.append_to_table(data, key, innerKey, "Statistical", **kwargs)
 
                 if len(docData.other_data) > 0:
-                    for innerKey in docData.other_data:
-                        data = docData.other_data[innerKey]
+                    for innerKey in index.get_names('other_data', sort=False):
+                        data = index.get_dataset('other_data', innerKey)
                         kwargs = {"color":(215, 224, 184)}
                         self.append_to_table(data, key, innerKey, "Annotated data", **kwargs)
                         
@@ -2860,7 +2872,7 @@ class panelInteractiveOutput(wx.MiniFrame):
         information, unidecMethod = "", ""
         # Determine which document was selected
         document = self.documentsDict[name]
-        docData = self.getItemData(name, key, innerKey)
+        docData = self.getItemData(name, key, innerKey, copy=False)
 
 
         # build information
@@ -2914,36 +2926,30 @@ class panelInteractiveOutput(wx.MiniFrame):
 
         self.loading = False
 
-    def getItemData(self, name, key, innerKey):
+    def getItemData(self, name, key, innerKey, copy=True):
+        """
+        Retrieve dataset for item in the table using the document index
+        ---
+        copy : return deep copy of the dataset
+        """
         # Determine which document was selected
         document = self.documentsDict[name]
+        index = document.get_index()
 
-        if key == 'MS' and innerKey == '': docData = deepcopy(document.massSpectrum)
-        if key == 'Processed MS' and innerKey == '': docData = deepcopy(document.smoothMS)
-        if key == 'RT' and innerKey == '': docData = deepcopy(document.RT)
-        if key == '1D' and innerKey == '': docData = deepcopy(document.DT)
-        if key == '2D' and innerKey == '': docData = deepcopy(document.IMS2D)
-        if key == '2D, processed' and innerKey == '': docData = deepcopy(document.IMS2Dprocess)
-        if key == 'MS, multiple' and innerKey != '': docData = deepcopy(document.multipleMassSpectrum[innerKey])
-        if key == '2D' and innerKey != '': docData = deepcopy(document.IMS2Dions[innerKey])
-        if key == 'DT-IMS' and innerKey != '': docData = deepcopy(document.IMS1DdriftTimes[innerKey])
-        if key == '1D' and innerKey != '': docData = deepcopy(document.IMS1DdriftTimes[innerKey])
-        if key == '1D, multiple' and innerKey != '': docData = deepcopy(document.multipleDT[innerKey])
-        if key == 'RT, combined' and innerKey != '': docData = deepcopy(document.IMSRTCombIons[innerKey])
-        if key == 'RT, multiple' and innerKey != '': docData = deepcopy(document.multipleRT[innerKey])
-        if key == '2D, combined' and innerKey != '': docData = deepcopy(document.IMS2DCombIons[innerKey])
-        if key == '2D, processed' and innerKey != '': docData = deepcopy(document.IMS2DionsProcess[innerKey])
-        if key == 'Overlay' and innerKey != '': docData = deepcopy(document.IMS2DoverlayData[innerKey])
-        if key == 'Statistical' and innerKey != '': docData = deepcopy(document.IMS2DstatsData[innerKey])
-        if key == 'UniDec' and innerKey != '': docData = deepcopy(document.massSpectrum['unidec'][innerKey])
-        if key == 'UniDec, processed' and innerKey != '': docData = deepcopy(document.smoothMS['unidec'][innerKey])
-        if key == 'UniDec, multiple' and innerKey != '':
-            unidecMethod = re.split(' \| ', innerKey)[0]
-            innerKey = re.split(' \| ', innerKey)[1]
-            docData = deepcopy(document.multipleMassSpectrum[innerKey]['unidec'][unidecMethod])
-        if key == "Annotated data" and innerKey != "": docData = document.other_data[innerKey]
-        if key == "MS/MS" and innerKey == '': docData = document.tandem_spectra
-        
+        if key == "MS/MS" and innerKey == '': 
+            return document.tandem_spectra
+        elif key == 'UniDec, multiple' and innerKey != '':
+            unidecMethod, innerKey = re.split(' \| ', innerKey)[:2]
+            docData = index.get_dataset('multipleMassSpectrum', innerKey)['unidec'][unidecMethod]
+        elif key in TABLE_UNIDEC_KEYS and innerKey != '':
+            docData = index.get_dataset(TABLE_UNIDEC_KEYS[key])['unidec'][innerKey]
+        elif innerKey == '':
+            docData = index.get_dataset(TABLE_SINGLE_KEYS[key])
+        else:
+            docData = index.get_dataset(TABLE_MULTIPLE_KEYS[key], innerKey)
+
+        if copy and key != "Annotated data":
+            docData = deepcopy(docData)
         return docData
 
     def on_change_page_for_item(self, evt):
@@ -4498,11 +4504,12 @@ class panelInteractiveOutput(wx.MiniFrame):
                 continue
             if i >= hard_limit: 
                 break
-            # plot data
-            xvals_list.append(data[key]['xvals'])
-            yvals_list.append(data[key]['yvals'])
+            # plot data (views of the peak arrays of the store)
+            spectrum = data[key]
+            xvals_list.append(spectrum['xvals'])
+            yvals_list.append(spectrum['yvals'])
             options_list.append(str(i))
-            html_title = self._prepare_centroid_title(key, data[key]['scan_info']['title'])
+            html_title = self._prepare_centroid_title(key, spectrum['scan_info']['title'])
             title_list.append(html_title)
             annotated_ms_list.append(i)
             i += 1
@@ -4623,15 +4630,16 @@ class panelInteractiveOutput(wx.MiniFrame):
         for scan_id in annotated_ms_list:
             scan, id_num = re.split(":", scan_id)
             id_num = int(id_num)
-            # plot data
-            xvals_list.append(data[scan]['xvals'])
-            yvals_list.append(data[scan]['yvals'])
+            # plot data (views of the peak arrays of the store)
+            spectrum = data[scan]
+            xvals_list.append(spectrum['xvals'])
+            yvals_list.append(spectrum['yvals'])
             options_list.append("{}:{}".format(scan,id_num+1))
             
             item_colors, labels, details = self._prepare_centroid_data(
-                data[scan]['xvals'],
-                data[scan]['fragment_annotations'][id_num]['fragment_mass_list'],
-                data[scan]['fragment_annotations'][id_num]['fragment_table'], 
+                spectrum['xvals'],
+                spectrum['fragment_annotations'][id_num]['fragment_mass_list'],
+                spectrum['fragment_annotations'][id_num]['fragment_table'], 
                 color_labelled, color_unlabelled)
             
             item_colors_list.append(item_colors)
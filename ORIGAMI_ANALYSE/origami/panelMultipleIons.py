@@ -1627,6 +1627,13 @@ class panelMultipleIons(wx.Panel):
                 try: document.IMSRTCombIons[processed_name][keyword_name] = itemInfo[keyword]
                 except: pass  
         
+        # update index of the edited ions (e.g. label and charge)
+        index = document.get_index()
+        for attribute in ['IMS2Dions', 'IMS2DCombIons', 'IMS2DionsProcess', 'IMSRTCombIons']:
+            for name in [itemInfo['ionName'], processed_name]:
+                if index.get_entry(attribute, name) is not None:
+                    index.add(attribute, name)
+        
         # Update file list
         self.presenter.OnUpdateDocument(document, 'no_refresh')
 
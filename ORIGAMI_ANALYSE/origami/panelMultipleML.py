@@ -401,19 +401,16 @@ class panelMML( wx.Panel ):
           
     def onAutoUniDec(self, evt):
         
+        datasets = {}
         for row in range(self.filelist.GetItemCount()):
             if not self.filelist.IsChecked(index=row): 
                 continue
             itemInfo = self.OnGetItemInformation(itemID=row)
-            
-            # get mass spectrum information
-            document = self.presenter.documentsDict[itemInfo["document"]]
-            dataset = itemInfo["filename"]           
-            self.data_processing.on_run_unidec(dataset, task="auto_unidec")
-             
-            print("Pre-processing mass spectra using m/z range {} - {} with {} bin size".format(self.config.unidec_mzStart,
-                                                                                                self.config.unidec_mzEnd,
-                                                                                                self.config.unidec_mzBinSize))
+            datasets.setdefault(itemInfo["document"], []).append(itemInfo["filename"])
+        
+        # spectra of each document are deconvoluted in parallel
+        for document_title, dataset_list in datasets.items():
+            self.data_processing.on_run_unidec_batch(document_title, dataset_list)
 
     def onRenameItem(self, old_name, new_name, item_type="Document"):
         for row in range(self.filelist.GetItemCount()):
@@ -1196,6 +1196,8 @@ class panelMultipleTextFiles (wx.Panel):
                     document.IMS2D[keyword] = itemInfo[keyword_name]
                 if document.got2Dprocess:
                     document.IMS2Dprocess[keyword] = itemInfo[keyword_name]
+            document.get_index().add('IMS2D')
+            document.get_index().add('IMS2Dprocess')
         except:
             document_title, ion_title = re.split(': ', itemInfo['document'])
             document = self.presenter.documentsDict[document_title]
@@ -1206,6 +1208,10 @@ class panelMultipleTextFiles (wx.Panel):
                     document.IMS2DcompData[ion_title][keyword] = itemInfo[keyword_name]
                 else:
                     document.IMS2Dions[ion_title][keyword] = itemInfo[keyword_name]
+            if ion_title in document.IMS2DcompData:
+                document.get_index().add('IMS2DcompData', ion_title)
+            else:
+                document.get_index().add('IMS2Dions', ion_title)
 
         # Update file list
         self.presenter.OnUpdateDocument(document, 'no_refresh')
@@ -26,6 +26,7 @@ import numpy as np
 from copy import deepcopy
 from time import time as ttime
 from re import split as re_split
+from readers.io_tandem import TandemSpectra
 
 from toolbox import (str2num, str2int, str2bool, removeListDuplicates)
 from styles import (makeCheckbox, makeStaticBox, makeMenuItem)
@@ -1276,6 +1277,21 @@ class panelTandemSpectra(wx.MiniFrame):
         for item in enableList:
             item.SetValue(True)
             
+    def _get_scan_metadata(self, data, scan):
+        """ 
+        Return scan information and identification of the scan. Columnar store is
+        read directly so peaks are not loaded and views of scans are not created.
+        """
+        if isinstance(data, TandemSpectra):
+            return data.get_scan_info(scan), data.get_extra(scan, 'identification')
+        
+        spectrum = data[scan]
+        scan_info = dict(spectrum['scan_info'])
+        # number of peaks is taken from the file index so the peaks are not parsed
+        if 'peak_count' not in scan_info:
+            scan_info['peak_count'] = len(spectrum['xvals'])
+        return scan_info, spectrum.get('identification')
+        
     def on_populate_table(self, show_all=False):
         
         data = self.kwargs['tandem_spectra']
@@ -1313,7 +1329,7 @@ class panelTandemSpectra(wx.MiniFrame):
                                                    spectrum['scan_info'].get('ms_level', "2"),
                                                    "{:.4f}".format(spectrum['scan_info'].get('precursor_mz', "")),
                                                    spectrum['scan_info'].get('precursor_charge', ""),
-                                                   spectrum['scan_info'].get('peak_count', len(spectrum['xvals'])),
+                                                   self._get_scan_metadata(data, scan)[0]['peak_count'],
                                                    len(spectrum['fragment_annotations'][id_num].get('fragment_table', [])),
                                                    peptide, 
                                                    str(ptm),
@@ -1327,19 +1343,19 @@ class panelTandemSpectra(wx.MiniFrame):
             if "Scan " not in scan: 
                 continue
                 
-            spectrum = data[scan]
+            scan_info, identification = self._get_scan_metadata(data, scan)
             n_ids, peptide, ptm = 1, [""], [False]
-            if "identification" in spectrum:
-                n_ids = len(spectrum['identification'])
+            if identification is not None:
+                n_ids = len(identification)
                 
                 peptide = [""] * n_ids
                 ptm = [False] * n_ids
-                for n_id in natsorted(spectrum['identification']):
+                for n_id in natsorted(identification):
                     
-                    try: peptide[n_id] = spectrum['identification'][n_id]['peptide_seq']
+                    try: peptide[n_id] = identification[n_id]['peptide_seq']
                     except: pass
                     try: 
-                        if len(spectrum['identification'][n_id]['modification_info']) > 0:
+                        if len(identification[n_id]['modification_info']) > 0:
                             ptm[n_id] = True
                     except: pass
                     
@@ -1354,13 +1370,13 @@ class panelTandemSpectra(wx.MiniFrame):
                  
                 # add to table
                 self.peaklist.Append(["", scan, str(n_id+1),
-                                      spectrum['scan_info'].get('ms_level', "2"),
-                                      "{:.4f}".format(spectrum['scan_info'].get('precursor_mz', "")),
-                                      spectrum['scan_info'].get('precursor_charge', ""),
-                                      spectrum['scan_info'].get('peak_count', len(spectrum['xvals'])),
+                                      scan_info.get('ms_level', "2"),
+                                      "{:.4f}".format(scan_info.get('precursor_mz', "")),
+                                      scan_info.get('precursor_charge', ""),
+                                      scan_info['peak_count'],
                                       peptide[n_id], 
                                       str(ptm[n_id]),
-                                      spectrum['scan_info'].get('title', ""),
+                                      scan_info.get('title', ""),
                                       ])
             if i >= n_show: 
                 self.n_loaded_scans = self.peaklist.GetItemCount()
@@ -1389,26 +1405,26 @@ class panelTandemSpectra(wx.MiniFrame):
             if "Scan " not in scan:
                 continue
             
-            spectrum = data[scan]
+            scan_info, identification = self._get_scan_metadata(data, scan)
             n_ids, peptide, ptm = 1, [""], [False]
             
-            if "identification" in spectrum:
-                n_ids = len(spectrum['identification'])
+            if identification is not None:
+                n_ids = len(identification)
                 
                 peptide = [""] * n_ids
                 ptm = [False] * n_ids
-                for n_id in natsorted(spectrum['identification']):
+                for n_id in natsorted(identification):
                     
-                    try: peptide[n_id] = spectrum['identification'][n_id]['peptide_seq']
+                    try: peptide[n_id] = identification[n_id]['peptide_seq']
                     except: pass
                     try: 
-                        if len(spectrum['identification'][n_id]['modification_info']) > 0:
+                        if len(identification[n_id]['modification_info']) > 0:
                             ptm[n_id] = True
                     except: 
                         pass
                 
             try: 
-                ms_level = spectrum['scan_info'].get('ms_level', "2")
+                ms_level = scan_info.get('ms_level', "2")
             except TypeError:
                  self.n_loaded_scans = self.peaklist.GetItemCount()
                  return
@@ -1424,12 +1440,12 @@ class panelTandemSpectra(wx.MiniFrame):
              
                 self.peaklist.Append(["", scan, str(n_id+1), 
                                       ms_level,
-                                      "{:.4f}".format(spectrum['scan_info'].get('precursor_mz', "")),
-                                      spectrum['scan_info'].get('precursor_charge', ""),
-                                      spectrum['scan_info'].get('peak_count', len(spectrum['xvals'])),
+                                      "{:.4f}".format(scan_info.get('precursor_mz', "")),
+                                      scan_info.get('precursor_charge', ""),
+                                      scan_info['peak_count'],
                                       peptide[n_id], 
                                       str(ptm[n_id]),
-                                      spectrum['scan_info'].get('title', ""),
+                                      scan_info.get('title', ""),
                                       ])
             
         self.n_loaded_scans = self.peaklist.GetItemCount()
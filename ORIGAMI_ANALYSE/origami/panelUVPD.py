@@ -1265,18 +1265,16 @@ class panelUVPD(wx.MiniFrame):
         print("In total, it took {:.4f} seconds.".format(ttime() - tstart))
 
     def _extract_mass_spectrum(self, document_path, scan_list, **kwargs):
-        from processing.spectra import sum_1D_dictionary
-
         for counter, item in enumerate(scan_list):
-            msDict = io_waters.rawMassLynx_MS_bin(filename=str(document_path),
-                                                  function=1,
-                                                  startScan=item[0], endScan=item[1],
-                                                  binData=self.config.import_binOnImport,
-                                                  mzStart=self.config.ms_mzStart,
-                                                  mzEnd=self.config.ms_mzEnd,
-                                                  binsize=self.config.ms_mzBinSize,
-                                                  **kwargs)
-            msX, msY = sum_1D_dictionary(ydict=msDict)
+            msX, msY = io_waters.rawMassLynx_MS_bin(filename=str(document_path),
+                                                    function=1,
+                                                    startScan=item[0], endScan=item[1],
+                                                    binData=self.config.import_binOnImport,
+                                                    mzStart=self.config.ms_mzStart,
+                                                    mzEnd=self.config.ms_mzEnd,
+                                                    binsize=self.config.ms_mzBinSize,
+                                                    sum_scans=True,
+                                                    **kwargs)
 
             if counter == 0:
                 tempArray = msY
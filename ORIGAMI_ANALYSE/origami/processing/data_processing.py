@@ -33,6 +33,7 @@ import processing.origami_ms as pr_origami
 import processing.activation as pr_activation
 import processing.utils as pr_utils
 import processing.peptide_annotation as pr_frag
+import processing.unidec_batch as pr_unidec
 import dialogs as dialogs
 import unidec as unidec
 from toolbox import (str2num, str2int, num2str, convertRGB1to255,
@@ -887,6 +888,7 @@ class data_processing():
                                             mode=self.config.plot2D_normalize_mode)
 
         # As a precaution, remove inf
+        zvals = pr_heatmap.get_writable(zvals)
         zvals[zvals == -np.inf] = 0
             
         if replot:
@@ -1104,30 +1106,8 @@ class data_processing():
             
         if task not in ['auto_unidec']:
             # set common parameters
-            self.config.unidec_engine.config.numit = self.config.unidec_maxIterations
-            # preprocess
-            self.config.unidec_engine.config.minmz = self.config.unidec_mzStart
-            self.config.unidec_engine.config.maxmz = self.config.unidec_mzEnd
-            self.config.unidec_engine.config.mzbins = self.config.unidec_mzBinSize
-            self.config.unidec_engine.config.smooth = self.config.unidec_gaussianFilter
-            self.config.unidec_engine.config.accvol = self.config.unidec_accelerationV
-            self.config.unidec_engine.config.linflag = self.config.unidec_linearization_choices[self.config.unidec_linearization]
-            self.config.unidec_engine.config.cmap = self.config.currentCmap
-    
-            # unidec engine 
-            self.config.unidec_engine.config.masslb = self.config.unidec_mwStart
-            self.config.unidec_engine.config.massub = self.config.unidec_mwEnd
-            self.config.unidec_engine.config.massbins = self.config.unidec_mwFrequency
-            self.config.unidec_engine.config.startz = self.config.unidec_zStart
-            self.config.unidec_engine.config.endz = self.config.unidec_zEnd
-            self.config.unidec_engine.config.numz = self.config.unidec_zEnd - self.config.unidec_zStart
-            self.config.unidec_engine.config.psfun = self.config.unidec_peakFunction_choices[self.config.unidec_peakFunction]
-            
-            # peak finding
-            self.config.unidec_engine.config.peaknorm = self.config.unidec_peakNormalization_choices[self.config.unidec_peakNormalization]
-            self.config.unidec_engine.config.peakwindow = self.config.unidec_peakDetectionWidth
-            self.config.unidec_engine.config.peakthresh = self.config.unidec_peakDetectionThreshold
-            self.config.unidec_engine.config.separation = self.config.unidec_lineSeparation
+            pr_unidec.set_unidec_parameters(self.config.unidec_engine.config, 
+                                            pr_unidec.get_unidec_parameters(self.config))
         
          
          # load data
@@ -1281,62 +1261,24 @@ class data_processing():
             data['unidec'] = {}
             
 
-        if task in ['auto_unidec', 'run_all_unidec', 'preprocess_unidec']:
-            raw_data = {'xvals':self.config.unidec_engine.data.data2[:, 0],
-                        'yvals':self.config.unidec_engine.data.data2[:, 1],
-                        'color':[0,0,0], 'label':"Data", 'xlabels':"m/z", 
-                        'ylabels':"Intensity"}
-            # add data
-            data['unidec']['Processed'] = raw_data
-            
-        if task in ['auto_unidec', 'run_all_unidec', "run_unidec"]:
-            fit_data = {'xvals':[self.config.unidec_engine.data.data2[:, 0], 
-                                 self.config.unidec_engine.data.data2[:, 0]],
-                        'yvals':[self.config.unidec_engine.data.data2[:, 1], 
-                                 self.config.unidec_engine.data.fitdat],
-                        'colors':[[0,0,0], [1,0,0]], 'labels':['Data', 'Fit Data'],
-                        'xlabel':"m/z", 'ylabel':"Intensity", 
-                        'xlimits':[np.min(self.config.unidec_engine.data.data2[:, 0]), 
-                                   np.max(self.config.unidec_engine.data.data2[:, 0])]}
-            mw_distribution_data = {'xvals':self.config.unidec_engine.data.massdat[:, 0],
-                                    'yvals':self.config.unidec_engine.data.massdat[:, 1],
-                                    'color':[0,0,0], 'label':"Data", 'xlabels':"Mass (Da)",
-                                    'ylabels':"Intensity"}
-            mz_grid_data = {'grid':self.config.unidec_engine.data.mzgrid,
-                            'xlabels':" m/z (Da)", 'ylabels':"Charge",
-                            'cmap':self.config.unidec_engine.config.cmap}
-            mw_v_z_data = {'xvals':self.config.unidec_engine.data.massdat[:, 0],
-                           'yvals':self.config.unidec_engine.data.ztab,
-                           'zvals':self.config.unidec_engine.data.massgrid,
-                           'xlabels':"Mass (Da)", 'ylabels':"Charge",
-                           'cmap':self.config.unidec_engine.config.cmap}
-            # add data
-            data['unidec']['Fitted'] = fit_data
-            data['unidec']['MW distribution'] = mw_distribution_data
-            data['unidec']['m/z vs Charge'] = mz_grid_data
-            data['unidec']['MW vs Charge'] = mw_v_z_data
-            
-        if task in ['auto_unidec', 'run_all_unidec', 'pick_peaks_unidec']:
-            # individually plotted
-            individual_dict = self.get_unidec_data(data_type="Individual MS")
-            barchart_dict = self.get_unidec_data(data_type="Barchart")
-            massList, massMax = self.get_unidec_data(data_type="MassList")
-            individual_dict['_massList_'] = [massList, massMax]
-            
-            # add data
-            data['unidec']['m/z with isolated species'] = individual_dict
-            data['unidec']['Barchart'] = barchart_dict
-            data['unidec']['Charge information'] = self.config.unidec_engine.get_charge_peaks()
+        results = pr_unidec.get_unidec_results(self.config.unidec_engine, self.config.customColors,
+                                               processed=task in ['auto_unidec', 'run_all_unidec', 'preprocess_unidec'],
+                                               fitted=task in ['auto_unidec', 'run_all_unidec', "run_unidec"],
+                                               peaks=task in ['auto_unidec', 'run_all_unidec', 'pick_peaks_unidec'])
+        data['unidec'].update(results)
         
         data['temporary_unidec'] = self.config.unidec_engine
             
         # update data dictionary
         if dataset == 'Mass Spectrum':
             document.massSpectrum = data
+            document.get_index().add('massSpectrum')
         elif dataset == 'Mass Spectrum (processed)':
             document.smoothMS = data
+            document.get_index().add('smoothMS')
         else:
             document.multipleMassSpectrum[dataset] = data
+            document.get_index().add('multipleMassSpectrum', dataset)
             
         # update document
         if dataset == "Mass Spectra":
@@ -1345,95 +1287,77 @@ class data_processing():
         else:
             self.presenter.OnUpdateDocument(document, expand_item="document")
 
+    def on_run_unidec_batch(self, document_title, datasets=None):
+        """
+        Deconvolute many mass spectra of the document in pool of processes
+        ---
+        document_title : name of the document
+        datasets : list of names of spectra in 'multipleMassSpectrum', if None, all spectra are used
+        """
+        try:
+            document = self.presenter.documentsDict[document_title]
+        except KeyError: 
+            dlgBox(exceptionTitle="Error",
+                   exceptionMsg="Please create or load a document first", 
+                   type="Error")
+            return
+        
+        if datasets is None:
+            datasets = document.multipleMassSpectrum.keys()
+        spectra = [(dataset, 
+                    document.multipleMassSpectrum[dataset]['xvals'],
+                    document.multipleMassSpectrum[dataset]['yvals']) for dataset in datasets]
+        if len(spectra) == 0:
+            return
+        
+        if self.config.unidec_peakWidth_auto:
+            peak_width = None
+        else:
+            peak_width = self.config.unidec_peakWidth
+            
+        def update_status(dataset, n_done, n_total):
+            msg = "UniDec: Finished {} ({}/{})".format(dataset, n_done, n_total)
+            self.presenter.onThreading(None, (msg, 4) , action='updateStatusbar')
+        
+        tstart = ttime()
+        output = pr_unidec.run_unidec_batch(spectra, pr_unidec.get_unidec_parameters(self.config),
+                                            directory=self.config.temporary_data, 
+                                            peak_width=peak_width,
+                                            custom_colors=self.config.customColors,
+                                            callback=update_status)
+        
+        errors = []
+        index = document.get_index()
+        for dataset, (results, error) in output.items():
+            data = document.multipleMassSpectrum[dataset]
+            data.pop('temporary_unidec', None)
+            if results is None:
+                print("UniDec failed to deconvolute '{}'\n{}".format(dataset, error))
+                errors.append(dataset)
+                continue
+            data['unidec'] = results
+            index.add('multipleMassSpectrum', dataset)
+            
+        msg = "UniDec: Deconvoluted {} mass spectra in {:.2f} seconds".format(len(output) - len(errors), 
+                                                                               ttime()-tstart)
+        self.presenter.onThreading(None, (msg, 4) , action='updateStatusbar')
+        self.presenter.OnUpdateDocument(document, expand_item="document")
+        
+        if len(errors) > 0:
+            dlgBox(exceptionTitle="Error",
+                   exceptionMsg="UniDec failed to deconvolute:\n{}".format("\n".join(errors)), 
+                   type="Error")
+
     def get_unidec_data(self, data_type="Individual MS", **kwargs):
         
         if data_type == "Individual MS":
-            stickmax = 1.0
-            num = 0
-            individual_dict = dict()
-            legend_text = [[[0,0,0], "Raw"]]
-            colors, labels = [], []
-#             charges = self.config.unidec_engine.get_charge_peaks()
-            for i in xrange(0, self.config.unidec_engine.pks.plen):
-                p = self.config.unidec_engine.pks.peaks[i]
-                if p.ignore == 0:
-                    list1, list2 = [], []
-                    if (not isempty(p.mztab)) and (not isempty(p.mztab2)):
-                        mztab = np.array(p.mztab) 
-                        mztab2 = np.array(p.mztab2)
-                        maxval = np.amax(mztab[:, 1])
-                        for k in range(0, len(mztab)):
-                            if mztab[k, 1] > self.config.unidec_engine.config.peakplotthresh * maxval:
-                                list1.append(mztab2[k, 0])
-                                list2.append(mztab2[k, 1])
-                                
-                        if self.config.unidec_engine.pks.plen <= 15:
-                            color=convertRGB255to1(self.config.customColors[i])
-                        else:
-                            color=p.color
-                        colors.append(color)
-                        labels.append("MW: {:.2f}".format(p.mass))
-                        legend_text.append([color, "MW: {:.2f}".format(p.mass)])
-#                         self._calculate_peak_widths(charges, p.mass, self.config.unidec_engine.config.mzsig, adductIon)
-                        
-                        individual_dict["MW: {:.2f}".format(p.mass)] = {'scatter_xvals':np.array(list1),
-                                                                        'scatter_yvals':np.array(list2),
-                                                                        'marker':p.marker, 
-                                                                        'color':color,
-                                                                        'label':"MW: {:.2f}".format(p.mass),
-                                                                        'line_xvals':self.config.unidec_engine.data.data2[:, 0],
-                                                                        'line_yvals':np.array(p.stickdat)/stickmax-(num + 1) * self.config.unidec_engine.config.separation
-                                                                        }
-                        num += 1
-
-            individual_dict['legend_text'] = legend_text
-            individual_dict['xvals'] = self.config.unidec_engine.data.data2[:, 0]
-            individual_dict['yvals'] = self.config.unidec_engine.data.data2[:, 1]
-            individual_dict['xlabel'] = "m/z (Da)"
-            individual_dict['ylabel'] = "Intensity"
-            individual_dict['colors'] = colors
-            individual_dict['labels'] = labels
-            
-            return individual_dict
+            return pr_unidec.get_individual_spectra(self.config.unidec_engine, self.config.customColors)
         
         elif data_type == 'MassList':
-            mwList, heightList = [], []
-            for i in range(0, self.config.unidec_engine.pks.plen):
-                p = self.config.unidec_engine.pks.peaks[i]
-                if p.ignore == 0:
-                    mwList.append("MW: {:.2f} ({:.2f} %)".format(p.mass, p.height))
-                    heightList.append(p.height)
-                    
-            return mwList, mwList[heightList.index(np.max(heightList))]
+            return pr_unidec.get_mass_list(self.config.unidec_engine)
         
         elif data_type == 'Barchart':
-            if self.config.unidec_engine.pks.plen > 0:
-                num = 0
-                yvals, colors, labels, legend_text, markers, legend = [], [], [], [], [], []
-                for p in self.config.unidec_engine.pks.peaks:
-                    if p.ignore == 0:
-                        yvals.append(p.height)
-                        if self.config.unidec_engine.pks.plen <= 15:
-                            color = convertRGB255to1(self.config.customColors[num])
-                        else:
-                            color = p.color
-                        markers.append(p.marker)
-                        labels.append(p.label)
-                        colors.append(color)
-                        legend_text.append([color, "MW: {:.2f}".format(p.mass)])
-                        legend.append("MW: {:.2f}".format(p.mass))
-                        num += 1
-                    xvals = range(0, num)
-                    barchart_dict = {'xvals':xvals,
-                                     'yvals':yvals,
-                                     'labels':labels,
-                                     'colors':colors,
-                                     'legend':legend,
-                                     'legend_text':legend_text,
-                                     'markers':markers}
-#                 for k, v in vars(p).items():
-#                   print k, v
-                return barchart_dict
+            return pr_unidec.get_barchart(self.config.unidec_engine, self.config.customColors)
         
         elif data_type == 'document_all':
             
@@ -23,6 +23,12 @@ from scipy.ndimage import gaussian_filter
 from sklearn.preprocessing import normalize
 from gui_elements.misc_dialogs import dlgBox
 
+def get_writable(inputData):
+    """ Copy array if it is read-only (e.g. heatmap shared between documents) """
+    if isinstance(inputData, np.ndarray) and not inputData.flags.writeable:
+        return inputData.copy()
+    return inputData
+
 def adjust_min_max_intensity(inputData=None, min_threshold=0.0, max_threshold=1.0): # threshold2D
     
     # Check min_threshold is larger than max_threshold
@@ -35,6 +41,9 @@ def adjust_min_max_intensity(inputData=None, min_threshold=0.0, max_threshold=1.
         print("Minimum and maximum thresholds are the same.")
         return inputData
     
+    # Shared arrays are read-only so they are copied before modification
+    inputData = get_writable(inputData)
+    
     # Find maximum value in the array
     data_max = np.max(inputData)
     min_threshold = min_threshold * data_max
@@ -69,7 +78,8 @@ def remove_noise_2D(inputData=None, threshold=0): # removeNoise
     # Or leave it as is if the values are correct
     else:
         threshold=threshold
-          
+    
+    inputData = get_writable(inputData)
     inputData[inputData<=threshold] = 0
     return inputData    
 
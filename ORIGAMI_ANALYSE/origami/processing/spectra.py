@@ -263,11 +263,62 @@ def smooth_1D(data=None, smoothMode='Gaussian', **kwargs):  # smooth_1D
         return data
 
 
-def bin_1D(x=None, y=None, bins=None, binmode="Bin"):  # binMSdata
-    """Bin data"""
-    # Bin data using numpy histogram function
+def check_uniform_bins(bins, rtol=1E-6):
+    """ Check whether bin edges are evenly spaced (e.g. created with np.arange) """
+    bins = np.asarray(bins)
+    if bins.shape[0] < 3:
+        return True
+    step = (bins[-1] - bins[0]) / (bins.shape[0] - 1)
+    return np.allclose(np.diff(bins), step, rtol=rtol, atol=0)
+
+
+def get_bin_indices(x, bins, uniform=None):
+    """
+    Return index of the bin of each value shifted by one, so values below the
+    first edge are 0 and values above the last edge are len(bins). The last
+    edge is included in the last bin (same as np.histogram).
+    ---
+    uniform : bins are evenly spaced. If None, it is checked
+    """
+    # values in single precision (e.g. m/z of Waters files) would be compared with 
+    # the edges rounded to single precision
+    x = np.asarray(x, dtype=np.float64)
+    bins = np.asarray(bins, dtype=np.float64)
+    n_bins = bins.shape[0] - 1
+    if uniform is None:
+        uniform = check_uniform_bins(bins)
+
+    if uniform:
+        # compute index directly and correct values which fell into the neighbouring
+        # bin due to the rounding error
+        indices = ((x - bins[0]) * (n_bins / float(bins[-1] - bins[0]))).astype(np.intp)
+        np.clip(indices, 0, n_bins - 1, out=indices)
+        indices -= x < bins[indices]
+        indices += (x >= bins[indices + 1]) & (indices != n_bins - 1)
+        indices += 1
+        indices[x < bins[0]] = 0
+        indices[x > bins[-1]] = n_bins + 1
+    else:
+        indices = np.searchsorted(bins, x, side='right')
+        indices[x == bins[-1]] = n_bins
+    return indices
+
+
+def bin_1D(x=None, y=None, bins=None, binmode="Bin", out=None, uniform=None):  # binMSdata
+    """
+    Bin data
+    ---
+    out : array of len(bins) - 1 the binned data is added to, used to sum many
+        spectra without creating intermediate arrays
+    uniform : bins are evenly spaced, if None it is checked
+    """
     if binmode == "Bin":
-        msYbin, __ = np.histogram(x, bins=bins, weights=y)
+        n_bins = len(bins) - 1
+        indices = get_bin_indices(x, bins, uniform)
+        msYbin = np.bincount(indices, weights=y, minlength=n_bins + 2)[1:-1]
+        if out is not None:
+            out += msYbin
+            return out
 
     return msYbin
 
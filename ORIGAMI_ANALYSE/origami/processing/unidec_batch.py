@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+
+"""
+Deconvolution of many mass spectra with UniDec. Each spectrum is deconvoluted
+in its own working directory so several UniDec runs can be executed in a pool
+of processes at the same time.
+"""
+
+import os, shutil, tempfile, traceback
+from multiprocessing import Pool, cpu_count
+import numpy as np
+
+import unidec as unidec
+from toolbox import convertRGB255to1, isempty
+
+
+def get_unidec_parameters(config):
+    """
+    Return UniDec settings of ORIGAMI config as dictionary of UniDecConfig attributes
+    """
+    return {'UniDecPath':config.unidec_path,
+            'numit':config.unidec_maxIterations,
+            # preprocess
+            'minmz':config.unidec_mzStart,
+            'maxmz':config.unidec_mzEnd,
+            'mzbins':config.unidec_mzBinSize,
+            'smooth':config.unidec_gaussianFilter,
+            'accvol':config.unidec_accelerationV,
+            'linflag':config.unidec_linearization_choices[config.unidec_linearization],
+            'cmap':config.currentCmap,
+            # unidec engine
+            'masslb':config.unidec_mwStart,
+            'massub':config.unidec_mwEnd,
+            'massbins':config.unidec_mwFrequency,
+            'startz':config.unidec_zStart,
+            'endz':config.unidec_zEnd,
+            'numz':config.unidec_zEnd - config.unidec_zStart,
+            'psfun':config.unidec_peakFunction_choices[config.unidec_peakFunction],
+            # peak finding
+            'peaknorm':config.unidec_peakNormalization_choices[config.unidec_peakNormalization],
+            'peakwindow':config.unidec_peakDetectionWidth,
+            'peakthresh':config.unidec_peakDetectionThreshold,
+            'separation':config.unidec_lineSeparation}
+
+
+def set_unidec_parameters(unidec_config, parameters):
+    """ Set parameters (see get_unidec_parameters) on UniDecConfig """
+    for key, value in parameters.items():
+        setattr(unidec_config, key, value)
+
+
+def check_mz_range(parameters, mz_min, mz_max):
+    """
+    Return copy of parameters with m/z range which overlaps with the spectrum
+    (same as data_processing._check_unidec_input)
+    """
+    parameters = dict(parameters)
+    if parameters['minmz'] > mz_max:
+        parameters['minmz'] = np.round(mz_min, 0)
+    if parameters['maxmz'] < mz_min or parameters['maxmz'] > mz_max:
+        parameters['maxmz'] = np.round(mz_max, 0)
+    return parameters
+
+
+def get_individual_spectra(engine, custom_colors):
+    """ Spectra of isolated species """
+    stickmax = 1.0
+    num = 0
+    individual_dict = dict()
+    legend_text = [[[0,0,0], "Raw"]]
+    colors, labels = [], []
+    for i in xrange(0, engine.pks.plen):
+        p = engine.pks.peaks[i]
+        if p.ignore == 0:
+            list1, list2 = [], []
+            if (not isempty(p.mztab)) and (not isempty(p.mztab2)):
+                mztab = np.array(p.mztab) 
+                mztab2 = np.array(p.mztab2)
+                maxval = np.amax(mztab[:, 1])
+                for k in range(0, len(mztab)):
+                    if mztab[k, 1] > engine.config.peakplotthresh * maxval:
+                        list1.append(mztab2[k, 0])
+                        list2.append(mztab2[k, 1])
+                        
+                if engine.pks.plen <= 15:
+                    color=convertRGB255to1(custom_colors[i])
+                else:
+                    color=p.color
+                colors.append(color)
+                labels.append("MW: {:.2f}".format(p.mass))
+                legend_text.append([color, "MW: {:.2f}".format(p.mass)])
+                
+                individual_dict["MW: {:.2f}".format(p.mass)] = {'scatter_xvals':np.array(list1),
+                                                                'scatter_yvals':np.array(list2),
+                                                                'marker':p.marker, 
+                                                                'color':color,
+                                                                'label':"MW: {:.2f}".format(p.mass),
+                                                                'line_xvals':engine.data.data2[:, 0],
+                                                                'line_yvals':np.array(p.stickdat)/stickmax-(num + 1) * engine.config.separation
+                                                                }
+                num += 1
+
+    individual_dict['legend_text'] = legend_text
+    individual_dict['xvals'] = engine.data.data2[:, 0]
+    individual_dict['yvals'] = engine.data.data2[:, 1]
+    individual_dict['xlabel'] = "m/z (Da)"
+    individual_dict['ylabel'] = "Intensity"
+    individual_dict['colors'] = colors
+    individual_dict['labels'] = labels
+    
+    return individual_dict
+
+
+def get_mass_list(engine):
+    """ List of detected masses and the most intense one """
+    mwList, heightList = [], []
+    for i in range(0, engine.pks.plen):
+        p = engine.pks.peaks[i]
+        if p.ignore == 0:
+            mwList.append("MW: {:.2f} ({:.2f} %)".format(p.mass, p.height))
+            heightList.append(p.height)
+            
+    return mwList, mwList[heightList.index(np.max(heightList))]
+
+
+def get_barchart(engine, custom_colors):
+    """ Intensities of detected masses """
+    if engine.pks.plen > 0:
+        num = 0
+        yvals, colors, labels, legend_text, markers, legend = [], [], [], [], [], []
+        for p in engine.pks.peaks:
+            if p.ignore == 0:
+                yvals.append(p.height)
+                if engine.pks.plen <= 15:
+                    color = convertRGB255to1(custom_colors[num])
+                else:
+                    color = p.color
+                markers.append(p.marker)
+                labels.append(p.label)
+                colors.append(color)
+                legend_text.append([color, "MW: {:.2f}".format(p.mass)])
+                legend.append("MW: {:.2f}".format(p.mass))
+                num += 1
+            xvals = range(0, num)
+            barchart_dict = {'xvals':xvals,
+                             'yvals':yvals,
+                             'labels':labels,
+                             'colors':colors,
+                             'legend':legend,
+                             'legend_text':legend_text,
+                             'markers':markers}
+        return barchart_dict
+
+
+def get_unidec_results(engine, custom_colors, processed=True, fitted=True, peaks=True):
+    """
+    Return UniDec results in the format they are stored in the document
+    ---
+    engine : UniDec engine
+    custom_colors : list of RGB (0-255) colors of the first 15 species
+    processed, fitted, peaks : which results to include
+    """
+    results = {}
+    if processed:
+        results['Processed'] = {'xvals':engine.data.data2[:, 0],
+                                'yvals':engine.data.data2[:, 1],
+                                'color':[0,0,0], 'label':"Data", 'xlabels':"m/z", 
+                                'ylabels':"Intensity"}
+        
+    if fitted:
+        results['Fitted'] = {'xvals':[engine.data.data2[:, 0], 
+                                      engine.data.data2[:, 0]],
+                             'yvals':[engine.data.data2[:, 1], 
+                                      engine.data.fitdat],
+                             'colors':[[0,0,0], [1,0,0]], 'labels':['Data', 'Fit Data'],
+                             'xlabel':"m/z", 'ylabel':"Intensity", 
+                             'xlimits':[np.min(engine.data.data2[:, 0]), 
+                                        np.max(engine.data.data2[:, 0])]}
+        results['MW distribution'] = {'xvals':engine.data.massdat[:, 0],
+                                      'yvals':engine.data.massdat[:, 1],
+                                      'color':[0,0,0], 'label':"Data", 'xlabels':"Mass (Da)",
+                                      'ylabels':"Intensity"}
+        results['m/z vs Charge'] = {'grid':engine.data.mzgrid,
+                                    'xlabels':" m/z (Da)", 'ylabels':"Charge",
+                                    'cmap':engine.config.cmap}
+        results['MW vs Charge'] = {'xvals':engine.data.massdat[:, 0],
+                                   'yvals':engine.data.ztab,
+                                   'zvals':engine.data.massgrid,
+                                   'xlabels':"Mass (Da)", 'ylabels':"Charge",
+                                   'cmap':engine.config.cmap}
+    
+    if peaks:
+        individual_dict = get_individual_spectra(engine, custom_colors)
+        individual_dict['_massList_'] = list(get_mass_list(engine))
+        results['m/z with isolated species'] = individual_dict
+        results['Barchart'] = get_barchart(engine, custom_colors)
+        # overwrites peaks of the engine so it has to be done last
+        results['Charge information'] = engine.get_charge_peaks()
+        
+    return results
+
+
+def run_unidec(name, xvals, yvals, parameters, directory, peak_width=None, custom_colors=None):
+    """
+    Load, pre-process, deconvolute spectrum and pick peaks
+    ---
+    name : name of the dataset, used for filenames
+    directory : working directory of the run
+    peak_width : peak width (FWHM) in m/z, if None it is determined automatically
+    returns results in the format they are stored in the document
+    """
+    engine = unidec.UniDec()
+    set_unidec_parameters(engine.config, parameters)
+    engine.open_file(file_name=name, file_directory=directory,
+                     data_in=np.transpose([xvals, yvals]), clean=True, silent=True)
+    engine.process_data(silent=True)
+    if peak_width is None:
+        engine.get_auto_peak_width()
+    else:
+        engine.config.mzsig = peak_width
+    out = engine.run_unidec(silent=True)
+    if out != 0:
+        raise RuntimeError("UniDec run failed with error code {}".format(out))
+    engine.pick_peaks()
+    engine.convolve_peaks()
+    return get_unidec_results(engine, custom_colors)
+
+
+def _run_unidec_task(args):
+    name, xvals, yvals, parameters, directory, peak_width, custom_colors = args
+    # each run has its own directory so that configuration and output files are not shared
+    workdir = tempfile.mkdtemp(prefix="unidec_", dir=directory)
+    cwd = os.getcwd()
+    try:
+        results = run_unidec("unidec", xvals, yvals, parameters, workdir, peak_width, custom_colors)
+        return name, results, None
+    except Exception:
+        return name, None, traceback.format_exc()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_unidec_batch(spectra, parameters, directory=None, peak_width=None, custom_colors=None,
+                     n_workers=None, callback=None):
+    """
+    Deconvolute many spectra in pool of processes
+    ---
+    spectra : list of (name, xvals, yvals)
+    parameters : UniDec parameters (see get_unidec_parameters)
+    directory : directory in which the working directories are created, defaults to system temporary directory
+    peak_width : peak width (FWHM) in m/z, if None it is determined for each spectrum
+    n_workers : number of processes, defaults to number of cores
+    callback : function called with (name, n_done, n_total) after each spectrum
+    returns dictionary of name : (results, error); results are None if the run failed
+    """
+    if n_workers is None:
+        n_workers = cpu_count()
+    n_workers = max(1, min(len(spectra), n_workers))
+    args = [(name, np.asarray(xvals), np.asarray(yvals), 
+             check_mz_range(parameters, np.min(xvals), np.max(xvals)), 
+             directory, peak_width, custom_colors)
+            for name, xvals, yvals in spectra]
+    
+    output = {}
+    if n_workers == 1:
+        for name, results, error in map(_run_unidec_task, args):
+            output[name] = (results, error)
+            if callback is not None:
+                callback(name, len(output), len(args))
+        return output
+    
+    pool = Pool(n_workers)
+    try:
+        for name, results, error in pool.imap_unordered(_run_unidec_task, args):
+            output[name] = (results, error)
+            if callback is not None:
+                callback(name, len(output), len(args))
+    finally:
+        pool.close()
+        pool.join()
+    return output
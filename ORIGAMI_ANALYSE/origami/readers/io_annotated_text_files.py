@@ -17,255 +17,352 @@
 # -------------------------------------------------------------------------
 # __author__ lukasz.g.migas
 
-import pandas as pd
+import csv, os
+from collections import OrderedDict
 import numpy as np
-import os
-import time
+import pandas as pd
 
 from toolbox import convertHEXtoRGB1, _replace_labels
+from readers.io_text_cache import load_cached
 
-class MetaTextReader():
-    def __init__(self, filename, **kwargs):
-        tstart = time.time()
-        self.filename = filename
-        self.title = os.path.basename(filename)
-        
-        
-    def load_file(self, fname):
+# first cell of the row which describes the columns of the data block
+AXIS_KEYS = ["axis_x", "axis_y", "axis_xerr", "axis_yerr", "axis_color", "axis_colors", 
+             "axis_label", "axis_labels", "axis_y_min", "axis_y_max", "axis_xy", "axis_yx", 
+             "axis_url"]
+# columns which hold numbers (column type : name of the output list)
+NUMERIC_AXES = OrderedDict([("axis_x", "xvals"), ("axis_y", "yvals"), ("axis_xerr", "xvalsErr"),
+                            ("axis_yerr", "yvalsErr"), ("axis_y_min", "yvals_min"), 
+                            ("axis_y_max", "yvals_max"), ("axis_xy", "xyvals"), ("axis_yx", "xyvals")])
+# values which are treated as missing (same as pandas)
+NA_VALUES = set(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', 
+                 '1.#QNAN', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'])
 
-        if fname.endswith(".csv"):
-            df = pd.read_csv(fname, sep=',', engine='python', header=None)
-        elif fname.endswith(".txt"):
-            df = pd.read_csv(fname, sep='\t', engine='python', header=None)
-            
-        self.df = df
-        
-    def extract_data(self):
-        
-        plot_type = "multi-line"
-        plot_modifiers = {}
-        if "title" in list(self.df.iloc[:,0]):
-            idx = list(self.df.iloc[:,0]).index("title")
-            title = list(self.df.iloc[idx, 1::])[0]
-            
-        row_labels = list(self.df.iloc[:,0])
-        if "plot_type" in row_labels:
-            idx = row_labels.index("plot_type")
-            plot_type = list(self.df.iloc[idx, 1::])[0]
-            
-        if "x_label" in row_labels:
-            idx = row_labels.index("x_label")
-            x_label = list(self.df.iloc[idx, 1::])[0]
-        else: x_label = ""
-            
-        if "y_label" in row_labels:
-            idx = row_labels.index("y_label")
-            y_label = list(self.df.iloc[idx, 1::])[0]
-        else: y_label = ""
-            
-        if "x_unit" in row_labels:
-            idx = row_labels.index("x_unit")
-            x_unit = list(self.df.iloc[idx, 1::])[0]
-        else: x_unit = ""
-            
-        if "y_unit" in row_labels:
-            idx = row_labels.index("y_unit")
-            y_unit = list(self.df.iloc[idx, 1::])[0]
-        else: y_unit = ""
-            
-        if "order" in row_labels:
-            idx = row_labels.index("order")
-            order = list(self.df.iloc[idx, 1::])
-        else: order = []
+# name of the cached data (see readers.io_text_cache), change when format of the arrays changes
+CACHE_KIND = "annotated_v2"
+METADATA_KEYS = ['header', 'columns', 'n_columns']
+
+# data blocks larger than this are parsed in chunks of rows
+STREAM_MIN_NBYTES = 2 ** 26
+STREAM_CHUNK_ROWS = 2 ** 18
+
+PLOT_TYPES = {"multi-line":"Multi-line", "scatter":"Scatter", 
+              "line":"Line", "waterfall":"Waterfall", 
+              "grid-line":"Grid-line", "grid-scatter":"Grid-scatter",
+              "vertical-bar":"V-bar", "horizontal-bar":"H-bar"}
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_missing(value):
+    return value in NA_VALUES
+
+
+def _to_string_column(values):
+    """ Return column of text as array of strings and mask of missing values (arrays of objects are not cached) """
+    missing = np.asarray(pd.isnull(values), dtype=bool)
+    strings = ["" if is_missing else value for value, is_missing in zip(values, missing)]
+    try:
+        return np.array(strings, dtype=str), missing
+    except UnicodeEncodeError:
+        return np.array(strings, dtype=unicode), missing
+
+
+def _to_object_column(strings, missing):
+    """ Return column of text with missing values as NaN (as read by pandas) """
+    values = strings.astype(object)
+    values[missing] = np.nan
+    return values
+
+
+def _get_block_arrays(df, n_columns):
+    """ Columns of parsed data block, text columns are stored as strings and mask of missing values """
+    arrays = {}
+    for i in xrange(n_columns):
+        values = df[i].values
+        if values.dtype == object:
+            values, arrays["m{}".format(i)] = _to_string_column(values)
+        arrays["c{}".format(i)] = values
+    return arrays
+
+
+def _read_block_chunks(handle, delimiter, n_columns, dtype):
+    """ 
+    Parse data block in chunks of rows so only one chunk is held as float64 and
+    objects. Numeric columns are accumulated as float32 (values which are not
+    numbers are NaN) and text columns as strings and mask of missing values
+    """
+    chunks = dict([(i, []) for i in xrange(n_columns)])
+    masks = dict([(i, []) for i in dtype])
+    reader = pd.read_csv(handle, sep=delimiter, header=None, names=range(n_columns), 
+                         engine='c', dtype=dtype, chunksize=STREAM_CHUNK_ROWS)
+    for df in reader:
+        for i in xrange(n_columns):
+            values = df[i].values
+            if i in dtype:
+                values, missing = _to_string_column(values)
+                masks[i].append(missing)
+            else:
+                values = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float32)
+            chunks[i].append(values)
             
-        if "label" in row_labels:
-            idx = row_labels.index("label")
-            labels = list(self.df.iloc[idx, 1::].dropna())
-        elif "labels" in row_labels:
-            idx = row_labels.index("labels")
-            labels = list(self.df.iloc[idx, 1::].dropna())
-        else: labels = []
+    arrays = {}
+    for i in xrange(n_columns):
+        if i in dtype:
+            arrays["c{}".format(i)] = np.concatenate(chunks[i]) if chunks[i] else np.array([], dtype=str)
+            arrays["m{}".format(i)] = np.concatenate(masks[i]) if masks[i] else np.array([], dtype=bool)
+        else:
+            arrays["c{}".format(i)] = np.concatenate(chunks[i]) if chunks[i] else np.array([], dtype=np.float32)
+    return arrays
+
 
-        if "x_labels" in row_labels:
-            idx = row_labels.index("x_labels")
-            x_labels = list(self.df.iloc[idx, 1::].dropna())
-        else: x_labels = []
+def _get_grid_shape(n_grid):
+    """ Number of rows and columns of grid plot """
+    for n_max, n_rows, n_cols in [(2, 1, 2), (4, 2, 2), (6, 2, 3), (9, 3, 3),
+                                  (12, 3, 4), (16, 4, 4), (25, 5, 5)]:
+        if n_grid <= n_max:
+            return n_rows, n_cols
+    raise ValueError("Cannot plot grid larger than 5 x 5 (25 cells). You have selected {}".format(n_grid))
 
-        if "y_labels" in row_labels:
-            idx = row_labels.index("y_labels")
-            y_labels = list(self.df.iloc[idx, 1::].dropna())
-        else: y_labels = []
+
+class MetaTextReader():
+    """
+    Reader of annotated text files (see other_datasets). Rows at the top of the
+    file are read into key : values map and the data block which follows them is
+    parsed by the C parser of pandas, with text columns kept as text. Blocks of 
+    very large files (e.g. multi-line, scatter or waterfall data) are streamed 
+    through the parser in chunks of rows and their numeric columns are stored 
+    as float32.
+    """
+    def __init__(self, filename=None, **kwargs):
+        self.filename = filename
+        self.title = os.path.basename(filename) if filename is not None else ""
         
-        if "xlimits" in row_labels:
-            idx = row_labels.index("xlimits")
-            xlimits = list(self.df.iloc[idx, 1:3].dropna().astype('float32'))
-        else: xlimits = [None, None]
+        # rows above the data block
+        self.header = []
+        self.header_map = {}
+        # type of each column of the data block, e.g. axis_x
+        self.columns = []
+        # column index : array
+        self.data = {}
+        self.n_rows = 0
 
-        if "ylimits" in row_labels:
-            idx = row_labels.index("ylimits")
-            ylimits = list(self.df.iloc[idx, 1:3].dropna().astype('float32'))
-        else: ylimits = [None, None]
-            
-        if "color" in row_labels:
-            idx = row_labels.index("color")
-            colors = list(self.df.iloc[idx, 1::].dropna())
-        elif "colors" in row_labels:
-            idx = row_labels.index("colors")
-            colors = list(self.df.iloc[idx, 1::].dropna())
-        else: colors = []
+        if filename is not None:
+            self.load_file(filename)
         
-        if "column_type" in row_labels:
-            idx = row_labels.index("column_type")
-            column_types = list(self.df.iloc[idx, 1::].dropna())
-        else: column_types = []
-            
-        if "legend_labels" in row_labels:
-            idx = row_labels.index("legend_labels")
-            legend_labels = list(self.df.iloc[idx, 1::].dropna())
-        else: legend_labels = []
+    def _parse_file(self, fname):
+        delimiter = '\t' if fname.endswith(".txt") else ','
+        header, columns, first_row = [], [], []
+        with open(fname, 'rb') as handle:
+            # read rows until the first one which starts with a number
+            while True:
+                offset = handle.tell()
+                line = handle.readline()
+                if not line:
+                    break
+                if line.strip() == "":
+                    continue
+                row = next(csv.reader([line], delimiter=delimiter))
+                if len(row) > 0 and _is_number(row[0]):
+                    first_row = row
+                    handle.seek(offset)
+                    break
+                header.append(row)
+                if len(columns) == 0 and len(row) > 0 and row[0] in AXIS_KEYS:
+                    columns = row
             
-        if "legend_colors" in row_labels:
-            idx = row_labels.index("legend_colors")
-            legend_colors = list(self.df.iloc[idx, 1::].dropna())
-        else: legend_colors = []
+            n_columns = max([len(first_row), len(columns)] + [len(row) for row in header])
+            # text columns are kept as they are in the file
+            dtype = dict([(i, object) for i, column in enumerate(columns) if column not in NUMERIC_AXES])
+            if len(first_row) == 0:
+                arrays = _get_block_arrays(pd.DataFrame(columns=range(n_columns)), n_columns)
+            elif os.fstat(handle.fileno()).st_size - handle.tell() >= STREAM_MIN_NBYTES:
+                arrays = _read_block_chunks(handle, delimiter, n_columns, dtype)
+            else:
+                df = pd.read_csv(handle, sep=delimiter, header=None, names=range(n_columns), 
+                                 engine='c', dtype=dtype)
+                arrays = _get_block_arrays(df, n_columns)
+                
+        return arrays, {'header':header, 'columns':columns, 'n_columns':n_columns}
+
+    def load_file(self, fname):
+        self.filename = fname
+        arrays, metadata = load_cached(fname, CACHE_KIND, self._parse_file)
+        # entries in other format are treated as cache miss
+        if (any([key not in metadata for key in METADATA_KEYS]) or 
+            any(["c{}".format(i) not in arrays for i in xrange(metadata['n_columns'])])):
+            arrays, metadata = self._parse_file(fname)
         
-        if "hover_labels" in row_labels:
-            idx = row_labels.index("hover_labels")
-            hover_labels = list(self.df.iloc[idx, 1::].dropna())
-        else: hover_labels = []
+        self.header = metadata['header']
+        self.columns = metadata['columns']
+        self.header_map = {}
+        for row in self.header:
+            if len(row) > 0 and row[0] not in self.header_map:
+                values = row[1:] + [""] * (metadata['n_columns'] - len(row))
+                self.header_map[row[0]] = [np.nan if _is_missing(value) else value for value in values]
+        self.data = {}
+        for i in xrange(metadata['n_columns']):
+            values = arrays["c{}".format(i)]
+            if "m{}".format(i) in arrays:
+                values = _to_object_column(values, arrays["m{}".format(i)])
+            self.data[i] = values
+        self.n_rows = len(self.data[0]) if len(self.data) > 0 else 0
 
-        plot_modifiers.update(legend_labels=legend_labels, legend_colors=legend_colors,
-                              xlimits=xlimits, ylimits=ylimits)
-        xvals, yvals, zvals, xvalsErr, yvalsErr, itemColors, itemLabels  = [], [], [], [], [], [], []
-        xyvals = []
-        axis_y_min, axis_y_max, axis_note = [], [], []
-        xy_labels = []
+    # ------------------------------------------------------------------------
+    # header
+    # ------------------------------------------------------------------------
+    
+    def get_value(self, key, default=""):
+        """ First value of the row (NaN if it is empty) """
+        if key not in self.header_map:
+            return default
+        values = self.header_map[key]
+        return values[0] if len(values) > 0 else np.nan
+    
+    def get_values(self, key, dropna=True):
+        """ Values of the row """
+        values = self.header_map.get(key, [])
+        if dropna:
+            values = [value for value in values if not (isinstance(value, float) and np.isnan(value))]
+        return values
         
-        # get first index
-        first_num_idx = pd.to_numeric(self.df.iloc[:,0], errors='coerce').notnull().idxmax()
+    def get_limits(self, key):
+        values = self.get_values(key, dropna=False)[:2]
+        if len(values) == 0:
+            return [None, None]
+        return list(np.asarray([value for value in values if not (isinstance(value, float) and np.isnan(value))], 
+                               dtype=np.float32))
+
+    # ------------------------------------------------------------------------
+    # data block
+    # ------------------------------------------------------------------------
+    
+    def get_numeric_column(self, i):
+        """ Column as float32 array without missing values """
+        values = self.data[i]
+        if values.dtype == object:
+            values = pd.to_numeric(values, errors='coerce')
+        values = values[~np.isnan(values)]
+        return np.asarray(values, dtype=np.float32)
+    
+    def get_text_column(self, i, fill=''):
+        """ Column as list of strings with missing values replaced by fill """
+        values = self.data[i]
+        missing = pd.isnull(values)
+        return [fill if is_missing else str(value) for value, is_missing in zip(values, missing)]
+    
+    def get_numeric_block(self):
+        """ Rows whose first value is numeric as float32 matrix """
+        block = np.empty((self.n_rows, len(self.data)), dtype=np.float32)
+        for i in xrange(len(self.data)):
+            values = self.data[i]
+            if values.dtype == object:
+                values = pd.to_numeric(values, errors='coerce')
+            block[:, i] = values
+        return block[~np.isnan(block[:, 0])]
         
-        # check if axis labels have been provided
-        for xy_axis in ["axis_x", "axis_y", "axis_xerr", "axis_yerr", "axis_color", "axis_colors",  
-                        "axis_label", "axis_labels", "axis_y_min", "axis_y_max", "axis_xy"]:
-            if xy_axis in row_labels:
-                idx = row_labels.index(xy_axis)
-                xy_labels = list(self.df.iloc[idx, :])
+    def extract_data(self):
+        """
+        Return title and dataset (other_data) of the file. Colors are empty if 
+        they were not specified in the file
+        """
+        title = self.get_value("title", self.title)
+        plot_type = self.get_value("plot_type", "multi-line")
+        x_label = self.get_value("x_label")
+        y_label = self.get_value("y_label")
+        x_unit = self.get_value("x_unit")
+        y_unit = self.get_value("y_unit")
+        order = self.get_values("order", dropna=False)
+        labels = self.get_values("label") if "label" in self.header_map else self.get_values("labels")
+        x_labels = self.get_values("x_labels")
+        y_labels = self.get_values("y_labels")
+        xlimits = self.get_limits("xlimits")
+        ylimits = self.get_limits("ylimits")
+        colors = self.get_values("color") if "color" in self.header_map else self.get_values("colors")
+        column_types = self.get_values("column_type")
+        legend_labels = self.get_values("legend_labels")
+        legend_colors = self.get_values("legend_colors")
+        hover_labels = self.get_values("hover_labels")
+
+        plot_modifiers = {'legend_labels':legend_labels, 'legend_colors':legend_colors,
+                          'xlimits':xlimits, 'ylimits':ylimits}
+        output = dict([(name, []) for name in NUMERIC_AXES.values()])
+        zvals, itemColors, itemLabels, axis_note, urls = [], [], [], [], []
         
-        if len(xy_labels) == self.df.shape[1]:
-            df = self.df.iloc[first_num_idx:, :] #[pd.to_numeric(self.df.iloc[:,0], errors='coerce').notnull()]
-            for i, xy_label in enumerate(xy_labels):
-                if xy_label == "axis_x":
-                    xvals.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y":
-                    yvals.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_xerr":
-                    xvalsErr.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_yerr":
-                    yvalsErr.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y_min":
-                    axis_y_min.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label == "axis_y_max":
-                    axis_y_max.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label in ["axis_xy", "axis_yx"]:
-                    xyvals.append(np.asarray(self.df.iloc[:, i].dropna().astype('float32')))
-                if xy_label in ["axis_color", "axis_colors"]:
-                    _colors = list(self.df.iloc[:, i].dropna().astype("str"))
-                    _colorsRGB = []
-                    for _color in _colors:
-                        _colorsRGB.append(convertHEXtoRGB1(str(_color)))
-                    itemColors.append(_colorsRGB)
+        if len(self.columns) > 0:
+            for i, xy_label in enumerate(self.columns):
+                if xy_label in NUMERIC_AXES:
+                    output[NUMERIC_AXES[xy_label]].append(self.get_numeric_column(i))
+                elif xy_label in ["axis_color", "axis_colors"]:
+                    itemColors.append([convertHEXtoRGB1(color) for color in self.get_text_column(i, None) 
+                                       if color is not None])
                     plot_modifiers['color_items'] = True
-                if xy_label in ["axis_label", "axis_labels"]:
-                    itemLabels.append(list(self.df.iloc[:, i].replace(np.nan, '', regex=True).astype("str")))
+                elif xy_label in ["axis_label", "axis_labels"]:
+                    itemLabels.append(self.get_text_column(i))
                     plot_modifiers['label_items'] = True
-                if xy_label == "axis_note":
-                    axis_note.append(np.asarray(self.df.iloc[:, i].replace(np.nan, '', regex=True).astype('str')))
+                elif xy_label == "axis_note":
+                    axis_note.append(np.asarray(self.get_text_column(i)))
+                elif xy_label == "axis_url":
+                    urls.append(np.asarray(self.get_text_column(i, 'nan')))
+            xvals, yvals = output['xvals'], output['yvals']
         else:
-            # drop all other non-numeric rows
-            df = df[pd.to_numeric(self.df.iloc[:,0], errors='coerce').notnull()]
-            df = self.df.astype('float32')
-            
             # extract x, y and zvals
-            if self.df.shape[1] >= 2:
-                xvals = list(self.df.iloc[:, 0])
-            else: 
+            block = self.get_numeric_block()
+            if block.shape[1] < 2:
                 return None, None
+            xvals, yvals = list(block[:, 0]), []
+            if block.shape[1] == 2:
+                yvals = list(block[:, 1])
+            else:
+                zvals = block[:, 1::]
             
-            if self.df.shape[1] == 2:
-                yvals = list(self.df.iloc[:, 1])
-                
-            if self.df.shape[1] > 2:
-                zvals = self.df.iloc[:, 1::].as_matrix()
-                
             if plot_type in ["multi-line", "waterfall", "scatter", "grid-line", "grid-scatter"]:
-                yvals_new = []
-                for item in xrange(zvals.shape[1]):
-                    yvals_new.append(zvals[:, item])
-                    
-                # replace
+                if block.shape[1] == 2:
+                    yvals = [block[:, 1]]
+                else:
+                    yvals = [zvals[:, item] for item in xrange(zvals.shape[1])]
                 xvals = [xvals]
-                yvals = yvals_new
                 zvals = []
-                if len(labels) != len(yvals):
-                    labels = [""] * len(yvals)
         
         # create combination of x y columns
+        xyvals = output['xyvals']
         if len(xyvals) > 0:
             from itertools import product
-            xyproduct = list(product(xyvals, xyvals))
-            xvals, yvals = [], []
-            for iprod in xyproduct:
-                xvals.append(iprod[0])
-                yvals.append(iprod[1])
+            xvals = [x for x, __ in product(xyvals, xyvals)]
+            yvals = [y for __, y in product(xyvals, xyvals)]
             if len(x_labels) == len(xyvals) and len(y_labels) == len(xyvals):
                 xyproduct = list(product(x_labels, y_labels))
-                x_labels, y_labels = [], []
-                for iprod in xyproduct:
-                    x_labels.append(iprod[0])
-                    y_labels.append(iprod[1])
-                
+                x_labels = [x for x, __ in xyproduct]
+                y_labels = [y for __, y in xyproduct]
         
         if plot_type in ["grid-line", "grid-scatter", "grid-mixed"]:
-            n_xvals = len(xvals)
-            n_yvals = len(yvals)
-            n_grid = max([n_xvals, n_yvals])
-            if n_grid in [2]: n_rows, n_cols = 1, 2 
-            elif n_grid in [3, 4]: n_rows, n_cols = 2, 2 
-            elif n_grid in [5, 6]: n_rows, n_cols = 2, 3
-            elif n_grid in [7, 8, 9]: n_rows, n_cols = 3, 3
-            elif n_grid in [10, 11, 12]: n_rows, n_cols = 3, 4
-            elif n_grid in [13, 14, 15, 16]: n_rows, n_cols = 4, 4
-            elif n_grid in [17, 18, 19, 20, 21, 22, 23, 24, 25]: n_rows, n_cols = 5, 5
+            n_grid = max([len(xvals), len(yvals)])
+            n_rows, n_cols = _get_grid_shape(n_grid)
             plot_modifiers.update(n_grid=n_grid, n_rows=n_rows, n_cols=n_cols)
-                
-        # check if we need to add any metadata
-        if len(colors) == 0 or len(colors) < len(yvals):
-            colors = self.presenter.view.panelPlots.onChangePalette(None, 
-                                                                    n_colors=len(yvals), 
-                                                                    return_colors=True)
-        
+            
         if len(labels) != len(yvals):
             labels = [""] * len(yvals)
         
-        msg = "Item {} has: x-columns ({}), x-errors ({}), y-columns ({}), x-errors ({}), ".format(os.path.basename(fname), len(xvals),  len(xvalsErr), len(yvals), len(yvalsErr)) + \
+        msg = "Item {} has: x-columns ({}), x-errors ({}), y-columns ({}), x-errors ({}), ".format(
+            os.path.basename(self.filename), len(xvals), len(output['xvalsErr']), len(yvals), len(output['yvalsErr'])) + \
               "labels ({}), colors ({})".format(len(labels), len(colors))
         print(msg)
         
         # update title
-        _plot_types = {"multi-line":"Multi-line", "scatter":"Scatter", 
-                       "line":"Line", "waterfall":"Waterfall", 
-                       "grid-line":"Grid-line", "grid-scatter":"Grid-scatter",
-                       "vertical-bar":"V-bar", "horizontal-bar":"H-bar"}
-        
-        title = "{}: {}".format(_plot_types[plot_type], title)
+        title = "{}: {}".format(PLOT_TYPES[plot_type], title)
         other_data = {"plot_type":plot_type, 
                       "xvals":xvals, 
                       "yvals":yvals, 
                       "zvals":zvals,
-                      "xvalsErr":xvalsErr, 
-                      "yvalsErr":yvalsErr,
-                      "yvals_min":axis_y_min, 
-                      "yvals_max":axis_y_max,
+                      "xvalsErr":output['xvalsErr'], 
+                      "yvalsErr":output['yvalsErr'],
+                      "yvals_min":output['yvals_min'], 
+                      "yvals_max":output['yvals_max'],
                       "itemColors":itemColors, 
                       "itemLabels":itemLabels,
                       "xlabel":_replace_labels(x_label), 
@@ -279,9 +376,10 @@ class MetaTextReader():
                       "y_unit":y_unit,
                       "colors":colors, 
                       "labels":labels,
+                      "urls":urls,
                       "column_types":column_types, 
                       "column_order":order, 
-                      "path":fname,
+                      "path":self.filename,
                       "plot_modifiers":plot_modifiers}
         
-        return title, other_data
\ No newline at end of file
+        return title, other_data
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+import os, sys, copy, json, hashlib
+import numpy as np
+
+from document import is_dataset, get_raw_values
+from readers.io_compact import map_datasets, ArrayRef
+
+# groups whose heatmaps are copied between documents (comparison, overlay,
+# statistical and combined ions workflows)
+SHARED_GROUPS = ['IMS2DcompData', 'IMS2DoverlayData', 'IMS2DstatsData', 'IMS2DCombIons']
+
+# arrays smaller than this are not worth sharing
+SHARED_ARRAY_MIN_NBYTES = 4096
+
+MANIFEST_FILENAME = "references.json"
+
+
+def get_store_directory():
+    """ Per-user data directory where arrays of saved documents are written to """
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    return os.path.join(base, "ORIGAMI", "array_store")
+
+
+def get_array_hash(array):
+    """ Hash based on content of the array """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1()
+    digest.update(array.dtype.str)
+    digest.update(str(array.shape))
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+def _is_shared_key(key):
+    return key.startswith('zvals')
+
+
+class ArrayStore():
+    """
+    Store of heatmaps shared between documents. Each unique array is kept once
+    in memory (and once on disk) and every document which uses it holds a
+    reference. Shared arrays are read-only so processing functions copy them
+    before any in-place modification (copy-on-write, see processing.heatmap.get_writable).
+
+    Files are only removed when the document which used them is saved again
+    without them and no other saved document uses them. Files of documents
+    which were moved, renamed or deleted are kept.
+    """
+    def __init__(self, directory=None, min_nbytes=SHARED_ARRAY_MIN_NBYTES):
+        """
+        ---
+        directory : directory where arrays of saved documents are written to,
+            defaults to the per-user data directory
+        min_nbytes : arrays smaller than this are left in the document
+        """
+        if directory is None:
+            directory = get_store_directory()
+        self.directory = directory
+        self.min_nbytes = min_nbytes
+
+        # hash : array
+        self.arrays = {}
+        # hash : set of owners
+        self.references = {}
+        # owner : set of hashes
+        self.owners = {}
+        # id of shared array : hash, avoids re-hashing arrays which are already shared
+        self._hashes = {}
+        # files are never removed if references of saved documents were lost
+        self._can_remove_files = True
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def get_nbytes(self):
+        """ Memory used by the shared arrays """
+        return sum([array.nbytes for array in self.arrays.values()])
+
+    def get_count(self, key):
+        """ Number of owners of the array """
+        return len(self.references.get(key, ()))
+
+    def intern(self, array, owner):
+        """
+        Return shared copy of the array and add reference from the owner
+        ---
+        array : numpy array
+        owner : name of the document which uses the array
+        """
+        if not isinstance(array, np.ndarray) or array.nbytes < self.min_nbytes or array.dtype == object:
+            return array
+
+        key = self._hashes.get(id(array))
+        if key is None or self.arrays.get(key) is not array:
+            key = get_array_hash(array)
+
+        if key not in self.arrays:
+            # copy so the flags of array which might still be used elsewhere are not changed
+            shared = np.array(array, order='C')
+            shared.flags.writeable = False
+            self.arrays[key] = shared
+            self._hashes[id(shared)] = key
+
+        self.references.setdefault(key, set()).add(owner)
+        self.owners.setdefault(owner, set()).add(key)
+        return self.arrays[key]
+
+    def _intern_dataset(self, dataset, owner):
+        if not is_dataset(dataset):
+            return dataset
+
+        values = get_raw_values(dataset)
+        for key in values.keys():
+            if not _is_shared_key(key):
+                continue
+            value = values[key]
+            if isinstance(value, np.ndarray):
+                values[key] = self.intern(value, owner)
+            elif isinstance(value, list):
+                values[key] = [self.intern(item, owner) for item in value]
+        return dataset
+
+    def update_document(self, document):
+        """
+        Share heatmaps of the document and update its references. Arrays which
+        were removed from the document are released.
+        """
+        owner = document.title
+        previous = self.owners.pop(owner, set())
+        for key in previous:
+            self.references.get(key, set()).discard(owner)
+
+        for attribute in SHARED_GROUPS:
+            group = getattr(document, attribute, None)
+            if not isinstance(group, dict):
+                continue
+            for name in group:
+                self._intern_dataset(group[name], owner)
+
+        return document
+
+    def release(self, owner):
+        """ Remove all references of the owner """
+        for key in self.owners.pop(owner, set()):
+            self.references.get(key, set()).discard(owner)
+
+    def rename(self, owner, new_owner):
+        """ Move references when document is renamed """
+        keys = self.owners.pop(owner, set())
+        for key in keys:
+            self.references[key].discard(owner)
+            self.references[key].add(new_owner)
+        self.owners.setdefault(new_owner, set()).update(keys)
+
+    def gc(self):
+        """
+        Remove arrays which are not referenced by any open document from memory.
+        Files are never removed here (see externalize_document)
+        ---
+        returns number of arrays removed from memory
+        """
+        unused = [key for key, owners in self.references.items() if len(owners) == 0]
+        for key in unused:
+            array = self.arrays.pop(key, None)
+            self._hashes.pop(id(array), None)
+            del self.references[key]
+
+        return len(unused)
+
+    # ------------------------------------------------------------------------
+    # on-disk store
+    # ------------------------------------------------------------------------
+
+    def _get_manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILENAME)
+
+    def _load_manifest(self):
+        path = self._get_manifest_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as handle:
+                return json.load(handle)
+        except ValueError, e:
+            print("Could not read array store manifest: {}. Unused arrays will not be removed.".format(e))
+            self._can_remove_files = False
+            os.rename(path, path + ".bak")
+            return {}
+
+    def _save_manifest(self, manifest):
+        path = self._get_manifest_path()
+        with open(path + ".tmp", 'w') as handle:
+            json.dump(manifest, handle, indent=1)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + ".tmp", path)
+
+    def _remove_files(self, manifest, filenames):
+        """ Remove files which are not used by any saved document in the manifest """
+        if not self._can_remove_files:
+            return
+
+        in_use = set()
+        for used in manifest.values():
+            in_use.update(used)
+        for filename in filenames:
+            path = os.path.join(self.directory, filename)
+            if filename not in in_use and filename.endswith(".npy") and os.path.exists(path):
+                os.remove(path)
+
+    def _externalize_dataset(self, dataset, filenames):
+        if not is_dataset(dataset):
+            return dataset
+
+        output = {}
+        for key, value in get_raw_values(dataset).items():
+            if is_dataset(value):
+                value = self._externalize_dataset(value, filenames)
+            elif isinstance(value, np.ndarray) and value.nbytes >= self.min_nbytes and value.dtype != object:
+                value = self._write_array(value, filenames)
+            elif isinstance(value, ArrayRef) and value.shared and os.path.exists(value.path):
+                # array is already in the store
+                filenames.add(value.filename)
+                value = ArrayRef(value.filename, value.shape, value.dtype, value.directory, shared=True)
+            elif isinstance(value, ArrayRef) and value.nbytes >= self.min_nbytes:
+                value = self._write_array(value.load(), filenames)
+            output[key] = value
+        return output
+
+    def _write_array(self, array, filenames):
+        key = self._hashes.get(id(array))
+        if key is None or self.arrays.get(key) is not array:
+            key = get_array_hash(array)
+        filename = key + ".npy"
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            np.save(path, array)
+        filenames.add(filename)
+        return ArrayRef(filename, array.shape, array.dtype, self.directory, shared=True)
+
+    def externalize_document(self, document, filename):
+        """
+        Write large arrays of the document to the store and return shallow copy
+        of the document which only holds references to them. Arrays which are
+        already in the store are not written again. Files used by the previous
+        save of the document which are no longer used by any saved document are
+        removed.
+        ---
+        filename : path of the saved document, used as the owner of the files
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        filenames = set()
+        document = map_datasets(copy.copy(document),
+                                lambda dataset: self._externalize_dataset(dataset, filenames))
+
+        manifest = self._load_manifest()
+        owner = os.path.abspath(filename)
+        previous = manifest.get(owner, [])
+        manifest[owner] = sorted(filenames)
+        self._save_manifest(manifest)
+        self._remove_files(manifest, previous)
+        return document
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+import copy, os
+from collections import MutableMapping
+import numpy as np
+from scipy.sparse import csr_matrix  # @UnresolvedImport
+
+from document import DATASET_GROUPS, is_dataset, get_raw_values
+
+# default compact storage policy
+#    float32 : store floating point intensities in single precision
+#    axis : store evenly spaced axes as (start, step) and other axes as integer deltas
+#    sparse : store mostly empty heatmaps in CSR format
+#    sparse_density : maximum fraction of non-zero values for the CSR format
+#    axis_tolerance : maximum absolute error allowed when reconstructing an axis
+#    min_size : arrays smaller than this are left as they are
+DEFAULT_POLICY = {'float32': True,
+                  'axis': True,
+                  'sparse': True,
+                  'sparse_density': 0.25,
+                  'axis_tolerance': 1E-6,
+                  'min_size': 256}
+
+# keys which hold an axis rather than intensities
+AXIS_KEYS = ['xvals', 'yvals']
+INTENSITY_KEYS = ['yvals', 'zvals']
+
+
+class LazyValue(object):
+    """
+    Base class for values which are only materialised when they are first accessed
+    """
+    shape = ()
+    dtype = None
+
+    def load(self):
+        raise NotImplementedError("Must implement method")
+
+    @property
+    def nbytes(self):
+        """ size of the materialised array """
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    @property
+    def stored_nbytes(self):
+        """ size of the array as it is stored """
+        return self.nbytes
+
+    def __array__(self, dtype=None):
+        array = self.load()
+        if dtype is not None:
+            array = array.astype(dtype)
+        return array
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "{}(shape={}, dtype={})".format(self.__class__.__name__, self.shape, self.dtype)
+
+
+class ImplicitAxis(LazyValue):
+    """
+    Evenly spaced axis stored as (start, step, size)
+    """
+    def __init__(self, start, step, size, dtype):
+        self.start = float(start)
+        self.step = float(step)
+        self.shape = (int(size),)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def stored_nbytes(self):
+        return 24
+
+    def load(self):
+        return (self.start + np.arange(self.shape[0], dtype=np.float64) * self.step).astype(self.dtype)
+
+
+class DeltaAxis(LazyValue):
+    """
+    Monotonic axis stored as integer steps of fixed resolution from the first value
+    """
+    def __init__(self, start, resolution, deltas, dtype):
+        self.start = float(start)
+        self.resolution = float(resolution)
+        self.deltas = deltas
+        self.shape = (deltas.shape[0] + 1,)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def stored_nbytes(self):
+        return self.deltas.nbytes + 16
+
+    def load(self):
+        steps = np.empty(self.shape[0], dtype=np.int64)
+        steps[0] = 0
+        np.cumsum(self.deltas, out=steps[1:])
+        return (self.start + steps * self.resolution).astype(self.dtype)
+
+
+class SparseMatrix(LazyValue):
+    """
+    Mostly empty 2D array stored in CSR format
+    """
+    def __init__(self, matrix, dtype):
+        self.matrix = matrix
+        self.shape = matrix.shape
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def stored_nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def tocsr(self):
+        return self.matrix
+
+    def load(self):
+        return self.matrix.toarray().astype(self.dtype, copy=False)
+
+
+class ArrayRef(LazyValue):
+    """
+    Array stored in separate .npy file. The directory is set when the document is opened,
+    unless the array is kept in the shared array store.
+    """
+    shared = False
+
+    def __init__(self, filename, shape, dtype, directory=None, shared=False):
+        self.filename = filename
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.directory = directory
+        self.shared = shared
+
+    @property
+    def path(self):
+        return os.path.join(self.directory or "", self.filename)
+
+    @property
+    def stored_nbytes(self):
+        return 0
+
+    def load(self):
+        return np.load(self.path)
+
+    def __getstate__(self):
+        # directory depends on where the document is opened from
+        state = self.__dict__.copy()
+        if not self.shared:
+            state['directory'] = None
+        return state
+
+
+def materialise(value):
+    """ Return the array behind lazy value """
+    if isinstance(value, LazyValue):
+        return value.load()
+    return value
+
+
+class LazyDataset(MutableMapping):
+    """
+    Dataset dictionary which materialises lazy values as they are accessed. Once
+    a value was loaded it replaces the lazy object so it is only done once.
+    
+    It is not a dict subclass because Python 2 copies dict subclasses (dict(dataset),
+    update(dataset), **dataset) straight from the storage, which would hand out 
+    the lazy objects. Values (including lazy ones) are kept in the data dictionary; 
+    use document.is_dataset and document.get_raw_values to walk datasets.
+    """
+    def __init__(self, items=()):
+        self.data = dict(items)
+
+    def __getitem__(self, key):
+        value = self.data[key]
+        if isinstance(value, LazyValue):
+            value = value.load()
+            self.data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.data)
+
+    def has_key(self, key):
+        return key in self
+
+    def keys(self):
+        return self.data.keys()
+
+    def copy(self):
+        return dict(self.iteritems())
+
+    def raw_get(self, key, default=None):
+        """ Return value without materialising it """
+        return self.data.get(key, default)
+
+    def __reduce__(self):
+        # pickle/deepcopy as a normal dictionary with materialised values
+        return (dict, (), None, None, self.iteritems())
+
+
+def _compact_axis(values, policy):
+    tolerance = policy['axis_tolerance']
+    n_points = values.shape[0]
+    start, end = float(values[0]), float(values[-1])
+    step = (end - start) / (n_points - 1)
+    if step != 0:
+        implicit = ImplicitAxis(start, step, n_points, values.dtype)
+        if np.max(np.abs(implicit.load() - values)) <= tolerance:
+            return implicit
+
+    # quantize positions to the tolerance so that the reconstruction error does not accumulate
+    steps = np.round((values.astype(np.float64) - start) / tolerance).astype(np.int64)
+    deltas = np.diff(steps)
+    if deltas.size == 0 or deltas.min() < 0:
+        return values
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if deltas.max() <= np.iinfo(dtype).max:
+            return DeltaAxis(start, tolerance, deltas.astype(dtype), values.dtype)
+    return values
+
+
+def _compact_intensity(values, policy):
+    if policy['float32'] and values.dtype == np.float64:
+        values = values.astype(np.float32)
+
+    if policy['sparse'] and values.ndim == 2:
+        density = np.count_nonzero(values) / float(values.size)
+        if density <= policy['sparse_density']:
+            return SparseMatrix(csr_matrix(values), values.dtype)
+
+    return values
+
+
+def compact_array(values, key, is_heatmap=False, policy=None):
+    """
+    Convert array to compact representation based on its role in the dataset
+    ---
+    values : array
+    key : name of the array, e.g. 'xvals'
+    is_heatmap : when True, both 'xvals' and 'yvals' are treated as axes
+    """
+    if policy is None:
+        policy = DEFAULT_POLICY
+    if isinstance(values, ArrayRef):
+        values = values.load()
+    if not isinstance(values, np.ndarray) or values.size < policy['min_size']:
+        return values
+    if values.dtype.kind not in 'fiu':
+        return values
+
+    is_axis = key == 'xvals' or (key == 'yvals' and is_heatmap)
+    if is_axis:
+        if policy['axis'] and values.ndim == 1 and values.dtype.kind == 'f':
+            return _compact_axis(values, policy)
+        return values
+    elif key in INTENSITY_KEYS:
+        return _compact_intensity(values, policy)
+
+    return values
+
+
+def compact_dataset(dataset, policy=None):
+    """
+    Return copy of the dataset with its arrays stored in compact form. Nested
+    dictionaries (e.g. UniDec results) are processed too.
+    """
+    if not is_dataset(dataset):
+        return dataset
+
+    is_heatmap = 'zvals' in dataset
+    output = {}
+    for key, value in get_raw_values(dataset).items():
+        if is_dataset(value):
+            value = compact_dataset(value, policy)
+        else:
+            value = compact_array(value, key, is_heatmap, policy)
+        output[key] = value
+
+    return output
+
+
+def expand_dataset(dataset, directory=None):
+    """
+    Wrap dataset (and nested dictionaries) in LazyDataset if it contains any lazy values
+    ---
+    directory : directory of arrays stored outside of the document
+    """
+    if not is_dataset(dataset):
+        return dataset
+
+    values = get_raw_values(dataset)
+    is_lazy = False
+    for key, value in values.items():
+        if is_dataset(value):
+            expanded = expand_dataset(value, directory)
+            if expanded is not value:
+                values[key] = expanded
+                is_lazy = True
+        elif isinstance(value, LazyValue):
+            if isinstance(value, ArrayRef) and value.directory is None:
+                value.directory = directory
+            is_lazy = True
+
+    if is_lazy and not isinstance(dataset, LazyDataset):
+        dataset = LazyDataset(values)
+    return dataset
+
+
+def map_datasets(document, func):
+    """ Apply function to each dataset of the document and set the returned value """
+    for attribute, is_collection in DATASET_GROUPS.items():
+        group = getattr(document, attribute, None)
+        if not is_dataset(group):
+            continue
+        if is_collection:
+            output = group.__class__()
+            for name in group:
+                output[name] = func(group[name])
+        else:
+            output = func(group)
+        setattr(document, attribute, output)
+
+    return document
+
+
+def compact_document(document, policy=None):
+    """
+    Return shallow copy of the document with all datasets in compact form. The
+    original document is not modified.
+    """
+    if policy is None:
+        policy = DEFAULT_POLICY
+    else:
+        policy = dict(DEFAULT_POLICY, **policy)
+
+    document = copy.copy(document)
+    return map_datasets(document, lambda dataset: compact_dataset(dataset, policy))
+
+
+def expand_document(document, directory=None):
+    """
+    Make compact datasets transparently readable. Arrays are materialised when
+    they are first accessed.
+    ---
+    directory : directory of arrays stored outside of the document
+    """
+    return map_datasets(document, lambda dataset: expand_dataset(dataset, directory))
+
+
+def get_nbytes(value, stored=False):
+    """
+    Return size of array, lazy value or (nested) dataset in bytes
+    """
+    if isinstance(value, LazyValue):
+        return value.stored_nbytes if stored else value.nbytes
+    elif isinstance(value, np.ndarray):
+        return value.nbytes
+    elif is_dataset(value):
+        return sum([get_nbytes(item, stored) for item in get_raw_values(value).values()])
+    return 0
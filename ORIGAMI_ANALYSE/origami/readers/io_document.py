@@ -17,17 +17,138 @@
 # -------------------------------------------------------------------------
 # __author__ lukasz.g.migas
 
-import time
+import os, time, copy, hashlib, shutil, json
 import cPickle as pickle
+import numpy as np
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
-def save_py_object(filename=None, saveFile=None):
+from document import is_dataset, get_raw_values
+from readers.io_compact import (compact_document, expand_document, map_datasets, 
+                                ArrayRef)
+from readers.io_migrations import migrate_document, apply_pending_migrations
+
+# arrays smaller than this are always kept inside the document
+EXTERNAL_ARRAY_MIN_NBYTES = 65536
+
+# list of files written to the array directory by the last save
+ARRAY_MANIFEST_FILENAME = "arrays.json"
+
+def get_array_directory(filename):
+    """ Directory where arrays of the document are stored """
+    return os.path.splitext(filename)[0] + ".arrays"
+
+def _get_array_filename(array):
+    """ Filename based on content of the array so it is only written once """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1()
+    digest.update(array.dtype.str)
+    digest.update(str(array.shape))
+    digest.update(array.data)
+    return digest.hexdigest() + ".npy"
+
+def _externalize_dataset(dataset, directory, filenames):
+    if not is_dataset(dataset):
+        return dataset
+    
+    output = {}
+    for key, value in get_raw_values(dataset).items():
+        if is_dataset(value):
+            value = _externalize_dataset(value, directory, filenames)
+        elif isinstance(value, ArrayRef):
+            path = os.path.join(directory, value.filename)
+            if not os.path.exists(path):
+                shutil.copyfile(value.path, path)
+            filenames.add(value.filename)
+            value = ArrayRef(value.filename, value.shape, value.dtype)
+        elif isinstance(value, np.ndarray) and value.nbytes >= EXTERNAL_ARRAY_MIN_NBYTES:
+            filename = _get_array_filename(value)
+            path = os.path.join(directory, filename)
+            if not os.path.exists(path):
+                np.save(path, value)
+            filenames.add(filename)
+            value = ArrayRef(filename, value.shape, value.dtype)
+        output[key] = value
+        
+    return output
+
+def _get_referenced_filenames(dataset, filenames):
+    if not is_dataset(dataset):
+        return dataset
+    
+    for value in get_raw_values(dataset).values():
+        if is_dataset(value):
+            _get_referenced_filenames(value, filenames)
+        elif isinstance(value, ArrayRef) and value.directory is not None:
+            filenames.add(os.path.abspath(value.path))
+    return dataset
+
+def externalize_document(document, directory, in_use=None):
+    """
+    Write large arrays of the document to the directory and return shallow copy
+    of the document which only holds references to them. Files written by the 
+    previous save which are no longer used by the document are removed, other
+    files in the directory are never touched.
+    ---
+    in_use : document whose arrays were not loaded yet, its files are kept
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+        
+    filenames = set()
+    document = map_datasets(copy.copy(document), 
+                            lambda dataset: _externalize_dataset(dataset, directory, filenames))
+    
+    if in_use is not None:
+        paths = set()
+        map_datasets(copy.copy(in_use), lambda dataset: _get_referenced_filenames(dataset, paths))
+        filenames.update([os.path.basename(path) for path in paths 
+                          if os.path.dirname(path) == os.path.abspath(directory)])
+    
+    manifest_path = os.path.join(directory, ARRAY_MANIFEST_FILENAME)
+    previous = []
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r') as handle:
+                previous = json.load(handle)
+        except ValueError, e:
+            print("Could not read list of arrays: {}. Unused arrays will not be removed.".format(e))
+    
+    with open(manifest_path, 'w') as handle:
+        json.dump(sorted(filenames), handle, indent=1)
+        
+    for filename in previous:
+        path = os.path.join(directory, filename)
+        if filename not in filenames and os.path.exists(path):
+            os.remove(path)
+            
+    return document
+
+def save_py_object(filename=None, saveFile=None, policy=None, external_arrays=False,
+                   array_store=None):
     """ 
     Simple tool to save objects/dictionaries
+    ---
+    policy : compact storage policy, if None, the policy of the document is used
+    external_arrays : large arrays are saved in separate directory so the document
+        can be opened without reading them
+    array_store : shared array store, when provided large arrays are written to it 
+        instead so arrays used by multiple documents are only saved once
     """
     tstart = time.clock()
     print(''.join(['Saving data...']))
+    saveFile = cleanup_document(saveFile)
+    saveFile = apply_pending_migrations(saveFile)
+    document = saveFile
+    if policy is None:
+        policy = getattr(saveFile, 'compact_storage', None)
+    if policy:
+        saveFile = compact_document(saveFile, policy)
+    if array_store is not None and array_store.directory is not None:
+        saveFile = array_store.externalize_document(saveFile, filename)
+    elif external_arrays:
+        saveFile = externalize_document(saveFile, get_array_directory(filename), in_use=document)
     with open(filename, 'wb') as handle:
-        saveFile = cleanup_document(saveFile)
         pickle.dump(saveFile, handle, protocol=pickle.HIGHEST_PROTOCOL)
     tend = time.clock()
     print("Saved document in: {}. It took {:.4f} seconds.".format(filename, (tend-tstart)))
@@ -36,16 +157,60 @@ def open_py_object(filename=None):
     """
     Simple tool to open pickled objects/dictionaries
     """
-    if filename.rstrip('/')[-7:] == ".pickle":
-        with open(filename, 'rb') as f:
-            try:
-                return pickle.load(f)
-            except Exception, e:
-                print(e)
-                return None
-    else:
-        with open(filename + '.pickle', 'rb') as f:
-            return pickle.load(f)
+    if filename.rstrip('/')[-7:] != ".pickle" and filename.rstrip('/')[-4:] != ".pkl":
+        filename = filename + '.pickle'
+        
+    with open(filename, 'rb') as f:
+        try:
+            document = pickle.load(f)
+        except Exception, e:
+            print(e)
+            return None
+        
+    # compact and external arrays are loaded and old datasets are migrated 
+    # when they are accessed
+    if hasattr(document, 'title'):
+        document = expand_document(document, get_array_directory(filename))
+        document = migrate_document(document)
+    return document
+
+def open_py_objects(filenames, callback=None, n_workers=None):
+    """
+    Open multiple documents concurrently. Reading of the files overlaps but 
+    decoding of the pickles holds the GIL. Documents are saved with external arrays 
+    by default (config.document_external_arrays) so their pickles contain little 
+    more than metadata and arrays are read when they are first accessed. Documents 
+    saved by older versions are decoded fully until they are saved again. 
+    Decoding is not done in separate processes as the document would have to be 
+    pickled again to be sent back and decoded once more.
+    ---
+    callback : function called with (filename, document) as soon as each document 
+        is opened. It is called from the thread which called this function. 
+        Document is None if it could not be opened
+    n_workers : number of threads, defaults to number of cores
+    """
+    def _open(filename):
+        try:
+            return filename, open_py_object(filename)
+        except (IOError, ValueError, AttributeError, TypeError), e:
+            print(e)
+            return filename, None
+    
+    if n_workers is None:
+        n_workers = cpu_count()
+    pool = ThreadPool(max(1, min(len(filenames), n_workers)))
+    
+    documents = []
+    try:
+        for filename, document in pool.imap_unordered(_open, filenames):
+            if callback is not None:
+                callback(filename, document)
+            documents.append((filename, document))
+    finally:
+        pool.close()
+        pool.join()
+        
+    return documents
         
 def cleanup_document(document):
     
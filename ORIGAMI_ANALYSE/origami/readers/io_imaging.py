@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+"""
+Ingestion of imaging (DESI/MALDI) datasets. Scans are binned one at a time and
+appended to a sparse pixel x m/z matrix so the dense (n_pixels, n_bins) array
+is never created. Scans can come from any iterable of (x, y, mz, intensity),
+e.g. WatersRawReader.iter_scans() or SyntheticScanSource.iter_scans().
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix  # @UnresolvedImport
+
+from processing.spectra import check_uniform_bins, get_bin_indices
+
+
+def create_mz_edges(mz_min, mz_max, mz_bin):
+    """ Edges of m/z bins (same as WatersRawReader.create_bin_range) """
+    return np.arange(mz_min, mz_max + mz_bin, mz_bin)
+
+
+def bin_scan(mz, intensity, edges, normalize=False, uniform=None):
+    """
+    Bin scan onto m/z edges
+    ---
+    uniform : edges are evenly spaced, if None it is checked
+    returns (indices, values) of non-empty bins
+    """
+    mz = np.asarray(mz, dtype=np.float64)
+    intensity = np.asarray(intensity, dtype=np.float64)
+    n_bins = edges.shape[0] - 1
+    
+    indices = get_bin_indices(mz, edges, uniform) - 1
+    mask = (indices >= 0) & (indices < n_bins)
+    indices, intensity = indices[mask], intensity[mask]
+    
+    indices, inverse = np.unique(indices, return_inverse=True)
+    values = np.bincount(inverse, weights=intensity, minlength=indices.shape[0])
+    if normalize and values.shape[0] > 0 and values.max() > 0:
+        values = values / values.max()
+    return indices, values
+
+
+class ImagingCube():
+    """
+    Imaging dataset stored as sparse (n_pixels, n_bins) matrix with x/y 
+    position of each pixel
+    """
+    def __init__(self, matrix, xpos, ypos, mz_edges):
+        """
+        ---
+        matrix : scipy.sparse.csr_matrix of intensities
+        xpos, ypos : position of each pixel (row of the matrix)
+        mz_edges : edges of m/z bins (columns of the matrix)
+        """
+        self.matrix = matrix
+        self.xpos = np.asarray(xpos, dtype=np.float64)
+        self.ypos = np.asarray(ypos, dtype=np.float64)
+        self.mz_edges = np.asarray(mz_edges, dtype=np.float64)
+        self.mz_centres = (self.mz_edges[:-1] + self.mz_edges[1:]) / 2.
+        self._csc = None
+        
+        # position of each pixel in the image
+        self.xvals, self._xidx = np.unique(self.xpos, return_inverse=True)
+        self.yvals, self._yidx = np.unique(self.ypos, return_inverse=True)
+        
+    @property
+    def n_pixels(self):
+        return self.matrix.shape[0]
+    
+    @property
+    def shape(self):
+        """ Shape of the image (rows, columns) """
+        return self.yvals.shape[0], self.xvals.shape[0]
+    
+    def get_nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+    
+    def get_spectrum(self):
+        """ Summed spectrum of all pixels """
+        return self.mz_centres, np.asarray(self.matrix.sum(axis=0)).ravel()
+    
+    def get_pixel_spectrum(self, pixel):
+        """ Spectrum of single pixel """
+        return self.mz_centres, self.matrix.getrow(pixel).toarray().ravel()
+    
+    def get_tic(self):
+        """ Total intensity of each pixel """
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+    
+    def get_ion_intensity(self, mz_min, mz_max):
+        """ Summed intensity of each pixel in the m/z window """
+        start = max(np.searchsorted(self.mz_edges, mz_min, side='right') - 1, 0)
+        end = np.searchsorted(self.mz_edges, mz_max, side='left')
+        if self._csc is None:
+            # column slicing is done in CSC format
+            self._csc = self.matrix.tocsc()
+        return np.asarray(self._csc[:, start:end].sum(axis=1)).ravel()
+    
+    def to_image(self, values):
+        """ 
+        Arrange value of each pixel in 2D image. Missing pixels are 0 and 
+        pixels acquired more than once (e.g. in several MALDI functions) are summed
+        """
+        image = np.zeros(self.shape, dtype=np.float64)
+        np.add.at(image, (self._yidx, self._xidx), values)
+        return image
+    
+    def get_ion_image(self, mz_min, mz_max):
+        """ Image of the m/z window """
+        return self.to_image(self.get_ion_intensity(mz_min, mz_max))
+    
+    def get_tic_image(self):
+        return self.to_image(self.get_tic())
+
+
+def create_imaging_cube(scans, mz_edges, normalize=False, dtype=np.float32, uniform=None):
+    """
+    Stream scans of the source into sparse pixel x m/z matrix
+    ---
+    scans : iterable of (x, y, mz, intensity) of each pixel
+    mz_edges : edges of m/z bins
+    normalize : normalize each pixel to its maximum intensity
+    dtype : type of stored intensities
+    uniform : edges are evenly spaced, if None it is checked
+    """
+    mz_edges = np.asarray(mz_edges, dtype=np.float64)
+    if uniform is None:
+        uniform = check_uniform_bins(mz_edges)
+    indptr, indices, data, xpos, ypos = [0], [], [], [], []
+    for x, y, mz, intensity in scans:
+        scan_indices, scan_values = bin_scan(mz, intensity, mz_edges, normalize, uniform)
+        indices.append(scan_indices.astype(np.int32))
+        data.append(scan_values.astype(dtype))
+        indptr.append(indptr[-1] + scan_indices.shape[0])
+        xpos.append(x)
+        ypos.append(y)
+    
+    n_bins = mz_edges.shape[0] - 1
+    if len(indices) > 0:
+        matrix = csr_matrix((np.concatenate(data), np.concatenate(indices), np.asarray(indptr)),
+                            shape=(len(xpos), n_bins))
+    else:
+        matrix = csr_matrix((0, n_bins), dtype=dtype)
+    return ImagingCube(matrix, xpos, ypos, mz_edges)
+
+
+class SyntheticScanSource():
+    """
+    Imaging dataset with known ion images. Each ion is a Gaussian peak whose 
+    intensity in each pixel is given by its image, on top of random noise.
+    """
+    def __init__(self, shape=(20, 30), mz_range=(100., 1000.), ions=None, 
+                 n_noise_peaks=50, seed=0):
+        """
+        ---
+        shape : (rows, columns) of the image
+        mz_range : range of m/z values
+        ions : list of (mz, image) where image has the given shape. If None, 
+            three ions with simple patterns are created
+        n_noise_peaks : number of random peaks in each scan
+        """
+        self.shape = shape
+        self.mz_range = mz_range
+        self.n_noise_peaks = n_noise_peaks
+        self.seed = seed
+        if ions is None:
+            rows, cols = np.mgrid[0:shape[0], 0:shape[1]]
+            ions = [(300., (cols < shape[1] // 2).astype(np.float64) * 100),
+                    (500., (rows < shape[0] // 2).astype(np.float64) * 50),
+                    (750., np.ones(shape) * 10)]
+        self.ions = ions
+        
+    def __len__(self):
+        return self.shape[0] * self.shape[1]
+        
+    def iter_scans(self):
+        state = np.random.RandomState(self.seed)
+        for row in xrange(self.shape[0]):
+            for col in xrange(self.shape[1]):
+                mz = [state.uniform(self.mz_range[0], self.mz_range[1], self.n_noise_peaks)]
+                intensity = [state.uniform(0, 1, self.n_noise_peaks)]
+                for ion_mz, image in self.ions:
+                    mz.append(np.asarray([ion_mz]))
+                    intensity.append(np.asarray([image[row, col]]))
+                mz, intensity = np.concatenate(mz), np.concatenate(intensity)
+                order = np.argsort(mz)
+                yield col, row, mz[order], intensity[order]
@@ -17,93 +17,241 @@
 # -------------------------------------------------------------------------
 # __author__ lukasz.g.migas
 
-import pyteomics  # @UnresolvedImport
-from pyteomics import mgf  # @UnresolvedImport
-from collections import OrderedDict 
+import os, re, json, mmap
 import numpy as np
 
+from readers.io_compact import LazyDataset
+from readers.io_mzml import SpectrumArray
+from readers.io_tandem import TandemSpectra
+
+INDEX_VERSION = 1
+
+_peak_line = re.compile(r"^[-.\d]", re.M)
+_header_line = re.compile(r"^([A-Z_]+)=(.*?)\r?$", re.M)
+
+
+def get_index_filename(filename):
+    """ Index is stored next to the MGF file """
+    return filename + ".idx"
+
+
+def _parse_charge(value):
+    """ Convert charge such as '2+' or '2+ and 3+' to integer (first value) """
+    value = value.split(" ")[0].strip()
+    sign = -1 if value.endswith("-") else 1
+    try: 
+        return sign * int(value.strip("+-"))
+    except ValueError: 
+        return 0
+
+
+def _parse_pepmass(value):
+    """ PEPMASS holds m/z and optionally intensity of the precursor """
+    try: 
+        return float(value.split()[0])
+    except (ValueError, IndexError): 
+        return 0.
+
+
 class MGFreader():
+    """
+    Random-access MGF reader. Offset, title, precursor m/z, charge and number of 
+    peaks of every spectrum are recorded in single pass over the file and saved 
+    next to it so spectra can be read by their title or position. Peaks are 
+    parsed when they are accessed.
+    """
     def __init__(self, filename, **kwargs):
         self.filename = filename
-        self.source = self.create_parser()
         self.last_scan = 1
+        self._last_arrays = (None, None)
         
-    def create_parser(self):
-        return mgf.read(self.filename, convert_arrays=1, use_header=False)
+        self.index = self.create_index()
+        self.title_map = dict([(title, i) for i, title in enumerate(self.index['titles'])])
+        
+    def __len__(self):
+        return len(self.index['offsets'])
     
-    def get_all_titles(self):
-        scan_info = dict()
-        for scan, spectrum in enumerate(self.source):
-            scan_info[scan] = spectrum['params']['title']
+    # ------------------------------------------------------------------------
+    # index
+    # ------------------------------------------------------------------------
+    
+    def create_index(self):
+        """ Load persisted index or create it and save it next to the file """
+        stat = os.stat(self.filename)
+        path = get_index_filename(self.filename)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as handle:
+                    index = json.load(handle)
+                if (index['version'] == INDEX_VERSION and index['size'] == stat.st_size 
+                    and index['mtime'] == stat.st_mtime):
+                    return index
+            except (IOError, ValueError, KeyError), e:
+                print("Could not read MGF index: {}".format(e))
+        
+        index = self._scan_file()
+        index.update(version=INDEX_VERSION, size=stat.st_size, mtime=stat.st_mtime)
+        try:
+            with open(path, 'w') as handle:
+                json.dump(index, handle)
+        except IOError, e:
+            print("Could not save MGF index: {}".format(e))
             
-        return scan_info
+        return index
+    
+    def _scan_file(self):
+        """ Record offset and precursor information of each BEGIN IONS block """
+        offsets, titles, pepmass, charges, peak_counts = [], [], [], [], []
+        if os.path.getsize(self.filename) == 0:
+            return {'offsets':offsets, 'titles':titles, 'pepmass':pepmass, 
+                    'charges':charges, 'peak_counts':peak_counts}
+        
+        with open(self.filename, 'rb') as handle:
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                start = data.find("BEGIN IONS")
+                while start != -1:
+                    end = data.find("END IONS", start)
+                    if end == -1: 
+                        end = len(data)
+                    # header finishes with the first line which starts with a number
+                    match = _peak_line.search(data, start, end)
+                    header_end = match.start() if match else end
+                    header = data[start:header_end]
+                    
+                    offsets.append(start)
+                    params = dict(_header_line.findall(header))
+                    titles.append(params.get("TITLE", "").strip())
+                    pepmass.append(_parse_pepmass(params.get("PEPMASS", "")))
+                    charges.append(_parse_charge(params.get("CHARGE", "")))
+                    peak_counts.append(data[header_end:end].count("\n"))
+                    
+                    start = data.find("BEGIN IONS", end)
+            finally:
+                data.close()
+        
+        # spectra without title are named by their position
+        for i, title in enumerate(titles):
+            if title == "":
+                titles[i] = "Scan={}".format(i + 1)
+        
+        return {'offsets':offsets, 'titles':titles, 'pepmass':pepmass, 
+                'charges':charges, 'peak_counts':peak_counts}
+    
+    # ------------------------------------------------------------------------
+    # spectra
+    # ------------------------------------------------------------------------
+    
+    def _get_position(self, scan):
+        """ Position of the spectrum in the file from its title or index """
+        if isinstance(scan, basestring):
+            return self.title_map[scan]
+        return int(scan)
+    
+    def get_info(self, scan):
+        """ 
+        Return metadata of spectrum from the index
+        ---
+        scan : title of the spectrum or its index
+        """
+        position = self._get_position(scan)
+        return {'title':self.index['titles'][position],
+                'precursor_mz':np.round(self.index['pepmass'][position], 4),
+                'precursor_charge':self.index['charges'][position],
+                'peak_count':self.index['peak_counts'][position]}
+    
+    def get_arrays(self, offset):
+        """ Parse peaks of spectrum at given byte offset """
+        if self._last_arrays[0] == offset:
+            return self._last_arrays[1]
+        
+        peaks = []
+        with open(self.filename, 'rb') as handle:
+            handle.seek(offset)
+            for line in handle:
+                first = line[:1]
+                if first.isdigit() or first in "-.":
+                    peaks.append(line.split())
+                elif line.startswith("END IONS"):
+                    break
+        
+        xvals = np.array([float(peak[0]) for peak in peaks])
+        yvals = np.array([float(peak[1]) if len(peak) > 1 else 0. for peak in peaks])
+        charges = np.array([_parse_charge(peak[2]) if len(peak) > 2 else 0 for peak in peaks])
+        arrays = {'xvals':xvals, 'yvals':yvals, 'charges':charges}
+        
+        self._last_arrays = (offset, arrays)
+        return arrays
+    
+    def get_scan(self, scan):
+        """
+        Return spectrum with parsed peaks
+        ---
+        scan : title of the spectrum or its index
+        """
+        position = self._get_position(scan)
+        data = dict(self.get_arrays(self.index['offsets'][position]))
+        data['scan_info'] = self.get_info(position)
+        return data
+    
+    def get_lazy_scan(self, scan):
+        """
+        Return spectrum whose peaks are parsed when they are first accessed
+        """
+        position = self._get_position(scan)
+        offset = self.index['offsets'][position]
+        scan_info = self.get_info(position)
+        size = scan_info['peak_count']
+        data = dict([(key, SpectrumArray(self, offset, key, size)) 
+                     for key in ['xvals', 'yvals', 'charges']])
+        data['scan_info'] = scan_info
+        return LazyDataset(data)
+    
+    def get_all_titles(self):
+        return dict(enumerate(self.index['titles']))
     
     def get_title_from_scan(self, scan):
-        return scan['params']['title']
+        return scan['scan_info']['title']
             
     def get_all_info(self):
-        scan_info = dict()
-        for scan, spectrum in enumerate(self.source):
-            scan_info[scan] = {'title':spectrum['params']['title'],
-                               'precursor_mz':np.round(spectrum['params']['pepmass'][0], 4),
-                               'precursor_charge':spectrum['params']['charge'],
-                               'peak_count':len(spectrum['m/z array'])}
-            
-        return scan_info
+        return dict([(scan, self.get_info(scan)) for scan in xrange(len(self))])
     
     def get_info_from_scan(self, scan):
-        return {'title':scan['params']['title'],
-                'precursor_mz':np.round(scan['params']['pepmass'][0], 4),
-                'precursor_charge':scan['params']['charge'],
-                'peak_count':len(scan['m/z array'])}
+        return scan['scan_info']
     
     def get_all_scans(self):
         self.reset()
-        
-        data = OrderedDict()
-        for scan, spectrum in enumerate(self.source):
-            xvals, yvals, charges = self.get_spectrum_from_scan(spectrum, "1D")
-            scan_info = self.get_info_from_scan(spectrum)
-            data["Scan {}".format(scan)] = {'xvals':xvals, 'yvals':yvals, 'charges':charges,
-                                            'scan_info':scan_info}
-            
-        return data
+        return self.get_n_scans(len(self))
             
     def get_n_scans(self, n_scans):
-        data = OrderedDict()
-        for scan in xrange(n_scans):
-            try:
-                spectrum = next(self.source)
-            except StopIteration:
-                self.last_scan = scan + self.last_scan - 1
-                return data
-            scan_n = scan + self.last_scan
-            xvals, yvals, charges = self.get_spectrum_from_scan(spectrum, "1D")
-            scan_info = self.get_info_from_scan(spectrum)
-            data["Scan {}".format(scan_n)] = {'xvals':xvals, 'yvals':yvals, 'charges':charges,
-                                              'scan_info':scan_info}
-            
-        self.last_scan = scan_n
+        """
+        Return next n_scans spectra in columnar store. Metadata is taken from the
+        index and peaks are read when they are accessed (or the document is saved).
+        """
+        start = self.last_scan - 1
+        end = min(start + n_scans, len(self))
+        info = {'title':self.index['titles'][start:end],
+                'precursor_mz':np.round(self.index['pepmass'][start:end], 4),
+                'precursor_charge':self.index['charges'][start:end],
+                'ms_level':np.full(end - start, 2)}
+        data = TandemSpectra(["Scan {}".format(position + 1) for position in xrange(start, end)],
+                             info, self.index['peak_counts'][start:end],
+                             source=(self, self.index['offsets'][start:end]))
+
+        self.last_scan = end + 1
         return data
     
     def add_n_scans(self, data, n_scans):
-        for scan in xrange(n_scans):
-            try:
-                spectrum = next(self.source)
-            except StopIteration:
-                self.last_scan = scan + self.last_scan - 1
-                return data
-            scan_n = scan + self.last_scan
-            xvals, yvals, charges = self.get_spectrum_from_scan(spectrum, "1D")
-            scan_info = self.get_info_from_scan(spectrum)
-            data["Scan {}".format(scan_n)] = {'xvals':xvals, 'yvals':yvals, 'charges':charges,
-                                              'scan_info':scan_info}
+        start = self.last_scan - 1
+        end = min(start + n_scans, len(self))
+        for position in xrange(start, end):
+            data["Scan {}".format(position + 1)] = self.get_lazy_scan(position)
             
-        self.last_scan = scan_n
+        self.last_scan = end + 1
         return data
         
     def get_spectrum_from_scan(self, scan, mode="2D"):
-        xvals, yvals, charges = scan['m/z array'], scan['intensity array'], scan['charge array']
+        xvals, yvals, charges = scan['xvals'], scan['yvals'], scan['charges']
         
         if mode == "1D":
             return xvals, yvals, charges
@@ -116,17 +264,18 @@ class MGFreader():
             return lines
         
     def get_scan_by_title(self, title):
-        return self.source.get_spectrum(title)
+        return self.get_scan(title)
             
     def reset(self):
-        self.source.reset()
         self.last_scan = 1
         
     def create_title_map(self, data):
+        if isinstance(data, TandemSpectra):
+            return data.get_title_map()
         
         index_dict = {}
         for key in data:
             title = data[key]['scan_info']['title']
             index_dict[title] = key
 
-        return index_dict    
\ No newline at end of file
+        return index_dict
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+"""
+Document schema migrations. Each migration is registered with the schema
+version it upgrades the document to. Document-level migrations only touch
+attributes of the document and are applied when it is opened. Dataset-level
+migrations are applied to each dataset the first time it is accessed so old
+documents with many datasets open as quickly as documents in the current format.
+"""
+
+import copy, os
+
+from document import (document as documents, DATASET_GROUPS, DOCUMENT_SCHEMA_VERSION,
+                      is_dataset, get_raw_values)
+from readers.io_compact import LazyDataset
+from readers.io_tandem import TandemSpectra
+
+# list of (version, function, groups); groups is None for document-level migrations
+MIGRATIONS = []
+
+
+def register_migration(version, groups=None):
+    """
+    Register migration step
+    ---
+    version : schema version of the document after migration
+    groups : names of dataset groups the migration is applied to, e.g. ['IMS2Dions'].
+        If None, the migration is called with the document, otherwise it is called
+        with (dataset, name) when the dataset is first accessed
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, func, groups))
+        MIGRATIONS.sort(key=lambda migration: migration[0])
+        return func
+    return decorator
+
+
+def get_schema_version(document):
+    """ Schema version of the document. Documents saved before versioning was introduced are version 0 """
+    return getattr(document, 'schema_version', 0)
+
+
+class PendingDataset(LazyDataset):
+    """
+    Dataset with migrations which are applied when it is first accessed
+    """
+    def __init__(self, items, name, migrations):
+        LazyDataset.__init__(self, items)
+        self._name = name
+        self._migrations = migrations
+
+    def migrate(self):
+        """ Apply pending migrations """
+        migrations, self._migrations = self._migrations, None
+        if migrations:
+            for func in migrations:
+                func(self, self._name)
+
+    def __getitem__(self, key):
+        self.migrate()
+        return LazyDataset.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self.migrate()
+        LazyDataset.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.migrate()
+        LazyDataset.__delitem__(self, key)
+
+    def __contains__(self, key):
+        self.migrate()
+        return LazyDataset.__contains__(self, key)
+
+    def __iter__(self):
+        self.migrate()
+        return LazyDataset.__iter__(self)
+
+    def __len__(self):
+        self.migrate()
+        return LazyDataset.__len__(self)
+
+    def has_key(self, key):
+        return key in self
+
+    def keys(self):
+        self.migrate()
+        return LazyDataset.keys(self)
+
+    def raw_get(self, key, default=None):
+        self.migrate()
+        return LazyDataset.raw_get(self, key, default)
+
+
+def migrate_document(document):
+    """
+    Bring document to the current schema version. Document-level migrations are
+    applied straight away and datasets are wrapped so their migrations are applied
+    on first access.
+    """
+    version = get_schema_version(document)
+    if version >= DOCUMENT_SCHEMA_VERSION:
+        return document
+
+    pending = {}
+    for migration_version, func, groups in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        if groups is None:
+            func(document)
+        else:
+            for attribute in groups:
+                pending.setdefault(attribute, []).append(func)
+
+    for attribute, migrations in pending.iteritems():
+        group = getattr(document, attribute, None)
+        if not is_dataset(group) or len(group) == 0:
+            continue
+        if DATASET_GROUPS[attribute]:
+            for name in group.keys():
+                dataset = group[name]
+                if is_dataset(dataset):
+                    group[name] = PendingDataset(get_raw_values(dataset), name, list(migrations))
+        else:
+            setattr(document, attribute, PendingDataset(get_raw_values(group), '', list(migrations)))
+
+    document.schema_version = DOCUMENT_SCHEMA_VERSION
+    return document
+
+
+def apply_pending_migrations(document):
+    """ Apply migrations of datasets which were not accessed yet, e.g. before saving the document """
+    for attribute in DATASET_GROUPS:
+        group = getattr(document, attribute, None)
+        if not is_dataset(group):
+            continue
+        if isinstance(group, PendingDataset):
+            group.migrate()
+        elif DATASET_GROUPS[attribute]:
+            for dataset in group.values():
+                if isinstance(dataset, PendingDataset):
+                    dataset.migrate()
+    return document
+
+
+# ----------------------------------------------------------------------------
+# migrations
+# ----------------------------------------------------------------------------
+
+@register_migration(1)
+def add_missing_attributes(document):
+    """ Attributes introduced in newer versions of ORIGAMI (e.g. other_data, tandem_spectra) """
+    for attribute, value in documents().__dict__.iteritems():
+        if attribute != 'schema_version' and not hasattr(document, attribute):
+            setattr(document, attribute, copy.deepcopy(value))
+            print("Added missing attribute ('{}') to document".format(attribute))
+
+
+@register_migration(1, groups=['IMS2Dions', 'IMS2DionsProcess', 'IMS2DCombIons', 'IMS2DcompData'])
+def add_ion_metadata(dataset, name):
+    """ Ion heatmaps saved by older versions did not always have visual parameters """
+    for key, value in [('charge', ""), ('label', ""), ('alpha', 0.5), ('mask', 0.25)]:
+        dataset.setdefault(key, value)
+
+
+@register_migration(1, groups=['multipleMassSpectrum'])
+def add_spectrum_label(dataset, name):
+    """ Mass spectra are labelled with the filename without extension """
+    dataset.setdefault('label', os.path.splitext(name)[0])
+
+
+@register_migration(2)
+def convert_tandem_spectra(document):
+    """ MS/MS peak lists were stored as dictionary of scans """
+    tandem_spectra = getattr(document, 'tandem_spectra', {})
+    if isinstance(tandem_spectra, dict) and len(tandem_spectra) > 0:
+        document.tandem_spectra = TandemSpectra.from_scans(tandem_spectra)
@@ -17,52 +17,192 @@
 # -------------------------------------------------------------------------
 # __author__ lukasz.g.migas
 
-from pyteomics import mzid # @UnresolvedImport
-import zipfile, os, gzip
+import zipfile, gzip
+import numpy as np
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+# scores which are kept for each identification
+SCORE_NAMES = {'Scaffold:Peptide Probability':'scaffold_peptide_probability',
+               'IdentityE Score':'identity_e_score',
+               'Mascot:score':'mascot_score',
+               'Mascot:identity threshold':'mascot_threshold'}
+
+ITEM_COLUMNS = ['result', 'rank', 'charge', 'experimental_mz', 'calculated_mz', 'peptide_ref'] + SCORE_NAMES.values()
+RESULT_COLUMNS = ['spectrum_id', 'title', 'name']
+EVIDENCE_COLUMNS = ['item', 'evidence_ref']
+MODIFICATION_COLUMNS = ['peptide_ref', 'location', 'mass_delta', 'name', 'residues']
+
+
+def _get_tag(element):
+    """ Tag without namespace """
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _get_params(element):
+    """ Return dictionary of name : value of cvParam and userParam children """
+    params = {}
+    for child in element:
+        tag = _get_tag(child)
+        if tag in ['cvParam', 'userParam']:
+            params[child.get('name', "")] = child.get('value', "")
+    return params
+
+
+def _to_number(value, dtype=float, default=""):
+    try: 
+        return dtype(value)
+    except (TypeError, ValueError): 
+        return default
+
+
+def _to_columns(table):
+    """ Convert lists of values to numpy arrays. Text and mixed columns are kept as objects """
+    columns = {}
+    for key, values in table.iteritems():
+        types = set(map(type, values))
+        if len(types) == 1 and types.pop() in [int, float]:
+            columns[key] = np.array(values)
+        else:
+            columns[key] = np.array(values, dtype=object)
+    return columns
 
 
 class MZIdentReader():
+    """
+    Streaming mzIdentML reader. The file is read with iterparse and converted 
+    to columnar tables: 
+        results : one row per SpectrumIdentificationResult
+        items : one row per SpectrumIdentificationItem
+        evidence : peptide evidence of each item
+        modifications : modifications of each peptide
+    Compressed (.gz, .zip) files are decompressed while they are read.
+    """
     def __init__(self, filename, **kwargs):
-        
-        if filename.endswith('.gz') or filename.endswith('.zip'):
-            self.filename = self.extract_file(filename)
-        else:
-            self.filename = filename
-        self.source = self.create_parser()
+        self.filename = filename
         self.index_dict = {}
         self.index_dict_num = 0
+        self.tables = None
     
-    def extract_file(self, archive):
-        if archive.endswith('gz'):
-            in_f = gzip.open(archive, 'rb')
-            archive = archive.replace(".gz", "")
-            out_f = open(archive, 'wb')
-            out_f.write(in_f.read())
-            in_f.close()
-            out_f.close()
-            return archive
+    def open_file(self):
+        """ Return file-like object, compressed files are decompressed on-the-fly """
+        if self.filename.endswith('.gz'):
+            return gzip.open(self.filename, 'rb')
+        elif self.filename.endswith('.zip'):
+            archive = zipfile.ZipFile(self.filename, 'r')
+            return archive.open(archive.namelist()[0], 'r')
+        return open(self.filename, 'rb')
         
-        elif archive.endswith('zip'):
-            unzip_path = os.path.dirname(archive)
-            zip_ref = zipfile.ZipFile(archive, 'r')
-            zip_ref.extractall(unzip_path)
-            zip_ref.close()
-            
-            return os.path.splitext(archive)
-            
-        
-    def create_parser(self):
-        return mzid.read(self.filename)
-    
-    def get_next(self):
-        return next(self.source)
-    
     def reset(self):
-        self.source.reset()
+        self.tables = None
     
     def set_index_dict(self, index_dict):
         self.index_dict = index_dict
         self.index_dict_num = len(index_dict)
+        
+    def read_tables(self):
+        """ Read mzIdentML file into columnar tables """
+        if self.tables is not None:
+            return self.tables
+        
+        results = dict([(key, []) for key in RESULT_COLUMNS])
+        items = dict([(key, []) for key in ITEM_COLUMNS])
+        item_evidence = dict([(key, []) for key in EVIDENCE_COLUMNS])
+        modifications = dict([(key, []) for key in MODIFICATION_COLUMNS])
+        peptides, evidence, proteins = {}, {}, {}
+        
+        handle = self.open_file()
+        try:
+            stack = []
+            for event, element in ElementTree.iterparse(handle, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(element)
+                    continue
+                stack.pop()
+                tag = _get_tag(element)
+                if tag == 'DBSequence':
+                    params = _get_params(element)
+                    sequence = ""
+                    for child in element:
+                        if _get_tag(child) == 'Seq':
+                            sequence = child.text or ""
+                    proteins[element.get('id')] = (sequence, element.get('accession', ""), 
+                                                   params.get('protein description', ""))
+                elif tag == 'Peptide':
+                    peptide_id = element.get('id')
+                    for child in element:
+                        child_tag = _get_tag(child)
+                        if child_tag == 'PeptideSequence':
+                            peptides[peptide_id] = child.text or ""
+                        elif child_tag == 'Modification':
+                            names = [param.get('name', "") for param in child 
+                                     if _get_tag(param) == 'cvParam']
+                            modifications['peptide_ref'].append(peptide_id)
+                            modifications['location'].append(_to_number(child.get('location'), int))
+                            modifications['mass_delta'].append(_to_number(child.get('monoisotopicMassDelta')))
+                            modifications['name'].append(names[0] if names else "")
+                            modifications['residues'].append(child.get('residues', ""))
+                elif tag == 'PeptideEvidence':
+                    evidence[element.get('id')] = (element.get('dBSequence_ref'), 
+                                                   _to_number(element.get('start'), int),
+                                                   _to_number(element.get('end'), int),
+                                                   element.get('pre', ""), element.get('post', ""))
+                elif tag == 'SpectrumIdentificationResult':
+                    result = len(results['spectrum_id'])
+                    params = _get_params(element)
+                    results['spectrum_id'].append(element.get('spectrumID', ""))
+                    results['title'].append(params.get('spectrum title', ""))
+                    results['name'].append(element.get('name', ""))
+                    for child in element:
+                        if _get_tag(child) != 'SpectrumIdentificationItem':
+                            continue
+                        item = len(items['result'])
+                        scores = _get_params(child)
+                        items['result'].append(result)
+                        items['rank'].append(_to_number(child.get('rank'), int, 0))
+                        items['charge'].append(_to_number(child.get('chargeState'), int, 0))
+                        items['experimental_mz'].append(_to_number(child.get('experimentalMassToCharge'), float, np.nan))
+                        items['calculated_mz'].append(_to_number(child.get('calculatedMassToCharge'), float, np.nan))
+                        items['peptide_ref'].append(child.get('peptide_ref', ""))
+                        for name, key in SCORE_NAMES.iteritems():
+                            items[key].append(_to_number(scores.get(name), float, ""))
+                        for ref in child:
+                            if _get_tag(ref) == 'PeptideEvidenceRef':
+                                item_evidence['item'].append(item)
+                                item_evidence['evidence_ref'].append(ref.get('peptideEvidence_ref'))
+                else:
+                    continue
+                
+                # remove processed element so memory use does not grow with the file
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+        finally:
+            handle.close()
+        
+        self.tables = {'results':_to_columns(results), 
+                       'items':_to_columns(items), 
+                       'evidence':_to_columns(item_evidence), 
+                       'modifications':_to_columns(modifications),
+                       'peptides':peptides, 
+                       'peptide_evidence':evidence,
+                       'proteins':proteins}
+        return self.tables
+    
+    def match_results(self, index_dict):
+        """
+        Join spectrum identification results with spectra using their title or name
+        ---
+        returns array with scan ID of each result (None if it was not found)
+        """
+        results = self.read_tables()['results']
+        titles, names = results['title'], results['name']
+        scan_ids = np.empty(len(titles), dtype=object)
+        for i in xrange(len(titles)):
+            scan_ids[i] = index_dict.get(titles[i], index_dict.get(names[i], None))
+        return scan_ids
 
     def match_identification_with_peaklist(self, peaklist, index_dict=None):
         if index_dict is not None:
@@ -72,17 +212,24 @@ class MZIdentReader():
             print("Index dictionary is empty")
             return
         
-        self.reset()
-
-        found, notfound = 0, 0
-        for identity in self.source:
-            check, title, scanID = self.find_spectral_match(identity)
-            if check:
-                identification = self.get_spectrum_information(identity)
-                peaklist[scanID]['identification'] = identification
-                found += 1
-            else:
-                notfound += 1
+        tables = self.read_tables()
+        items = tables['items']
+        scan_ids = self.match_results(self.index_dict)
+        found = int(np.sum(scan_ids != None))  # @IgnorePep8
+        notfound = len(scan_ids) - found
+        
+        # only items of matched spectra are converted to the peaklist format
+        item_scan_ids = scan_ids[items['result']] if len(items['result']) > 0 else scan_ids[:0]
+        matched = np.flatnonzero(item_scan_ids != None)  # @IgnorePep8
+        evidence = self._group_rows(tables['evidence']['item'], matched)
+        modifications = self._group_rows(tables['modifications']['peptide_ref'])
+        
+        for scanID in set(item_scan_ids[matched]):
+            peaklist[scanID]['identification'] = {}
+        for item in matched:
+            identification = peaklist[item_scan_ids[item]]['identification']
+            identification[len(identification)] = self.get_item_information(item, evidence.get(item, []), 
+                                                                             modifications.get(items['peptide_ref'][item], []))
                 
         msg = "Found {}/{} | Not found {}/{}. There are {} unassigned spectra".format(found, found+notfound,
                                                                                       notfound, found+notfound,
@@ -90,98 +237,47 @@ class MZIdentReader():
         print(msg)
         return peaklist
     
-    def find_spectral_match(self, identification):
-        """
-        Check whether PSM match the peak list
-        -----
-        identification (dict): mzIdent dataset
-        spectral_dict (dict): key - value dictionary of ORIGAMI scan names and peaklist file titles
-        """
+    def _group_rows(self, keys, subset=None):
+        """ Return dictionary of key : row indices """
+        groups = {}
+        subset = set(subset) if subset is not None else None
+        for row, key in enumerate(keys):
+            if subset is None or key in subset:
+                groups.setdefault(key, []).append(row)
+        return groups
+    
+    def get_item_information(self, item, evidence_rows, modification_rows):
+        """ Convert single row of the items table to the peaklist format """
+        tables = self.tables
+        items = tables['items']
         
+        scores = dict([(key, items[key][item]) for key in SCORE_NAMES.values()])
         
-        if identification.get("spectrum title", "") in self.index_dict:
-            return True, identification['spectrum title'], self.index_dict[identification['spectrum title']]
-        elif identification.get("name", "") in self.index_dict:
-            return True, identification['name'], self.index_dict[identification['name']]
-        else:
-            return False, None, None
-
-    def get_spectrum_information(self, spectrum_in):
-        spectrum_out = {}
-        for spec in xrange(len(spectrum_in.get('SpectrumIdentificationItem', []))):
-            peptide_sequence = spectrum_in['SpectrumIdentificationItem'][spec]['PeptideSequence']
-            experimental_mz = spectrum_in['SpectrumIdentificationItem'][spec]['experimentalMassToCharge']
-            calculated_mz = spectrum_in['SpectrumIdentificationItem'][spec]['calculatedMassToCharge']
-            charge = spectrum_in['SpectrumIdentificationItem'][spec].get('chargeState', 0)
-            
-            # get dictionaries
-            scores = self.get_scores(spectrum_in['SpectrumIdentificationItem'][spec])
-            peptide_info = self.get_peptide_information(spectrum_in['SpectrumIdentificationItem'][spec].get('PeptideEvidenceRef', []))
-            modification_info = self.get_modifications(spectrum_in['SpectrumIdentificationItem'][spec].get('Modification', []))        
-            spectrum_out[spec] = {'peptide_seq':peptide_sequence, 
-                                  'experimental_mz':experimental_mz,
-                                  'calculated_mz':calculated_mz, 
-                                  'charge':charge, 
-                                  'scores':scores,
-                                  'peptide_info':peptide_info, 
-                                  'modification_info':modification_info}
-
-        return spectrum_out
+        peptide_info = {}
+        for i, row in enumerate(evidence_rows):
+            db_ref, start, end, pre, post = tables['peptide_evidence'].get(tables['evidence']['evidence_ref'][row], 
+                                                                            (None, "", "", "", ""))
+            sequence, accession, description = tables['proteins'].get(db_ref, ("", "", ""))
+            peptide_info[i] = {'peptide_seq':sequence,
+                               'protein_description':description, 
+                               'accession':accession, 
+                               'start':start, 
+                               'end':end,
+                               'peptide_prev_aa':pre, 
+                               'peptide_next_aa':post}
         
-    def get_peptide_information(self, peptide_in):
-        """
-        Retrieve peptide information from mzIdent file
-        """
-        peptide_out = {}
-        for pep in xrange(len(peptide_in)):
-            peptide_sequence = peptide_in[pep].get('Seq', "")
-            protein_description = peptide_in[pep].get('protein description', "")
-            accession = peptide_in[pep].get('accession', "")
-            start = peptide_in[pep].get('start', "")
-            end = peptide_in[pep].get('end', "")
-            pre = peptide_in[pep].get('pre', "")
-            post = peptide_in[pep].get('post', "")
-
-            peptide_out[pep] = {'peptide_seq':peptide_sequence,
-                                'protein_description':protein_description, 
-                                'accession':accession, 
-                                'start':start, 
-                                'end':end,
-                                'peptide_prev_aa':pre, 
-                                'peptide_next_aa':post}
-
-        return peptide_out
-
-    def get_modifications(self, modifications_in):
-        """
-        Retrieve modification information from mzIdent file
-        """
-        modifications_out = {}
-        for mod in xrange(len(modifications_in)):
-            modification_location = modifications_in[mod].get('location', "")
-            modification_mass_delta = modifications_in[mod].get('monoisotopicMassDelta', "")
-            modification_name = modifications_in[mod].get('name', "")
-            modification_residues = modifications_in[mod].get('residues', "")
-
-            modifications_out[mod] = {'location':modification_location, 
-                                      'mass_delta':modification_mass_delta,
-                                      'name':modification_name, 
-                                      'residues':modification_residues}
-
-        return modifications_out
-    
-    def get_scores(self, spectrum_in):
-        """
-        Retrieve a dictionary with scores
-        """
-        scaffold_pep_prob = spectrum_in.get('Scaffold:Peptide Probability', "")
-        identity_e_score = spectrum_in.get('IdentityE Score', "")
-        mascot_score = spectrum_in.get('Mascot:score', "")
-        mascot_threshold = spectrum_in.get('Mascot:identity threshold', "")
-
-        scores = {'scaffold_peptide_probability':scaffold_pep_prob,
-                  'identity_e_score':identity_e_score,
-                  'mascot_score':mascot_score,
-                  'mascot_threshold':mascot_threshold}
-
-        return scores
\ No newline at end of file
+        modification_info = {}
+        modifications = tables['modifications']
+        for i, row in enumerate(modification_rows):
+            modification_info[i] = {'location':modifications['location'][row], 
+                                    'mass_delta':modifications['mass_delta'][row],
+                                    'name':modifications['name'][row], 
+                                    'residues':modifications['residues'][row]}
+            
+        return {'peptide_seq':tables['peptides'].get(items['peptide_ref'][item], ""), 
+                'experimental_mz':items['experimental_mz'][item],
+                'calculated_mz':items['calculated_mz'][item], 
+                'charge':items['charge'][item], 
+                'scores':scores,
+                'peptide_info':peptide_info, 
+                'modification_info':modification_info}
@@ -1,42 +1,321 @@
 # -*- coding: utf-8 -*-
 
 # -------------------------------------------------------------------------
-#    Copyright (C) 2017-2018 Lukasz G. Migas 
+#    Copyright (C) 2017-2018 Lukasz G. Migas
 #    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
-# 
+#
 #     GitHub : https://github.com/lukasz-migas/ORIGAMI
 #     University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
 #     Cite : 10.1016/j.ijms.2017.08.014
 #
-#    This program is free software. Feel free to redistribute it and/or 
-#    modify it under the condition you cite and credit the authors whenever 
-#    appropriate. 
-#    The program is distributed in the hope that it will be useful but is 
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
 #    provided WITHOUT ANY WARRANTY; without even the implied warranty of
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
 # -------------------------------------------------------------------------
 # __author__ lukasz.g.migas
 
-from pymzml import run as pymzml_run #@UnresolvedImport
-from collections import OrderedDict 
+import os, re, json, zlib, base64
 import numpy as np
 
+from readers.io_compact import LazyValue, LazyDataset
+from readers.io_tandem import TandemSpectra, INFO_COLUMNS
+
+# controlled vocabulary used by the reader
+CV_MS_LEVEL = "MS:1000511"
+CV_SELECTED_MZ = "MS:1000744"
+CV_CHARGE = "MS:1000041"
+CV_TITLE = "MS:1000796"
+CV_FLOAT32 = "MS:1000521"
+CV_FLOAT64 = "MS:1000523"
+CV_INT32 = "MS:1000519"
+CV_INT64 = "MS:1000522"
+CV_ZLIB = "MS:1000574"
+CV_MZ_ARRAY = "MS:1000514"
+CV_INTENSITY_ARRAY = "MS:1000515"
+
+CV_DTYPES = {CV_FLOAT32: np.float32, CV_FLOAT64: np.float64,
+             CV_INT32: np.int32, CV_INT64: np.int64}
+CV_ARRAYS = {CV_MZ_ARRAY: 'xvals', CV_INTENSITY_ARRAY: 'yvals'}
+
+INDEX_VERSION = 1
+CHUNK_SIZE = 1 << 20
+
+_spectrum_tag = re.compile(r'<spectrum\s[^>]*?\bid="([^"]*)"')
+_spectrum_start = re.compile(r'<spectrum\s[^>]*>')
+_index_list_offset = re.compile(r'<indexListOffset>\s*(\d+)\s*</indexListOffset>')
+_spectrum_index = re.compile(r'<index\s+name="spectrum"\s*>(.*?)</index>', re.S)
+_offset = re.compile(r'<offset\s[^>]*?idRef="([^"]*)"[^>]*>\s*(\d+)\s*</offset>')
+_cv_param = re.compile(r'<cvParam\s[^>]*>')
+_attribute = re.compile(r'(\w+)="([^"]*)"')
+_binary_array = re.compile(r'<binaryDataArray\b(.*?)</binaryDataArray>', re.S)
+_binary = re.compile(r'<binary>(.*?)</binary>', re.S)
+
+
+def get_index_filename(filename):
+    """ Index is stored next to the mzML file """
+    return filename + ".idx"
+
+
+def _get_cv_params(text):
+    """ Return dictionary of accession : value of all cvParams in the text """
+    params = {}
+    for tag in _cv_param.findall(text):
+        attributes = dict(_attribute.findall(tag))
+        if 'accession' in attributes:
+            params[attributes['accession']] = attributes.get('value', "")
+    return params
+
+
+class SpectrumArray(LazyValue):
+    """
+    Peak array of a spectrum which is only decoded when it is accessed
+    """
+    def __init__(self, reader, offset, key, size):
+        self.reader = reader
+        self.offset = offset
+        self.key = key
+        self.shape = (size,)
+        self.dtype = np.dtype(np.float64)
+
+    def load(self):
+        return self.reader.get_arrays(self.offset)[self.key]
+
+
 class mzMLreader():
+    """
+    Random-access mzML reader. Byte offsets of all spectra are read from the
+    embedded index (or found by scanning the file once) and saved next to the
+    file so each spectrum can be read directly. Peak arrays are decoded when
+    they are accessed.
+    """
     def __init__(self, filename, **kwargs):
         self.filename = filename
-        self.source = self.create_parser()
         self.last_scan = 1
-        
-    def create_parser(self):
-        return pymzml_run.Reader(self.filename)
-    
+        self._last_arrays = (None, None)
+
+        self.ids, self.offsets = self.create_index()
+        self.id_map = dict([(scan_id, i) for i, scan_id in enumerate(self.ids)])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ------------------------------------------------------------------------
+    # index
+    # ------------------------------------------------------------------------
+
+    def create_index(self):
+        """ Load persisted index or create it and save it next to the file """
+        stat = os.stat(self.filename)
+        path = get_index_filename(self.filename)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as handle:
+                    index = json.load(handle)
+                if (index['version'] == INDEX_VERSION and index['size'] == stat.st_size
+                    and index['mtime'] == stat.st_mtime):
+                    return index['ids'], np.asarray(index['offsets'], dtype=np.int64)
+            except (IOError, ValueError, KeyError), e:
+                print("Could not read mzML index: {}".format(e))
+
+        with open(self.filename, 'rb') as handle:
+            ids, offsets = self._read_index_list(handle)
+            if ids is None:
+                ids, offsets = self._scan_offsets(handle)
+
+        try:
+            with open(path, 'w') as handle:
+                json.dump({'version': INDEX_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                           'ids': ids, 'offsets': offsets}, handle)
+        except IOError, e:
+            print("Could not save mzML index: {}".format(e))
+
+        return ids, np.asarray(offsets, dtype=np.int64)
+
+    def _read_index_list(self, handle):
+        """ Read offsets from the index of indexedmzML file. Returns (None, None) if it is missing or invalid """
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        handle.seek(max(0, size - 4096))
+        match = _index_list_offset.search(handle.read())
+        if match is None:
+            return None, None
+
+        handle.seek(int(match.group(1)))
+        match = _spectrum_index.search(handle.read())
+        if match is None:
+            return None, None
+
+        ids, offsets = [], []
+        for scan_id, offset in _offset.findall(match.group(1)):
+            ids.append(scan_id)
+            offsets.append(int(offset))
+
+        # make sure offsets point to the start of spectrum
+        if len(offsets) > 0:
+            handle.seek(offsets[0])
+            if not handle.read(10).startswith("<spectrum"):
+                print("Index of mzML file is invalid. Scanning file instead.")
+                return None, None
+        return ids, offsets
+
+    def _scan_offsets(self, handle):
+        """ Find byte offset of each spectrum by scanning the file once """
+        ids, offsets = [], []
+        handle.seek(0)
+        position, tail = 0, ""
+        while True:
+            chunk = handle.read(CHUNK_SIZE)
+            text = tail + chunk
+            start = position - len(tail)
+            # tags which could be cut at the end of chunk are processed with the next chunk
+            limit = len(text) if not chunk else max(0, len(text) - 4096)
+            last = 0
+            for match in _spectrum_tag.finditer(text):
+                if match.start() >= limit:
+                    break
+                ids.append(match.group(1))
+                offsets.append(start + match.start())
+                last = match.end()
+            if not chunk:
+                break
+            tail = text[max(limit, last):]
+            position += len(chunk)
+
+        return ids, offsets
+
+    # ------------------------------------------------------------------------
+    # spectra
+    # ------------------------------------------------------------------------
+
+    def _read_header(self, offset):
+        """ Read spectrum up to its binary data """
+        with open(self.filename, 'rb') as handle:
+            handle.seek(offset)
+            text = ""
+            while True:
+                chunk = handle.read(4096)
+                text += chunk
+                end = text.find("<binaryDataArrayList")
+                if end != -1:
+                    return text[:end]
+                end = text.find("</spectrum>")
+                if end != -1:
+                    return text[:end]
+                if not chunk:
+                    return text
+
+    def _read_spectrum(self, offset):
+        """ Read complete spectrum element """
+        with open(self.filename, 'rb') as handle:
+            handle.seek(offset)
+            text = ""
+            while True:
+                chunk = handle.read(65536)
+                text += chunk
+                end = text.find("</spectrum>")
+                if end != -1:
+                    return text[:end]
+                if not chunk:
+                    return text
+
+    def _get_position(self, scan):
+        """ Position of the scan in the file from its id or index """
+        if isinstance(scan, basestring):
+            return self.id_map[scan]
+        return int(scan)
+
+    def get_info(self, scan):
+        """
+        Return metadata of spectrum without decoding its peaks
+        ---
+        scan : id of the spectrum or its index
+        """
+        position = self._get_position(scan)
+        header = self._read_header(self.offsets[position])
+        params = _get_cv_params(header)
+        attributes = dict(_attribute.findall(_spectrum_start.search(header).group(0)))
+
+        try: precursor_mz = np.round(float(params[CV_SELECTED_MZ]), 4)
+        except (KeyError, ValueError): precursor_mz = 0.
+        try: charge = int(params[CV_CHARGE])
+        except (KeyError, ValueError): charge = 0
+        try: ms_level = int(params[CV_MS_LEVEL])
+        except (KeyError, ValueError): ms_level = 1
+        title = params.get(CV_TITLE, "")
+        if title in ["", "None"]:
+            title = "Scan={}".format(self.ids[position])
+
+        return {'title':title,
+                'precursor_mz':precursor_mz,
+                'precursor_charge':charge,
+                'peak_count':int(attributes.get('defaultArrayLength', 0)),
+                'ms_level':ms_level}
+
+    def get_arrays(self, offset):
+        """ Decode peak arrays of spectrum at given byte offset """
+        if self._last_arrays[0] == offset:
+            return self._last_arrays[1]
+
+        arrays = {}
+        for block in _binary_array.findall(self._read_spectrum(offset)):
+            params = _get_cv_params(block)
+            key = None
+            for accession in CV_ARRAYS:
+                if accession in params:
+                    key = CV_ARRAYS[accession]
+            if key is None:
+                continue
+
+            dtype = np.float64
+            for accession in CV_DTYPES:
+                if accession in params:
+                    dtype = CV_DTYPES[accession]
+            data = base64.b64decode(_binary.search(block).group(1).strip())
+            if CV_ZLIB in params:
+                data = zlib.decompress(data)
+            arrays[key] = np.frombuffer(data, dtype=dtype).astype(np.float64)
+
+        size = len(arrays.get('xvals', []))
+        arrays.setdefault('xvals', np.zeros(size))
+        arrays.setdefault('yvals', np.zeros(size))
+        arrays['charges'] = np.zeros(size)
+
+        self._last_arrays = (offset, arrays)
+        return arrays
+
+    def get_scan(self, scan):
+        """
+        Return spectrum with decoded arrays
+        ---
+        scan : id of the spectrum or its index
+        """
+        position = self._get_position(scan)
+        data = dict(self.get_arrays(self.offsets[position]))
+        data['scan_info'] = self.get_info(position)
+        return data
+
+    def get_lazy_scan(self, scan):
+        """
+        Return spectrum whose arrays are decoded when they are first accessed
+        """
+        position = self._get_position(scan)
+        offset = self.offsets[position]
+        scan_info = self.get_info(position)
+        size = scan_info['peak_count']
+        data = dict([(key, SpectrumArray(self, offset, key, size))
+                     for key in ['xvals', 'yvals', 'charges']])
+        data['scan_info'] = scan_info
+        return LazyDataset(data)
+
     def reset(self):
-        self.source = pymzml_run.Reader(self.filename)
         self.last_scan = 1
 
     def get_spectrum_from_scan(self, scan, mode="2D"):
-        xvals, yvals, charges = scan.mz, scan.i, np.zeros_like(scan.i)
-        
+        xvals, yvals, charges = scan['xvals'], scan['yvals'], scan['charges']
+
         if mode == "1D":
             return xvals, yvals, charges
         else:
@@ -46,38 +325,40 @@ class mzMLreader():
                 lines.append(pair)
 
             return lines
-        
+
     def get_info_from_scan(self, scan):
-        precursor_mz = np.round(scan['selected ion m/z'], 4)
-        try: charge = int(scan['charge state'])
-        except: charge = 0
-        title = scan.get('spectrum title', "")
-        if title in [None, "None"]:
-            title = "Scan={}".format(scan.ID)
-        
-        return {'title':title, 
-                'precursor_mz':precursor_mz,
-                'precursor_charge':charge,
-                'peak_count':len(scan.i)}    
+        return scan['scan_info']
 
     def get_n_scans(self, n_scans):
-        data = OrderedDict()
-        for scan in xrange(n_scans):
-            try: 
-                spectrum = next(self.source)
-            except StopIteration:
-                self.last_scan = scan + self.last_scan - 1
-                return data
-            scan_n = scan + self.last_scan
+        """
+        Return next n_scans spectra (only MS/MS spectra are kept) in columnar
+        store. Peaks are decoded when they are accessed (or the document is saved).
+        """
+        names, peak_counts, offsets = [], [], []
+        info = dict([(key, []) for key in INFO_COLUMNS])
+        start = self.last_scan - 1
+        end = min(start + n_scans, len(self.ids))
+        for position in xrange(start, end):
+            scan_info = self.get_info(position)
             # check if its MSn type
-            if spectrum['ms level'] != 2:
+            if scan_info['ms_level'] != 2:
                 continue
-            xvals, yvals, charges = self.get_spectrum_from_scan(spectrum, "1D")
-            scan_info = self.get_info_from_scan(spectrum)
-            data["Scan {}".format(scan_n)] = {'xvals':xvals, 'yvals':yvals, 'charges':charges,
-                                              'scan_info':scan_info}
+            names.append("Scan {}".format(position + 1))
+            peak_counts.append(scan_info['peak_count'])
+            offsets.append(self.offsets[position])
+            for key in INFO_COLUMNS:
+                info[key].append(scan_info[key])
 
-            
-        self.last_scan = scan_n
-        return data
-    
\ No newline at end of file
+        self.last_scan = end + 1
+        return TandemSpectra(names, info, peak_counts, source=(self, offsets))
+
+    def create_title_map(self, data):
+        if isinstance(data, TandemSpectra):
+            return data.get_title_map()
+
+        index_dict = {}
+        for key in data:
+            title = data[key]['scan_info']['title']
+            index_dict[title] = key
+
+        return index_dict
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+import copy
+from collections import OrderedDict
+import numpy as np
+
+from document import is_dataset
+from readers.io_compact import LazyValue, LazyDataset
+
+# keys of scan which are stored in the columnar arrays
+PEAK_KEYS = ['xvals', 'yvals', 'charges']
+# metadata columns (name in scan_info : dtype)
+INFO_COLUMNS = OrderedDict([('title', object),
+                            ('precursor_mz', np.float64),
+                            ('precursor_charge', np.int32),
+                            ('ms_level', np.int8)])
+
+
+def get_precursor_charge(value):
+    """
+    Return single precursor charge. Documents saved by older versions store
+    charges as read by pyteomics (ChargeList or None), the first one is used
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (list, tuple, np.ndarray)):
+        if len(value) == 0:
+            return 0
+        value = value[0]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class PeakArray(LazyValue):
+    """
+    Peaks of single scan which are read from the store when they are accessed
+    """
+    def __init__(self, store, position, key):
+        self.store = store
+        self.position = position
+        self.key = key
+        self.shape = (store.get_peak_count(position),)
+        self.dtype = np.dtype(np.float64)
+
+    def load(self):
+        return self.store.get_peaks(self.position)[self.key]
+
+
+class TandemScan(LazyDataset):
+    """
+    View of single scan in the store. Keys other than peaks and scan_info (e.g.
+    identification, fragment_annotations) are written back to the store.
+    """
+    def __init__(self, items, store, name):
+        LazyDataset.__init__(self, items)
+        self.store = store
+        self.name = name
+
+    def __setitem__(self, key, value):
+        LazyDataset.__setitem__(self, key, value)
+        if key not in PEAK_KEYS and key != 'scan_info':
+            self.store._extras.setdefault(self.name, {})[key] = value
+
+    def __delitem__(self, key):
+        LazyDataset.__delitem__(self, key)
+        self.store._extras.get(self.name, {}).pop(key, None)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+class TandemSpectra(object):
+    """
+    Columnar store of MS/MS peak lists. Peaks of all scans are kept in three
+    concatenated arrays with an offsets index and the precursor information in
+    a metadata table, instead of one dictionary (and three small arrays) per
+    scan. Behaves like the dictionary of scans used previously, e.g.
+    data['Scan 1']['xvals']; other keys (title, interactive_params, ...) are kept
+    in a normal dictionary.
+
+    Peaks can be left in the file (source) until the store is saved.
+    """
+    def __init__(self, names, info, peak_counts, source=None, peaks=None):
+        """
+        ---
+        names : list of scan names, e.g. ['Scan 1', 'Scan 2']
+        info : dictionary of metadata columns (see INFO_COLUMNS)
+        peak_counts : number of peaks in each scan
+        source : (reader, offsets) - reader with get_arrays(offset) method and
+            byte offset of each scan. Used when peaks were not loaded yet
+        peaks : (xvals, yvals, charges) concatenated peaks of all scans
+        """
+        self.names = list(names)
+        self.name_map = dict([(name, i) for i, name in enumerate(self.names)])
+        n_scans = len(self.names)
+
+        self.info = {}
+        for key, dtype in INFO_COLUMNS.items():
+            values = info.get(key)
+            if values is None:
+                values = [""] * n_scans if dtype is object else np.zeros(n_scans)
+            self.info[key] = np.asarray(values, dtype=dtype)
+
+        self.offsets = np.zeros(n_scans + 1, dtype=np.int64)
+        np.cumsum(peak_counts, out=self.offsets[1:])
+
+        self.xvals, self.yvals, self.charges = peaks if peaks is not None else (None, None, None)
+        self._source = source
+
+        # scan name : dictionary of other keys of the scan
+        self._extras = {}
+        # keys which are not scans
+        self.attributes = OrderedDict()
+
+    @classmethod
+    def from_scans(cls, scans):
+        """ Build store from dictionary of scans (format used by older versions) """
+        names, peaks, attributes = [], [], OrderedDict()
+        info = dict([(key, []) for key in INFO_COLUMNS])
+        for name in scans:
+            scan = scans[name]
+            if not is_dataset(scan) or 'scan_info' not in scan:
+                attributes[name] = scan
+                continue
+            names.append(name)
+            for key in INFO_COLUMNS:
+                info[key].append(scan['scan_info'].get(key, 2 if key == 'ms_level' else 0))
+            info['precursor_charge'][-1] = get_precursor_charge(info['precursor_charge'][-1])
+            peaks.append([np.asarray(scan[key], dtype=np.float64) for key in PEAK_KEYS])
+
+        peak_counts = [len(xvals) for xvals, __, __ in peaks]
+        concatenated = [np.concatenate([scan[i] for scan in peaks]) if len(peaks) > 0 else np.zeros(0)
+                        for i in range(len(PEAK_KEYS))]
+        store = cls(names, info, peak_counts, peaks=concatenated)
+        store.attributes = attributes
+        for name in names:
+            extras = dict([(key, value) for key, value in scans[name].items()
+                           if key not in PEAK_KEYS and key != 'scan_info'])
+            if len(extras) > 0:
+                store._extras[name] = extras
+        return store
+
+    # ------------------------------------------------------------------------
+    # columnar access
+    # ------------------------------------------------------------------------
+
+    @property
+    def is_loaded(self):
+        return self.xvals is not None
+
+    def load_peaks(self):
+        """ Read peaks of all scans from the source into the concatenated arrays """
+        if self.is_loaded:
+            return
+
+        reader, offsets = self._source
+        peaks = [reader.get_arrays(offset) for offset in offsets]
+        # number of peaks in the index is only an estimate for some formats
+        peak_counts = [len(arrays['xvals']) for arrays in peaks]
+        offsets = np.zeros(len(peak_counts) + 1, dtype=np.int64)
+        np.cumsum(peak_counts, out=offsets[1:])
+        self.offsets = offsets
+        for key in PEAK_KEYS:
+            values = [arrays[key] for arrays in peaks]
+            setattr(self, key, np.concatenate(values).astype(np.float64) if len(values) > 0 else np.zeros(0))
+        self._source = None
+
+    def get_peak_count(self, position):
+        return int(self.offsets[position + 1] - self.offsets[position])
+
+    def get_peaks(self, position):
+        """ Return peaks of scan as views of the concatenated arrays """
+        if not self.is_loaded:
+            reader, offsets = self._source
+            return reader.get_arrays(offsets[position])
+
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return {'xvals':self.xvals[start:end],
+                'yvals':self.yvals[start:end],
+                'charges':self.charges[start:end]}
+
+    def get_scan_info(self, name):
+        """ Return metadata of scan without creating view of its peaks """
+        position = self.name_map[name]
+        scan_info = dict([(key, self.info[key][position]) for key in INFO_COLUMNS])
+        scan_info['precursor_mz'] = float(scan_info['precursor_mz'])
+        scan_info['precursor_charge'] = int(scan_info['precursor_charge'])
+        scan_info['ms_level'] = int(scan_info['ms_level'])
+        scan_info['peak_count'] = self.get_peak_count(position)
+        return scan_info
+
+    def get_extra(self, name, key, default=None):
+        """ Return other value of scan (e.g. 'identification') without creating view of the scan """
+        return self._extras.get(name, {}).get(key, default)
+
+    def get_title_map(self):
+        """ Return dictionary of title : scan name """
+        return dict(zip(self.info['title'], self.names))
+
+    # ------------------------------------------------------------------------
+    # dictionary interface
+    # ------------------------------------------------------------------------
+
+    def __getitem__(self, key):
+        position = self.name_map.get(key)
+        if position is None:
+            return self.attributes[key]
+
+        items = self._extras.get(key, {}).items()
+        if self.is_loaded:
+            items.extend(self.get_peaks(position).items())
+        else:
+            items.extend([(peak_key, PeakArray(self, position, peak_key)) for peak_key in PEAK_KEYS])
+        items.append(('scan_info', self.get_scan_info(key)))
+        return TandemScan(items, self, key)
+
+    def __setitem__(self, key, value):
+        if key in self.name_map:
+            # peaks and metadata of scans are fixed
+            extras = dict([(extra_key, extra_value) for extra_key, extra_value in value.items()
+                           if extra_key not in PEAK_KEYS and extra_key != 'scan_info'])
+            self._extras[key] = extras
+        else:
+            self.attributes[key] = value
+
+    def __delitem__(self, key):
+        if key in self.name_map:
+            raise KeyError("Scans cannot be removed from the store")
+        del self.attributes[key]
+
+    def __contains__(self, key):
+        return key in self.name_map or key in self.attributes
+
+    has_key = __contains__
+
+    def __iter__(self):
+        for name in self.names:
+            yield name
+        for key in self.attributes.keys():
+            yield key
+
+    def __len__(self):
+        return len(self.names) + len(self.attributes)
+
+    def keys(self):
+        return list(self)
+
+    def iteritems(self):
+        for key in self:
+            yield key, self[key]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *args):
+        return self.attributes.pop(key, *args)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __getstate__(self):
+        # peaks are always saved with the document
+        self.load_peaks()
+        return self.__dict__.copy()
+
+    def __deepcopy__(self, memo):
+        # peaks and metadata are never modified so they are shared between copies
+        output = self.__class__.__new__(self.__class__)
+        output.__dict__.update(self.__dict__)
+        output._extras = copy.deepcopy(self._extras, memo)
+        output.attributes = copy.deepcopy(self.attributes, memo)
+        return output
+
+    def __repr__(self):
+        return "{}(scans={}, peaks={})".format(self.__class__.__name__, len(self.names), self.offsets[-1])
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+import os, sys, json, shutil, hashlib
+import numpy as np
+
+# version of the cache format, entries of other versions are ignored
+CACHE_VERSION = 2
+METADATA_FILENAME = "metadata.json"
+# running total of the size of all entries
+SIZE_FILENAME = "cache.json"
+DEFAULT_MAX_NBYTES = 1 << 30
+
+# cache used by the text readers (see set_text_cache)
+_text_cache = None
+
+
+def get_cache_directory():
+    """ Per-user cache directory of ORIGAMI """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "ORIGAMI", "text_cache")
+
+
+def get_text_cache():
+    return _text_cache
+
+
+def set_text_cache(cache):
+    """ Set cache used by the text readers. Caching is disabled if cache is None """
+    global _text_cache
+    _text_cache = cache
+
+
+class TextCache():
+    """
+    Cache of arrays parsed from text files. Each entry is a directory of .npy
+    files (and metadata of the source file) keyed by the path, size and
+    modification time of the file, so it is invalidated when the file changes.
+    Arrays are memory-mapped when they are loaded. The least recently used
+    entries are removed when the cache grows above max_nbytes.
+
+    Only arrays of numbers and strings can be cached, arrays of objects would 
+    have to be pickled. Size of the cache is kept as running total so the 
+    directory is only scanned when entries are evicted. The total can be 
+    slightly off when files are loaded by several processes at once, it is 
+    corrected at the next eviction.
+    """
+    def __init__(self, directory=None, max_nbytes=DEFAULT_MAX_NBYTES):
+        """
+        ---
+        directory : cache directory, defaults to the user cache directory
+        max_nbytes : maximum size of the cache on disk
+        """
+        if directory is None:
+            directory = get_cache_directory()
+        self.directory = directory
+        self.max_nbytes = max_nbytes
+
+    def get_key(self, path, kind):
+        """
+        Key of the cached file
+        ---
+        kind : name of the reader, e.g. 'heatmap'. Same file can be parsed by
+            different readers
+        """
+        stat = os.stat(path)
+        digest = hashlib.sha1()
+        # str() of float keeps only 12 digits, which drops sub-second changes
+        digest.update("{}|{}|{}|{}|{}".format(CACHE_VERSION, kind, os.path.abspath(path),
+                                              stat.st_size, repr(stat.st_mtime)))
+        return digest.hexdigest()
+
+    def get(self, path, kind):
+        """
+        Return cached (arrays, metadata) or None if the file is not in the cache
+        """
+        entry = os.path.join(self.directory, self.get_key(path, kind))
+        try:
+            with open(os.path.join(entry, METADATA_FILENAME), 'r') as handle:
+                info = json.load(handle)
+            arrays = {}
+            for name in info['arrays']:
+                # copy-on-write so the arrays can be modified without changing the cache
+                filename = os.path.join(entry, name + ".npy")
+                arrays[name] = np.asarray(np.load(filename, mmap_mode='c'))
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        # entries are evicted based on their last use
+        try: os.utime(entry, None)
+        except OSError: pass
+        return arrays, info['metadata']
+
+    def put(self, path, kind, arrays, metadata=None):
+        """
+        Add parsed arrays to the cache
+        ---
+        arrays : dictionary of name : numpy array
+        metadata : JSON serializable values, e.g. labels
+        """
+        entry = os.path.join(self.directory, self.get_key(path, kind))
+        if os.path.exists(entry):
+            return
+        for name, array in arrays.items():
+            if np.asarray(array).dtype == object:
+                print("Could not add {} to the cache: array '{}' holds objects".format(path, name))
+                return
+        temporary = entry + ".tmp{}".format(os.getpid())
+        try:
+            if not os.path.exists(temporary):
+                os.makedirs(temporary)
+            for name, array in arrays.items():
+                np.save(os.path.join(temporary, name + ".npy"), np.asarray(array))
+            with open(os.path.join(temporary, METADATA_FILENAME), 'w') as handle:
+                json.dump({'source':os.path.abspath(path), 'arrays':arrays.keys(),
+                           'metadata':metadata or {}}, handle)
+            nbytes = sum([os.path.getsize(os.path.join(temporary, filename))
+                          for filename in os.listdir(temporary)])
+            os.rename(temporary, entry)
+        except (IOError, OSError, TypeError, ValueError), e:
+            print("Could not add {} to the cache: {}".format(path, e))
+            shutil.rmtree(temporary, ignore_errors=True)
+            return
+
+        total = self._read_total()
+        if total is None:
+            total = self.get_nbytes()
+        else:
+            total += nbytes
+        if total > self.max_nbytes:
+            self.evict()
+        else:
+            self._write_total(total)
+
+    def load(self, path, kind, parser):
+        """
+        Return cached data or parse the file and add it to the cache
+        ---
+        parser : function called with the path which returns (arrays, metadata)
+        """
+        cached = self.get(path, kind)
+        if cached is not None:
+            return cached
+        arrays, metadata = parser(path)
+        self.put(path, kind, arrays, metadata)
+        return arrays, metadata
+
+    def _read_total(self):
+        """ Return running total of the size of the cache or None if it is not known """
+        try:
+            with open(os.path.join(self.directory, SIZE_FILENAME), 'r') as handle:
+                return int(json.load(handle)['nbytes'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_total(self, nbytes):
+        path = os.path.join(self.directory, SIZE_FILENAME)
+        temporary = path + ".tmp{}".format(os.getpid())
+        try:
+            with open(temporary, 'w') as handle:
+                json.dump({'nbytes':nbytes}, handle)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temporary, path)
+        except (IOError, OSError):
+            pass
+
+    def _get_entries(self):
+        """ Return list of (last use, size, path) of all entries """
+        entries = []
+        if not os.path.exists(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if not os.path.isdir(entry) or ".tmp" in name:
+                continue
+            nbytes = sum([os.path.getsize(os.path.join(entry, filename))
+                          for filename in os.listdir(entry)])
+            entries.append((os.path.getmtime(entry), nbytes, entry))
+        return entries
+
+    def get_nbytes(self):
+        """ Size of the cache on disk """
+        return sum([nbytes for __, nbytes, __ in self._get_entries()])
+
+    def evict(self):
+        """ Remove least recently used entries until the cache is smaller than max_nbytes """
+        entries = sorted(self._get_entries())
+        total = sum([nbytes for __, nbytes, __ in entries])
+        for __, nbytes, entry in entries:
+            if total <= self.max_nbytes:
+                break
+            try:
+                shutil.rmtree(entry)
+                total -= nbytes
+            except OSError:
+                # arrays of the entry are still memory-mapped
+                pass
+        self._write_total(total)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def load_cached(path, kind, parser):
+    """ Parse the file through the active text cache (if there is one) """
+    if _text_cache is None:
+        return parser(path)
+    try:
+        return _text_cache.load(path, kind, parser)
+    except OSError:
+        return parser(path)
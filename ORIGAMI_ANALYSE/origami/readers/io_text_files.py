@@ -18,10 +18,93 @@
 # __author__ lukasz.g.migas
 
 import os, time
+from multiprocessing import Pool, cpu_count
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import normalize
 from readers.io_utils import remove_non_digits_from_list
+from readers.io_text_cache import load_cached, get_text_cache, set_text_cache
+
+# number of bytes used to detect the delimiter and header of the file
+SNIFF_NBYTES = 65536
+# files larger than this are memory-mapped when they are parsed
+MEMORY_MAP_NBYTES = 1 << 24
+# candidate delimiters; whitespace (' ') is used if none of them is consistent
+DELIMITERS = ['\t', ',', ';']
+# fewer files are loaded without starting worker processes
+POOL_MIN_FILES = 8
+
+def _is_number(value):
+    """ Empty values are treated as missing numbers """
+    if value == "": 
+        return True
+    try: 
+        float(value)
+        return True
+    except ValueError: 
+        return False
+
+def _split_line(line, delimiter):
+    if delimiter == ' ':
+        return line.split()
+    return [item.strip() for item in line.split(delimiter)]
+
+def _read_sample(path, n_bytes=SNIFF_NBYTES):
+    """ Return complete, non-empty lines from the beginning of the file """
+    with open(path, 'rb') as handle:
+        sample = handle.read(n_bytes)
+    lines = sample.splitlines()
+    # last line might be cut in half
+    if len(sample) == n_bytes and len(lines) > 1:
+        lines = lines[:-1]
+    return [line for line in lines if line.strip() != ""]
+
+def sniff_text_file(path, n_bytes=SNIFF_NBYTES):
+    """
+    Detect delimiter and number of header rows from the beginning of the file
+    ---
+    returns (delimiter, n_header_rows, first_line); whitespace is returned as ' '
+    """
+    lines = _read_sample(path, n_bytes)
+    if len(lines) == 0:
+        return ' ', 0, ""
+    
+    delimiter = ' '
+    data_lines = lines[1:] if len(lines) > 1 else lines
+    for candidate in DELIMITERS:
+        n_columns = set([len(line.split(candidate)) for line in data_lines[:50]])
+        if len(n_columns) == 1 and n_columns.pop() > 1:
+            delimiter = candidate
+            break
+        
+    # header rows have at least one non-numeric value
+    n_header = 0
+    for line in lines:
+        if all([_is_number(item) for item in _split_line(line, delimiter)]):
+            break
+        n_header += 1
+        
+    return delimiter, n_header, lines[0]
+
+def _read_numeric(path, delimiter, skip_rows=0):
+    """ 
+    Parse numeric table with the C parser of pandas. Missing and non-numeric
+    values are replaced with 0 and empty columns are removed.
+    """
+    # rows can have different number of values (e.g. trailing delimiter)
+    n_columns = max([len(_split_line(line, delimiter)) for line in _read_sample(path)] or [1])
+    kwargs = {'header':None, 'names':range(n_columns), 'skiprows':skip_rows, 'engine':'c', 
+              'skip_blank_lines':True, 'memory_map':os.path.getsize(path) > MEMORY_MAP_NBYTES}
+    if delimiter == ' ':
+        kwargs['delim_whitespace'] = True
+    else:
+        kwargs['sep'] = delimiter
+    df = pd.read_csv(path, **kwargs)
+    
+    df.dropna(axis=1, how="all", inplace=True) # remove entire column that has NaNs
+    if any([dtype == object for dtype in df.dtypes]):
+        df = df.apply(pd.to_numeric, errors='coerce')
+    return np.nan_to_num(df.values.astype(np.float64))
 
 def check_file_type(path=None, fileName=None):
     """
@@ -30,65 +113,55 @@ def check_file_type(path=None, fileName=None):
     a 2D datafile. Obviously this might be wrong assumption! It is checked when 
     files are dropped into the main window.
     """
-    # get extension
-    fname, extension = os.path.splitext(path)
-    dirname = os.path.dirname(path)
+    # only read until enough rows were found
+    n_rows, last = 0, "\n"
+    with open(path, 'rb') as handle:
+        while n_rows <= 1000:
+            chunk = handle.read(SNIFF_NBYTES)
+            if not chunk:
+                break
+            n_rows += chunk.count("\n")
+            last = chunk[-1]
+    if last != "\n": 
+        n_rows += 1
     
-    # read data
-    if extension == '.csv':
-        ms = pd.read_csv(path, header=None)
-    elif extension in ['.txt', '.tab']:
-        ms = pd.read_csv(path, delim_whitespace=True, header=None)
-    
-    if ms.shape[0] > 1000: return "MS"
+    if n_rows > 1000: return "MS"
     else: return "2D"
 
+def _parse_infrared(path):
+    delimiter, __, __ = sniff_text_file(path)
+    # values that are not numbers are set to 0
+    return {'data':_read_numeric(path, delimiter)}, {}
+
 def text_infrared_open(path=None, normalize=None): # textOpenIRData
-    tstart = time.clock()
 
     outName = path.encode('ascii', 'replace')
-    # Determine what file type it is
-    fileNameExt = (str.split(outName, '.'))
-    fileNameExt = fileNameExt[-1]
-    if fileNameExt.lower() == 'csv':
-        _imsDataText = np.genfromtxt(outName, delimiter=',', missing_values=[""], filling_values=[0])
-    elif fileNameExt.lower() == 'txt':
-        _imsDataText = np.genfromtxt(outName, delimiter='\t', missing_values=[""], filling_values=[0])
-
-    # Remove values that are not numbers
-    _imsDataText = np.nan_to_num(_imsDataText)
+    arrays, __ = load_cached(outName, 'infrared', _parse_infrared)
+    _imsDataText = arrays['data']
+    
     yvals = _imsDataText[:, 0] 
     xvals = _imsDataText[0, :]
     zvals = _imsDataText[1:, 1:]
     
     return zvals, xvals, yvals
 
+def _parse_heatmap(path):
+    # first row holds labels of the x-axis and first column labels of the y-axis
+    delimiter, __, header = sniff_text_file(path)
+    zvals = _read_numeric(path, delimiter, skip_rows=1)
+    xlabels = map(float, remove_non_digits_from_list(_split_line(header, delimiter)))
+    return {'data':zvals}, {'xlabels':xlabels}
+
 def text_heatmap_open(path=None, normalize=None): # textOpen2DIMSdata
 
     outName = path.encode('ascii', 'replace')
-    # Determine what file type it is
-    fileNameExt = (str.split(outName, '.'))
-    fileNameExt = fileNameExt[-1]
-    
-    # Get data using pandas df
-    df = pd.read_csv(outName, sep='\t|,| ', engine='python', index_col=False)
-    # First value at 0,0 is equal to zero
-    df.rename(columns={'0.00':'', '0.00.1':'0.00'}, inplace=True)
-    
-    # Get xvalues
-    xvals = df.columns.tolist()
-    XaxisLabels = map(float, remove_non_digits_from_list(xvals))
-    
-    # Remove NaNs
-    df.dropna(axis=1, how="all", inplace=True) # remove entire column that has NaNs
-    df.fillna(value=0, inplace=True)
-    
-    # Convert df to matrix
-    zvals = df.as_matrix()
+    arrays, metadata = load_cached(outName, 'heatmap', _parse_heatmap)
+    zvals = arrays['data']
     imsDataText = zvals[:, 1::]
-    # Get yvalues
     YaxisLabels = zvals[:, 0]
     
+    # Get xvalues
+    XaxisLabels = metadata['xlabels']
     if (len(XaxisLabels) == (imsDataText.shape[1] + 1) and
         XaxisLabels[0] == 0):
         XaxisLabels = XaxisLabels[1::]
@@ -104,6 +177,68 @@ def text_heatmap_open(path=None, normalize=None): # textOpen2DIMSdata
     else:
         return imsDataText, XaxisLabels, YaxisLabels    
 
+def validate_heatmap(zvals, xvals, yvals):
+    """
+    Check shape of the heatmap and its axis labels
+    ---
+    returns description of the problem or None if heatmap is valid. Missing 
+    labels are allowed
+    """
+    if zvals.ndim != 2 or zvals.size == 0:
+        return "File does not contain 2D array"
+    if len(xvals) > 0 and len(xvals) != zvals.shape[1]:
+        return "Number of x-axis labels ({}) does not match number of columns ({})".format(len(xvals), 
+                                                                                          zvals.shape[1])
+    if len(yvals) > 0 and len(yvals) != zvals.shape[0]:
+        return "Number of y-axis labels ({}) does not match number of rows ({})".format(len(yvals), 
+                                                                                       zvals.shape[0])
+    return None
+
+def _open_heatmap(args):
+    """ Load and validate heatmap in worker process. Errors are returned rather than raised """
+    path, cache = args
+    # worker processes do not share the module state on all platforms
+    set_text_cache(cache)
+    try:
+        zvals, xvals, yvals = text_heatmap_open(path=path)
+    except Exception, e:
+        return path, None, str(e)
+    
+    data = {'zvals':zvals, 'xvals':xvals, 'yvals':yvals,
+            'yvals1D':np.sum(zvals, axis=1).T, 'yvalsRT':np.sum(zvals, axis=0)}
+    return path, data, validate_heatmap(zvals, xvals, yvals)
+
+def text_heatmaps_open(paths, n_workers=None):
+    """
+    Load multiple text heatmaps in pool of processes
+    ---
+    paths : list of filenames
+    n_workers : number of processes, defaults to number of cores
+    returns list of (path, data, error) in the same order as paths; data is None
+        if the file could not be read and error is None if the heatmap is valid
+    """
+    if n_workers is None:
+        n_workers = cpu_count()
+    n_workers = max(1, min(len(paths), n_workers))
+    args = [(path, get_text_cache()) for path in paths]
+    if n_workers == 1 or len(paths) < POOL_MIN_FILES:
+        return map(_open_heatmap, args)
+    
+    pool = Pool(n_workers)
+    try:
+        # small files are sent to the workers in batches
+        return pool.map(_open_heatmap, args, chunksize=max(1, len(paths) // (n_workers * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+def _parse_spectrum(path):
+    # rows with non-numerical values at the top of the file are skipped
+    delimiter, n_header, __ = sniff_text_file(path)
+    if n_header > 0:
+        print("Detected non-numerical values in the first {} row(s). These rows were skipped.".format(n_header))
+    return {'data':_read_numeric(path, delimiter, skip_rows=n_header)}, {}
+
 def text_spectrum_open(path=None): # textOpenMSData
     
     # get extension
@@ -111,23 +246,11 @@ def text_spectrum_open(path=None): # textOpenMSData
     dirname = os.path.dirname(path)
     
     # read data
-    if extension == '.csv':
-        ms = pd.read_csv(path, header=None)
-    elif extension in ['.txt', '.tab']:
-        ms = pd.read_csv(path, delim_whitespace=True, header=None)
-        
-    # check if first row is numerical
-    if ms.loc[0, :].dtype != 'float64':
-        print("Detected non-numerical values in the first row. Attempting to reopen the file and skipping the first row.")
-        if extension == '.csv':
-            ms = pd.read_csv(path, header=None, skiprows=1)
-        elif extension in ['.txt', '.tab']:
-            ms = pd.read_csv(path, delim_whitespace=True, header=None, skiprows=1)
+    arrays, __ = load_cached(path, 'spectrum', _parse_spectrum)
+    ms = arrays['data']
     
     # check how many rows are present
     n_rows = ms.shape[1] - 1
-    # convert to numpy array
-    ms = np.array(ms)
     if n_rows > 1:
         print("MS file has more than two columns. In future each row will be combined into one MS and additional container will be created for multiple MS")
         xvals, yvals = ms[:, 0], ms[:, 1]
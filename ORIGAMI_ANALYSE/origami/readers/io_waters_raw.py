@@ -24,7 +24,8 @@ import numpy as np
 from ctypes import cdll, c_float, byref
 
 from toolbox import strictly_increasing
-from processing.spectra import get_linearization_range, bin_1D, linearize
+from processing.spectra import (get_linearization_range, bin_1D, linearize, check_uniform_bins,
+                                 sum_1D_dictionary)
 from gui_elements.misc_dialogs import dlgBox
 from io_utils import clean_up
 
@@ -376,11 +377,13 @@ def rawMassLynx_MZDT_load(path=None, inputFile='output.2dDTMZ', normalize=False,
 
 def rawMassLynx_MS_bin(filename=None, startScan=0, endScan=-1, function=1,
                        mzStart=None, mzEnd=None, binsize=None, binData=False,
-                       **kwargs):
+                       sum_scans=False, **kwargs):
     """
     Extract MS data, bin it
     ---
     @param binData: boolean, determines if data should be binned or not
+    @param sum_scans: boolean, return summed spectrum (xvals, yvals) instead of
+        dictionary of scans. Binned scans are added to one array as they are read
     """
     tstart = time.clock()
     # Create pointer to the file
@@ -420,9 +423,14 @@ def rawMassLynx_MS_bin(filename=None, startScan=0, endScan=-1, function=1,
         elif kwargs['linearization_mode'] == "Binning":
             msList = np.arange(mzStart, mzEnd + binsize, binsize)
             msCentre = msList[:-1] + (binsize / 2)
+            uniform = check_uniform_bins(msList)
         else:
             msCentre = get_linearization_range(mzStart, mzEnd, binsize, kwargs['linearization_mode'])
 
+    msSum = None
+    if sum_scans and binData:
+        msSum = np.zeros(len(msCentre))
+
     msRange = np.arange(startScan, endScan) + 1
     # First extract data
     for scan in msRange:
@@ -439,16 +447,23 @@ def rawMassLynx_MS_bin(filename=None, startScan=0, endScan=-1, function=1,
         msY = np.ndarray((nPoints,), 'f', mzI, order='C')
         if binData:
             if kwargs['linearization_mode'] == "Binning":
-                msYbin = bin_1D(x=msX, y=msY, bins=msList)
+                msYbin = bin_1D(x=msX, y=msY, bins=msList, out=msSum, uniform=uniform)
             else:
                 msCentre, msYbin = linearize(data=np.transpose([msX, msY]),
                                             binsize=binsize, mode=kwargs['linearization_mode'],
                                             input_list=msCentre)
-            msDict[scan] = [msCentre, msYbin]
+                if msSum is not None:
+                    msSum += msYbin
+            if msSum is None:
+                msDict[scan] = [msCentre, msYbin]
         else:
             msDict[scan] = [msX, msY]
     tend = time.clock()
     print("It took {:.4f} seconds to process {} scans".format((tend - tstart), len(msRange)))
 
     # Return data
+    if msSum is not None:
+        return msCentre, msSum
+    elif sum_scans:
+        return sum_1D_dictionary(ydict=msDict)
     return msDict
@@ -7,7 +7,8 @@ import numpy as np
 import pandas as pd
 import time
 
-from processing.spectra import bin_1D, normalize_1D
+from processing.spectra import bin_1D, normalize_1D, check_uniform_bins
+from readers.io_imaging import create_imaging_cube
 from toolbox import str2num
 
 class WatersRawReader():
@@ -20,6 +21,7 @@ class WatersRawReader():
         self.bin_params = kwargs
         self.bin_list = self.create_bin_range()
         self.bin_centres = self.create_bin_centres()
+        self.uniform_bins = check_uniform_bins(self.bin_list)
         
         # create parsers        
         self.reader = self.create_file_parser()
@@ -80,63 +82,39 @@ class WatersRawReader():
         xvals, yvals = self.data_reader.ReadScan(function, scan)
         
         # linearize and normalize data
-        yvals, __ = np.histogram(xvals, bins=self.bin_list, weights=yvals)
+        yvals = bin_1D(xvals, yvals, bins=self.bin_list, uniform=self.uniform_bins)
         yvals = yvals/np.max(yvals)
         
         return yvals
     
-    def get_all_scans(self, instrument_type=None):
+    def get_scan_functions(self, instrument_type=None):
+        """ Functions which contain imaging scans """
         if instrument_type is None:
             instrument_type = self.instrument_type
         
-        yvals_summed = np.zeros_like(self.bin_centres)
-        zvals_summed = []
-        
-        # MALDI
+        # MALDI - pixels can be acquired in several functions
         if instrument_type in ["LDI+", "LDI-"]:
-            for fcn in range(self.n_functions):
-                for i in range(self.stats_in_functions[fcn]['n_scans']):
-                    yvals = self.get_scan_data(fcn, i)
-                    xpos, ypos = self.get_scan_headers(fcn, i)
+            return range(self.n_functions)
         # DESI
         elif instrument_type in ["ES+", "ES-"]:
-            fcn = 0 
-            n_scans = self.stats_in_functions[fcn]['n_scans']
-            ms_DF = np.zeros((n_scans, len(self.bin_centres)))
-            msBinDict = dict.fromkeys(range(n_scans))
-            
+            return [0]
+        return []
+    
+    def iter_scans(self, instrument_type=None):
+        """ Yield (x, y, mz, intensity) of each scan """
+        for fcn in self.get_scan_functions(instrument_type):
             for scan in range(self.stats_in_functions[fcn]['n_scans']):
-                yvals = self.get_scan_data(fcn, scan)
                 xpos, ypos = self.get_scan_headers(fcn, scan)
-            
-                ms_DF[int(scan), :] = yvals
-                msBinDict[int(scan)] = {'xval':str2num(xpos), 
-                                        'yval':str2num(ypos)}
-                
-                yvals_summed = np.add(yvals, yvals_summed)
-                zvals_summed.append(np.sum(yvals))
-                
-        
-        print(ms_DF.shape)
-        return ms_DF, msBinDict, yvals_summed, zvals_summed
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
+                xvals, yvals = self.data_reader.ReadScan(fcn, scan)
+                yield str2num(xpos), str2num(ypos), xvals, yvals
     
-    
\ No newline at end of file
+    def get_all_scans(self, instrument_type=None, normalize=True):
+        """
+        Bin all scans into sparse pixel x m/z cube
+        ---
+        normalize : normalize each scan to its maximum intensity
+        returns ImagingCube
+        """
+        return create_imaging_cube(self.iter_scans(instrument_type), self.bin_list, normalize=normalize,
+                                   uniform=self.uniform_bins)
+
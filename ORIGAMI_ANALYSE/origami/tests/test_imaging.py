@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+
+"""Validation of imaging cube ion images against synthetic datasets."""
+
+import os
+import sys
+import unittest
+from itertools import chain
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from readers import io_imaging
+
+MZ_BIN = 1.
+MZ_WINDOW = 0.5
+
+
+class ImagingCubeTest(unittest.TestCase):
+
+    def get_cube(self, source, n_functions=1):
+        """ Bin scans of the source, repeated n_functions times as in MALDI acquisitions """
+        edges = io_imaging.create_mz_edges(source.mz_range[0], source.mz_range[1], MZ_BIN)
+        scans = chain(*[source.iter_scans() for __ in range(n_functions)])
+        return io_imaging.create_imaging_cube(scans, edges)
+
+    def test_ion_images(self):
+        source = io_imaging.SyntheticScanSource(n_noise_peaks=0)
+        cube = self.get_cube(source)
+        self.assertEqual(cube.shape, source.shape)
+        for ion_mz, image in source.ions:
+            ion_image = cube.get_ion_image(ion_mz - MZ_WINDOW, ion_mz + MZ_WINDOW)
+            np.testing.assert_allclose(ion_image, image, rtol=1e-6)
+
+    def test_ion_images_noise(self):
+        # each noise peak has intensity below 1
+        source = io_imaging.SyntheticScanSource(n_noise_peaks=50)
+        cube = self.get_cube(source)
+        for ion_mz, image in source.ions:
+            ion_image = cube.get_ion_image(ion_mz - MZ_WINDOW, ion_mz + MZ_WINDOW)
+            self.assertTrue(np.all(ion_image >= image - 1e-3))
+            self.assertTrue(np.all(ion_image - image < source.n_noise_peaks))
+
+    def test_duplicate_pixels(self):
+        source = io_imaging.SyntheticScanSource(n_noise_peaks=0)
+        cube = self.get_cube(source, n_functions=2)
+        self.assertEqual(cube.n_pixels, 2 * len(source))
+        self.assertEqual(cube.shape, source.shape)
+        for ion_mz, image in source.ions:
+            ion_image = cube.get_ion_image(ion_mz - MZ_WINDOW, ion_mz + MZ_WINDOW)
+            np.testing.assert_allclose(ion_image, 2 * image, rtol=1e-6)
+        np.testing.assert_allclose(cube.get_tic_image().sum(), cube.get_tic().sum(), rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+
+"""Data exchange with the UniDec binary, driven by the stand-in executable in unidec_standin.py."""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST_DIR))
+
+import unidec
+from unidec_modules import unidecstructure
+import unidec_modules.unidectools as ud
+
+
+def make_launcher(directory):
+    """
+    Create executable that runs the stand-in with the current interpreter
+    ---
+    directory : directory in which the launcher is created
+    """
+    script = os.path.join(TEST_DIR, "unidec_standin.py")
+    if os.name == "nt":
+        path = os.path.join(directory, "unidec_standin.bat")
+        with open(path, "w") as f:
+            f.write('@"%s" "%s" %%*\n' % (sys.executable, script))
+    else:
+        path = os.path.join(directory, "unidec_standin")
+        with open(path, "w") as f:
+            f.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, script))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+class UniDecBinaryExchangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="unidec_test_")
+        self.launcher = make_launcher(self.directory)
+        mzaxis = np.arange(1000., 1100.)
+        self.spectrum = np.transpose([mzaxis, np.exp(-(mzaxis - 1050.) ** 2 / 50.)])
+        np.savetxt(os.path.join(self.directory, "spectrum.txt"), self.spectrum)
+        self.exports = []
+        self._dataexport = ud.dataexport
+
+        def dataexport(datatop, fname):
+            self.exports.append(os.path.basename(fname))
+            self._dataexport(datatop, fname)
+        ud.dataexport = dataexport
+
+    def tearDown(self):
+        ud.dataexport = self._dataexport
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def run_engine(self, ramdiskflag=0):
+        engine = unidec.UniDec()
+        engine.config.UniDecPath = self.launcher
+        engine.config.ramdiskflag = ramdiskflag
+        engine.open_file("spectrum.txt", self.directory, silent=True)
+        engine.config.startz, engine.config.endz = 1, 5
+        engine.process_data(silent=True)
+        self.assertEqual(engine.run_unidec(silent=True), 0)
+        return engine
+
+    def check_results(self, engine):
+        data2 = engine.data.data2
+        expected = [[1000., np.sum(data2[:, 1])], [2000., np.amax(data2[:, 1])]]
+        np.testing.assert_allclose(engine.data.massdat, expected, rtol=1e-5)
+        sse = 0.5
+        self.assertAlmostEqual(engine.config.error, 1 - sse / np.sum((data2[:, 1] - np.mean(data2[:, 1])) ** 2))
+        self.assertEqual(engine.data.mzgrid.shape, (len(data2) * 5, 3))
+
+    def unidecfiles(self):
+        return sorted(os.listdir(os.path.join(self.directory, "spectrum_unidecfiles")))
+
+    def test_defaults(self):
+        config = unidecstructure.UniDecConfig()
+        self.assertEqual(config.ramdiskflag, 0)
+
+    def test_disk_exchange(self):
+        engine = self.run_engine()
+        self.check_results(engine)
+        # input is only exported by process_data
+        self.assertEqual(self.exports, ["spectrum_input.dat"])
+        files = self.unidecfiles()
+        for fname in ["spectrum_input.dat", "spectrum_conf.dat", "spectrum_mass.txt", "spectrum_error.txt",
+                      "spectrum_grid.bin"]:
+            self.assertIn(fname, files)
+
+    def test_ramdisk_outputs_kept(self):
+        exchangedir = ud.get_exchange_directory()
+        if exchangedir is None:
+            self.skipTest("RAM-backed directory is not available")
+        tempdirs = set(os.listdir(exchangedir))
+
+        engine = self.run_engine(ramdiskflag=1)
+        self.check_results(engine)
+        self.assertEqual(self.exports, ["spectrum_input.dat"])
+        self.assertEqual(engine.config.outfname, "spectrum")
+        files = self.unidecfiles()
+        for fname in ["spectrum_input.dat", "spectrum_conf.dat", "spectrum_mass.txt", "spectrum_error.txt",
+                      "spectrum_grid.bin", "spectrum_massgrid.bin", "spectrum_fitdat.bin"]:
+            self.assertIn(fname, files)
+        # config on disk does not point to the temporary directory
+        with open(os.path.join(self.directory, "spectrum_unidecfiles", "spectrum_conf.dat"), "r") as f:
+            self.assertNotIn(exchangedir, f.read())
+        self.assertEqual(set(os.listdir(exchangedir)) - tempdirs, set())
+
+    def test_load_state(self):
+        engine = self.run_engine(ramdiskflag=1)
+        state = os.path.join(self.directory, "state.zip")
+        engine.save_state(state)
+        os.chdir(self.directory)
+        shutil.rmtree(os.path.join(self.directory, "spectrum_unidecfiles"))
+
+        loaded = unidec.UniDec()
+        self.assertTrue(loaded.load_state(state))
+        # input is exported as text with 6 decimals
+        np.testing.assert_allclose(loaded.data.data2, engine.data.data2, atol=1e-6)
+        np.testing.assert_allclose(loaded.data.massdat, engine.data.massdat)
+        self.assertAlmostEqual(loaded.config.error, engine.config.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+
+"""Validation of the in-process UniDec core against simulated spectra."""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unidec_modules import MassSpecBuilder as msb
+from unidec_modules import unidecstructure, unidec_core
+import unidec_modules.unidectools as ud
+
+# mass list, resolution, noise
+REFERENCE_SPECTRA = [([20000.], 1000, 0.),
+                     ([15000., 35000.], 500, 0.01),
+                     ([50000., 52000., 100000.], 500, 0.01)]
+MIN_R2 = 0.95
+
+
+def simulate_spectrum(masses, resolution, noise):
+    """
+    Build spectrum with MassSpecBuilder and a config that matches it
+    ---
+    masses : list of masses
+    resolution : mass resolution
+    noise : std deviation of Gaussian noise
+    """
+    params = msb.simple_params(masses, resolution=resolution, zwidth=1.5)
+    zrange = msb.get_zrange(params)
+    mzrange = msb.get_mzrange(params)
+    spectrum, ztab = msb.make_mass_spectrum(params, zrange=zrange, mzrange=[mzrange[0] * 0.8, mzrange[1] * 1.2],
+                                            mz_bin_size=1, noise=noise)
+
+    config = unidecstructure.UniDecConfig()
+    config.startz, config.endz = 1, int(np.amax(ztab)) + 10
+    config.masslb, config.massub, config.massbins = np.amin(masses) * 0.5, np.amax(masses) * 1.5, 10
+    config.mzsig = np.mean(params[:, 1] / params[:, 2])
+    config.psfun = 0
+    config.numit = 50
+    config.peakwindow = 500
+    config.peakthresh = 0.1
+    config.minmz, config.maxmz = spectrum[0, 0], spectrum[-1, 0]
+    return spectrum, config
+
+
+class UniDecCoreReferenceTest(unittest.TestCase):
+
+    def test_reference_spectra(self):
+        np.random.seed(0)
+        for masses, resolution, noise in REFERENCE_SPECTRA:
+            spectrum, config = simulate_spectrum(masses, resolution, noise)
+            data2 = ud.dataprep(spectrum, config)
+            result = unidec_core.run_unidec_core(data2, config)
+            peaks = ud.peakdetect(result['massdat'], config)
+
+            self.assertGreaterEqual(result['error'], MIN_R2, masses)
+            self.assertEqual(len(peaks), len(masses), (masses, peaks[:, 0]))
+            for mass in masses:
+                offset = np.amin(np.abs(peaks[:, 0] - mass))
+                self.assertLessEqual(offset, config.massbins, (mass, peaks[:, 0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------
+#    Copyright (C) 2017-2018 Lukasz G. Migas
+#    <lukasz.migas@manchester.ac.uk> OR <lukas.migas@yahoo.com>
+#
+#	 GitHub : https://github.com/lukasz-migas/ORIGAMI
+#	 University of Manchester IP : https://www.click2go.umip.com/i/s_w/ORIGAMI.html
+#	 Cite : 10.1016/j.ijms.2017.08.014
+#
+#    This program is free software. Feel free to redistribute it and/or
+#    modify it under the condition you cite and credit the authors whenever
+#    appropriate.
+#    The program is distributed in the hope that it will be useful but is
+#    provided WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE
+# -------------------------------------------------------------------------
+# __author__ lukasz.g.migas
+
+
+"""
+Stand-in for the UniDec binary. Like the binary, it reads the text input named in the config file and writes
+the mass distribution and run statistics as text and the grids as binary files. The outputs are deterministic:
+mass distribution [[1000, sum of intensities], [2000, max intensity]], sum of squared errors of 0.5 and zero grids.
+
+Usage: python unidec_standin.py conf.dat
+"""
+
+import sys
+
+import numpy as np
+
+SSE = 0.5
+
+
+def read_config(fname):
+    config = {}
+    with open(fname, "r") as f:
+        for line in f:
+            values = line.split(None, 1)
+            if len(values) == 2:
+                config[values[0]] = values[1].strip()
+    return config
+
+
+def main(fname):
+    config = read_config(fname)
+    outfname = config["output"]
+    data = np.loadtxt(config["input"])
+    numz = int(config["endz"]) - int(config["startz"]) + 1
+
+    massdat = np.array([[1000., np.sum(data[:, 1])], [2000., np.amax(data[:, 1])]])
+    np.savetxt(outfname + "_mass.txt", massdat)
+    with open(outfname + "_error.txt", "w") as f:
+        f.write("error = %s\ntime = 0.0\n" % SSE)
+    np.zeros(len(data) * numz).tofile(outfname + "_grid.bin")
+    np.zeros(len(massdat) * numz).tofile(outfname + "_massgrid.bin")
+    np.asarray(data[:, 1], dtype=np.float64).tofile(outfname + "_fitdat.bin")
+    print "UniDec stand-in: %s -> %s" % (config["input"], outfname)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
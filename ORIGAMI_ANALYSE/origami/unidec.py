@@ -1,10 +1,12 @@
-import os, time, shutil, subprocess, zipfile, fnmatch, string
+import os, time, shutil, subprocess, zipfile, fnmatch, string, tempfile
+from multiprocessing import Pool, cpu_count
 from copy import deepcopy
+from distutils.spawn import find_executable
 import numpy as np
 from scipy.interpolate import interp1d
 from scipy import signal
 
-from unidec_modules import unidecstructure, peakstructure, MassFitter
+from unidec_modules import unidecstructure, peakstructure, MassFitter, unidec_core
 import unidec_modules.unidectools as ud
 from unidec_modules.unidec_enginebase import UniDecEngine
 
@@ -246,8 +248,11 @@ class UniDec(UniDecEngine):
             return 1
 
         if self.config.imflag == 0:
-            self.data.data2 = ud.dataprep(self.data.rawdata, self.config)
+            timings = {}
+            self.data.data2 = ud.dataprep(self.data.rawdata, self.config, timings=timings)
             ud.dataexport(self.data.data2, self.config.infname)
+            if "silent" not in kwargs or not kwargs["silent"]:
+                print ", ".join(["%s: %.2gs" % (step, timings[step]) for step in sorted(timings)])
 #         else:
 #             tstart2 = time.clock()
 #             mz, dt, i3 = IM_func.process_data_2d(self.data.rawdata3[:, 0], self.data.rawdata3[:, 1],
@@ -276,7 +281,10 @@ class UniDec(UniDecEngine):
             self.config.UniDecPath for MS
             self.config.UniDecIMPath for IM-MS
 
-        If successful, calls self.unidec_imports()
+        If the binary is not available (or config.coreflag is 1), MS data is deconvolved in-process with
+        self.unidec_core() instead.
+
+        If successful, calls self.unidec_imports() (from self.unidec_binary_call())
         If not, prints the error code.
         :param silent: If True, it will suppress printing the output from UniDec
         :param efficiency: Passed to self.unidec_imports()
@@ -293,15 +301,16 @@ class UniDec(UniDecEngine):
         self.export_config()
         tstart = time.clock()
 
-        out = ud.unidec_call(self.config, silent=silent)
+        if self.use_core():
+            out = self.unidec_core()
+        else:
+            out = self.unidec_binary_call(silent=silent, efficiency=efficiency)
 
         tend = time.clock()
         self.config.runtime = (tend - tstart)
         if not silent:
             print "UniDec run %.2gs" % self.config.runtime
-        # Import Results if Successful
         if out == 0:
-            self.unidec_imports(efficiency)
             if not silent:
                 print "File Name: ", self.config.filename, "R Sqaured: ", self.config.error
             return out
@@ -309,6 +318,80 @@ class UniDec(UniDecEngine):
             print "UniDec Run Error:", out
             return out
 
+    def use_core(self):
+        """
+        Check whether to use the in-process core instead of the UniDec binary.
+        IM-MS data always requires the binary.
+        :return: Boolean
+        """
+        if self.config.imflag == 1:
+            return False
+        if self.config.coreflag == 1:
+            return True
+        return find_executable(self.config.UniDecPath) is None
+
+    def unidec_core(self):
+        """
+        Runs in-process UniDec core (unidec_modules.unidec_core) and places the results into self.data.
+        Fills the same fields as self.unidec_imports()
+        :return: 0
+        """
+        results = unidec_core.run_unidec_core(self.data.data2, self.config)
+
+        self.pks = peakstructure.Peaks()
+        self.data.massdat = results['massdat']
+        self.data.ztab = results['ztab']
+        self.config.massdatnormtop = np.amax(self.data.massdat[:, 1])
+        self.data.massgrid = results['massgrid']
+        self.data.fitdat = results['fitdat']
+        self.data.baseline = np.array([])
+        self.data.mzgrid = results['mzgrid']
+        self.config.error = results['error']
+        return 0
+
+    def unidec_binary_call(self, silent=False, efficiency=False):
+        """
+        Runs the UniDec binary and imports the results with self.unidec_imports().
+
+        The input is exported by self.process_data(). If config.ramdiskflag is set, the binary writes its outputs
+        to a temporary RAM-backed directory (ud.get_exchange_directory) when available. The results are imported
+        from there and the output files are then moved to the _unidecfiles directory.
+        :param silent: If True, it will suppress printing the output from UniDec
+        :param efficiency: Passed to self.unidec_imports()
+        :return: out (stdout from external UniDec call)
+        """
+        exchangedir = ud.get_exchange_directory() if self.config.ramdiskflag == 1 else None
+        if exchangedir is None:
+            out = ud.unidec_call(self.config, silent=silent)
+            if out == 0:
+                self.unidec_imports(efficiency)
+            return out
+
+        names = self.config.infname, self.config.outfname, self.config.confname
+        directory = os.path.dirname(os.path.abspath(self.config.outfname))
+        tempdir = tempfile.mkdtemp(prefix="unidec_", dir=exchangedir)
+        try:
+            # config in the temporary directory points the binary to the input on disk and outputs in RAM
+            self.config.infname = os.path.abspath(self.config.infname)
+            self.config.outfname = os.path.join(tempdir, os.path.basename(self.config.outfname))
+            self.config.confname = os.path.join(tempdir, os.path.basename(self.config.confname))
+            self.export_config()
+            out = ud.unidec_call(self.config, silent=silent)
+            if out == 0:
+                self.unidec_imports(efficiency)
+        finally:
+            tempconf = self.config.confname
+            self.config.infname, self.config.outfname, self.config.confname = names
+            for fname in os.listdir(tempdir):
+                path = os.path.join(tempdir, fname)
+                if path == tempconf:
+                    continue
+                if os.path.isfile(os.path.join(directory, fname)):
+                    os.remove(os.path.join(directory, fname))
+                shutil.move(path, os.path.join(directory, fname))
+            shutil.rmtree(tempdir, ignore_errors=True)
+        return out
+
     def unidec_imports(self, efficiency=False):
         """
         Imports files output from the UniDec core executable into self.data.
@@ -663,13 +746,16 @@ class UniDec(UniDecEngine):
             com, std = ud.center_of_mass(data, limits[0], limits[1])
         return com, std
 
-    def fit_all_masses(self):
+    def fit_all_masses(self, warmstart=False):
         """
         Fit all masses to a series of peaks, with initial guesses defined by the peak parameters.
+        :param warmstart: If True, the previous fit (self.massfit) is used as initial guess if it has the same peaks
         :return: self.massfitdat, self.massfit (fit to data, fit parameters)
         """
-        self.massfitdat, self.massfit = MassFitter.MassFitter(self.data.massdat, self.peakparams,
-                                                              self.config.psfun).perform_fit("nonorm", "sort")
+        fitter = MassFitter.MassFitter(self.data.massdat, self.peakparams, self.config.psfun)
+        if warmstart:
+            fitter.warm_start(self.massfit)
+        self.massfitdat, self.massfit = fitter.perform_fit("nonorm", "sort")
         return self.massfitdat, self.massfit
 
     def get_charge_peaks(self):
@@ -795,48 +881,68 @@ class UniDec(UniDecEngine):
         return True
         # TODO: Import Matches, others things in state?
 
-    def cross_validate(self, numcrosstot=5):
+    def cross_validate(self, numcrosstot=5, n_workers=None, callback=None, abort=None):
         """
         Experimental function to perform cross validation
+
+        Each fold is deconvolved in its own working directory (see _cross_validate_fold) so folds are run in a
+        pool of processes. Means and standard deviations are accumulated as folds finish.
         :param numcrosstot: Number of cross validation routines to perform
+        :param n_workers: Number of processes, defaults to the number of cores. If 1, folds are run in this process.
+        :param callback: Function called with (number of finished folds, total number of folds)
+        :param abort: Object with is_set() method (e.g. threading.Event). If set, remaining folds are cancelled
+            and the statistics of finished folds are returned.
         :return: mean, stddtev (mean and standard deviaition of mass distribution following cross validation)
         """
-        data2archive = deepcopy(self.data.data2)
-
-        tstart = time.clock()
-        massdatavg = []
-        peakdatavg = []
+        tstart = time.time()
+        massstats = unidecstructure.RunningStats()
+        peakstats = unidecstructure.RunningStats()
         toppeaks = ud.peakdetect(self.data.massdat, self.config)
-        for j in xrange(2, numcrosstot + 1):
-            numcross = j
 
-            for i in xrange(0, numcross):
-                # Delete one of k-fold
-                traindata = ud.dataprep(np.delete(self.data.rawdata, np.s_[i::numcross], 0), self.config)
-                # Select one of k-fold
-                # testdata = ud.dataprep(self.data.rawdata[i::numcross], self.config)
-                ud.dataexport(traindata, self.config.infname)
-
-                ud.unidec_call(self.config, silent=True)
+        # working directories of the folds, removed at the end even if the folds are cancelled
+        exchangedir = ud.get_exchange_directory() if self.config.ramdiskflag == 1 else None
+        workdir = tempfile.mkdtemp(prefix="unidec_cv_", dir=exchangedir)
+        tasks = [(self.data.rawdata, self.config, numcross, i, workdir)
+                 for numcross in xrange(2, numcrosstot + 1) for i in xrange(0, numcross)]
+        if n_workers is None:
+            n_workers = cpu_count()
+        n_workers = max(1, min(n_workers, len(tasks)))
+        if n_workers == 1:
+            pool = None
+            results = (_cross_validate_fold(task) for task in tasks)
+        else:
+            pool = Pool(n_workers)
+            results = pool.imap_unordered(_cross_validate_fold, tasks)
 
-                massdat = np.loadtxt(self.config.outfname + "_mass.txt")
-                try:
-                    peaks = ud.peakdetect(massdat, self.config)
-                    peaks = ud.mergepeaks(toppeaks, peaks, self.config.peakwindow)
-                    peakdatavg.append(peaks)
-                except (ValueError, TypeError, IndexError, ZeroDivisionError):
-                    print "No peaks selected"
-                    pass
-                massdat = ud.mergedata(self.data.massdat, massdat)
-                massdatavg.append(massdat[:, 1])
-
-            tend = time.clock()
-            mean = np.mean(np.array(massdatavg), axis=0)
-            stddev = np.std(np.array(massdatavg), axis=0)
-            print j, "Total CV Time:", (tend - tstart), "STD:", np.mean(stddev)
-
-        self.data.data2 = deepcopy(data2archive)
-        ud.dataexport(self.data.data2, self.config.infname)
+        try:
+            for n, (numcross, i, massdat) in enumerate(results):
+                if massdat is None:
+                    print "Cross validation failed for fold", i, "of", numcross
+                else:
+                    try:
+                        peaks = ud.peakdetect(massdat, self.config)
+                        peaks = ud.mergepeaks(toppeaks, peaks, self.config.peakwindow)
+                        peakstats.update(peaks, peaks[:, 1] != 0)
+                    except (ValueError, TypeError, IndexError, ZeroDivisionError):
+                        print "No peaks selected"
+                        pass
+                    massstats.update(ud.mergedata(self.data.massdat, massdat)[:, 1])
+
+                if callback is not None:
+                    callback(n + 1, len(tasks))
+                if abort is not None and abort.is_set():
+                    print "Cross validation cancelled"
+                    break
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        mean = massstats.get_mean()
+        stddev = massstats.get_std()
+        if mean is not None:
+            print "Total CV Time:", (time.time() - tstart), "STD:", np.mean(stddev)
         try:
             peaksvert = []
             for peak in toppeaks:
@@ -849,11 +955,8 @@ class UniDec(UniDecEngine):
 
             ud.dataexport(peaksvert, self.config.outfname + "_peakcvinterr.dat")
 
-            peakdatavg = np.array(peakdatavg)
-            peakmean = np.array(
-                [np.mean(peakdatavg[:, i][peakdatavg[:, i, 1] != 0], axis=0) for i in range(0, len(toppeaks))])
-            peakstd = np.array(
-                [np.std(peakdatavg[:, i][peakdatavg[:, i, 1] != 0], axis=0) for i in range(0, len(toppeaks))])
+            peakmean = peakstats.get_mean()
+            peakstd = peakstats.get_std()
 
             peaks = [peakmean[:, 0], peakstd[:, 0], peakstd[:, 0] / peakmean[:, 0] * 100., peakmean[:, 1],
                      peakstd[:, 1], peakstd[:, 1] / peakmean[:, 1] * 100.]
@@ -1169,6 +1272,38 @@ class UniDec(UniDecEngine):
 
 
 # Optional Run
+def _cross_validate_fold(args):
+    """
+    Deconvolve data with one of k-fold deleted. Runs in its own working directory so folds can be deconvolved
+    in parallel without sharing input, config or output files.
+    :param args: (rawdata, config, numcross, i, directory) - raw data, UniDecConfig, number of folds,
+        index of deleted fold, directory in which the working directory is created
+    :return: numcross, i, mass distribution (None if deconvolution failed)
+    """
+    rawdata, config, numcross, i, directory = args
+    engine = UniDec()
+    engine.config = deepcopy(config)
+    tempdir = tempfile.mkdtemp(prefix="fold_", dir=directory)
+    # files are already in the temporary directory
+    engine.config.ramdiskflag = 0
+    for name in ["infname", "outfname", "confname", "mfile", "manualfile", "ofile"]:
+        setattr(engine.config, name, os.path.join(tempdir, os.path.basename(str(getattr(config, name)))))
+    try:
+        # Delete one of k-fold
+        engine.data.rawdata = np.delete(rawdata, np.s_[i::numcross], 0)
+        engine.data.data2 = ud.dataprep(engine.data.rawdata, engine.config)
+        ud.dataexport(engine.data.data2, engine.config.infname)
+        engine.config.procflag = 1
+        if engine.run_unidec(silent=True, efficiency=True) != 0:
+            return numcross, i, None
+        return numcross, i, engine.data.massdat
+    except Exception, e:
+        print "Cross validation error:", e
+        return numcross, i, None
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
 if __name__ == "__main__":
     eng = UniDec()
 
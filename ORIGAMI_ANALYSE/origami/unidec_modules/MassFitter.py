@@ -6,6 +6,50 @@ from unidec_modules import unidectools as ud
 __author__ = 'Michael.Marty'
 
 
+def make_peak_shapes(xvals, psfun, mids, fwhms, derivatives=False):
+    """
+    Make area normalized peaks for several peaks at once (same as ud.make_peak_shape with norm_area=True).
+    :param xvals: Array of x axis values (N)
+    :param psfun: Peak shape function integer code
+    :param mids: Midpoints of the peaks (P)
+    :param fwhms: Full width half max of the peaks (P)
+    :param derivatives: Whether to also return derivatives of the peaks with respect to mids and fwhms
+    :return: P x N array of peaks (and P x N arrays of the derivatives with respect to mids and fwhms)
+    """
+    diff = xvals[np.newaxis, :] - mids[:, np.newaxis]
+    fwhms = fwhms[:, np.newaxis]
+    sqdiff = diff * diff
+    if psfun == 0 or psfun == 3:
+        sig2 = (fwhms / 2.35482) ** 2
+        shapes = np.exp(-sqdiff / (2.0 * sig2)) / np.sqrt(2 * np.pi * sig2)
+        dmids = shapes * diff / sig2
+        dfwhms = shapes * (sqdiff / sig2 - 1) / fwhms
+    elif psfun == 1:
+        gam = fwhms / 2.
+        denom = sqdiff + gam * gam
+        shapes = gam / (np.pi * denom)
+        dmids = 2 * shapes * diff / denom
+        dfwhms = shapes * (0.5 / gam - gam / denom)
+    elif psfun == 2:
+        # Gaussian below mid, Lorentzian above mid
+        gam = fwhms / 2.
+        sig2 = (fwhms / (2 * np.sqrt(2 * np.log(2)))) ** 2
+        norm = 1 / (np.pi * gam * 0.83723895067)
+        denom = sqdiff + gam * gam
+        upper = diff > 0
+        shapes = np.where(upper, norm * gam * gam / denom, norm * np.exp(-sqdiff / (2.0 * sig2)))
+        dmids = shapes * np.where(upper, 2 * diff / denom, diff / sig2)
+        dfwhms = shapes * np.where(upper, 0.5 / gam - gam / denom, (sqdiff / sig2 - 1) / fwhms)
+    else:
+        shapes = np.zeros(diff.shape)
+        dmids = shapes
+        dfwhms = shapes
+
+    if derivatives:
+        return shapes, dmids, dfwhms
+    return shapes
+
+
 def make_mass_list(massdat, arrayin, psfun, startarray, *args):
     """
     For parameters in arrayin, make mass peaks to be fit to massdat.
@@ -17,13 +61,10 @@ def make_mass_list(massdat, arrayin, psfun, startarray, *args):
     :param args: Extra arguments (such as nonorm to prevent normalization)
     :return:
     """
-    length = len(massdat)
-    output = np.zeros(length)
     num = len(arrayin.flatten()) / 3
     array = np.reshape(arrayin, (num, 3))
 
-    for i in xrange(0, len(array)):
-        output += ud.make_peak_shape(massdat[:, 0], psfun, array[i, 1], array[i, 0], norm_area=True) * array[i, 2]
+    output = np.dot(array[:, 2], make_peak_shapes(massdat[:, 0], psfun, array[:, 0], array[:, 1]))
     if np.amax(output) != 0 and "nonorm" in args:
         output = output / np.amax(output) * np.amax(massdat[:, 1])
         # if "smallguess" in args:
@@ -44,23 +85,50 @@ def error_function(array, massdat, psfun, startarray, *args):
     :param psfun: Peak shape function integer code
     :param startarray: Starting array (not currently used but can be used to restrict some guesses)
     :param args: Extra arguments for make_mass_list
-    :return: Squared errors array
+    :return: Errors array
     """
-    error = (massdat[:, 1] - make_mass_list(massdat, array, psfun, startarray, *args)) ** 2
+    error = make_mass_list(massdat, array, psfun, startarray, *args) - massdat[:, 1]
     return error
 
 
+def jacobian_function(array, massdat, psfun, startarray, *args):
+    """
+    Jacobian of error_function with respect to the parameters.
+    :param array: Array of test parameters
+    :param massdat: Mass data to be fit
+    :param psfun: Peak shape function integer code
+    :param startarray: Starting array (not used)
+    :param args: Extra arguments (not used)
+    :return: N x 3P array of derivatives of errors
+    """
+    num = len(array) / 3
+    array = np.reshape(array, (num, 3))
+    shapes, dmids, dfwhms = make_peak_shapes(massdat[:, 0], psfun, array[:, 0], array[:, 1], derivatives=True)
+    jac = np.empty((len(massdat), num, 3))
+    jac[:, :, 0] = np.transpose(dmids * array[:, 2, np.newaxis])
+    jac[:, :, 1] = np.transpose(dfwhms * array[:, 2, np.newaxis])
+    jac[:, :, 2] = np.transpose(shapes)
+    return np.reshape(jac, (len(massdat), num * 3))
+
+
 def least_squares_minimize(massdat, array, psfun, *args):
     """
     Perform least squares minimization of peaks defined in array to massdat.
+    Uses trust region reflective algorithm with analytic Jacobian. Widths and areas are kept positive with bounds.
     :param massdat: Data to fit
     :param array: Array of parameters for defining peaks that will be fit
     :param psfun: Peak shape function integer code
     :param args: Extra arguments for make_mass_list
     :return: Best fit of values in array
     """
-    fit = opt.leastsq(error_function, np.ravel(array), args=(massdat, psfun, array, args))[0]
     num = len(array.flatten()) / 3
+    lower = np.ravel([[-np.inf, 0, 0]] * num)
+    start = np.ravel(array).astype(float)
+    # Start strictly inside of the bounds
+    start[1::3][start[1::3] <= 0] = np.amax([massdat[1, 0] - massdat[0, 0], np.finfo(float).eps])
+    start[2::3][start[2::3] < 0] = 0
+    fit = opt.least_squares(error_function, start, jac=jacobian_function, bounds=(lower, np.inf), method="trf",
+                            x_scale="jac", args=(massdat, psfun, array)).x
     fit = np.reshape(fit, (num, 3))
     return fit
 
@@ -110,12 +178,30 @@ class MassFitter:
                     [[self.finarray[i, 0], 500., self.finarray[i, 1]] for i in xrange(0, len(self.finarray))])
         print "Inital Guess: ", self.initguess
 
+    def warm_start(self, fit):
+        """
+        Use previous fit as initial guess if it has the same peaks (each within its width of the guess).
+        :param fit: Fit parameters from a previous fit in a P x 3 array of (mid, fwhm, area)
+        :return: True if the previous fit is used, False otherwise
+        """
+        if fit is None or np.shape(fit) != np.shape(self.initguess):
+            return False
+        # Match peaks in order of mass as the previous fit may have been sorted
+        order = np.argsort(self.initguess[:, 0])
+        fit = fit[np.argsort(fit[:, 0])]
+        if np.any(np.abs(fit[:, 0] - self.initguess[order, 0]) > np.maximum(fit[:, 1], self.initguess[order, 1])):
+            return False
+        self.initguess[order] = fit
+        return True
+
     def perform_fit(self, *args):
         """
         Run least squares fitting
-        :param args: Arguments passed to fitting
+        :param args: Arguments passed to fitting. With "warmstart", the previous fit is used as initial guess.
         :return: fitdat, fit (fit to data and fit parameters in a P x 3 array of (mid, fwhm, area))
         """
+        if "warmstart" in args:
+            self.warm_start(self.fit)
         self.fit = least_squares_minimize(self.massdat, self.initguess, self.psfun, *args)
         self.fitdat = make_mass_list(self.massdat, self.fit, self.psfun, self.finarray, *args)
         if "sort" in args:
@@ -0,0 +1,303 @@
+"""
+In-process implementation of the UniDec deconvolution of 1D mass spectra.
+
+Follows the algorithm of the UniDec core binary (Marty et al. Anal. Chem. 2015):
+the intensity of each m/z point is spread over all allowed charge states and refined
+by iterative Bayesian (Richardson-Lucy) deconvolution. Each iteration smooths the
+m/z x charge grid along the charge dimension, convolves the summed grid with the
+peak shape and updates the grid by the ratio of the data to the fit. The result
+is transformed to the mass axis.
+
+The results are written into the same fields of the DataContainer as
+UniDec.unidec_imports so it can be used when the binary is not available.
+"""
+import numpy as np
+from scipy import signal
+from scipy.sparse import csr_matrix
+
+from fitting import ndis, ldis, splitdis
+
+__author__ = 'Michael.Marty'
+
+
+def peak_shape(x, psfun, fwhm):
+    """
+    Peak shape centered at 0 normalized to the max of 1.
+    :param x: Distance from the peak centre
+    :param psfun: Peak shape function code (0=Gauss, 1=Lorentzian, 2=Split G/L)
+    :param fwhm: Full width half max of peak
+    :return: Peak shape at x values
+    """
+    if psfun == 1:
+        return ldis(x, 0, fwhm)
+    elif psfun == 2:
+        return splitdis(x, 0, fwhm)
+    return ndis(x, 0, fwhm)
+
+
+def get_shape_limit(psfun, fwhm):
+    """
+    Distance from the peak centre after which peak shape is ignored.
+    Lorentzian tails decay slowly so they are kept for longer.
+    """
+    if psfun in [1, 2]:
+        return 20 * fwhm
+    return 5 * fwhm
+
+
+def is_uniform(xvals, rtol=1e-3):
+    """
+    Check whether x axis is evenly spaced
+    :param xvals: x axis
+    :param rtol: Relative tolerance of the spacing
+    :return: Boolean
+    """
+    if len(xvals) < 3:
+        return True
+    diffs = np.diff(xvals)
+    step = (xvals[-1] - xvals[0]) / (len(xvals) - 1)
+    return np.all(np.abs(diffs - step) <= rtol * abs(step))
+
+
+class PeakShapeConvolution(object):
+    """
+    Convolution of signal on the m/z axis with the peak shape. Evenly spaced axes are convolved
+    with FFT, other axes use sparse banded matrix of the peak shape.
+
+    The kernel is normalized to the area of 1 so the total intensity is conserved.
+    """
+
+    def __init__(self, xvals, psfun, fwhm):
+        """
+        :param xvals: m/z axis
+        :param psfun: Peak shape function code (0=Gauss, 1=Lorentzian, 2=Split G/L)
+        :param fwhm: Full width half max of peak in m/z units
+        """
+        self.xvals = np.asarray(xvals, dtype=float)
+        self.length = len(self.xvals)
+        self.uniform = is_uniform(self.xvals)
+        self.kernel = None
+        self.matrix = None
+
+        if fwhm <= 0 or self.length < 2:
+            # no peak shape
+            self.kernel = np.ones(1)
+        elif self.uniform:
+            self.make_kernel(psfun, fwhm)
+        else:
+            self.make_matrix(psfun, fwhm)
+
+    def make_kernel(self, psfun, fwhm):
+        binsize = (self.xvals[-1] - self.xvals[0]) / (self.length - 1)
+        limit = int(min(np.ceil(get_shape_limit(psfun, fwhm) / binsize), self.length - 1))
+        kernel = peak_shape(np.arange(-limit, limit + 1) * binsize, psfun, fwhm)
+        self.kernel = kernel / np.sum(kernel)
+
+    def make_matrix(self, psfun, fwhm):
+        limit = get_shape_limit(psfun, fwhm)
+        starts = np.searchsorted(self.xvals, self.xvals - limit, side='left')
+        ends = np.searchsorted(self.xvals, self.xvals + limit, side='right')
+        rows, cols, values = [], [], []
+        index = np.arange(self.length)
+        for offset in xrange(np.amin(starts - index), np.amax(ends - index)):
+            cols_offset = index + offset
+            mask = (cols_offset >= starts) & (cols_offset < ends)
+            rows.append(index[mask])
+            cols.append(cols_offset[mask])
+            values.append(peak_shape(self.xvals[cols_offset[mask]] - self.xvals[index[mask]], psfun, fwhm))
+        rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+        # Each point of the signal is spread over its neighbours with area of 1
+        norm = np.bincount(rows, weights=values, minlength=self.length)
+        values = values / norm[rows]
+        # matrix[i, j] is the contribution of point j to point i
+        self.matrix = csr_matrix((values, (cols, rows)), shape=(self.length, self.length))
+        self.matrix_t = self.matrix.T.tocsr()
+
+    def convolve(self, data):
+        """
+        Spread the signal with the peak shape
+        :param data: Signal on the m/z axis
+        :return: Convolved signal
+        """
+        if self.matrix is not None:
+            return self.matrix.dot(data)
+        elif len(self.kernel) == 1:
+            return data * self.kernel[0]
+        return signal.fftconvolve(data, self.kernel, mode='same')
+
+    def correlate(self, data):
+        """
+        Adjoint of the convolution, collects the signal back to each point
+        :param data: Signal on the m/z axis
+        :return: Correlated signal
+        """
+        if self.matrix is not None:
+            return self.matrix_t.dot(data)
+        elif len(self.kernel) == 1:
+            return data * self.kernel[0]
+        return signal.fftconvolve(data, self.kernel[::-1], mode='same')
+
+
+def make_allowed_grid(mzvals, ztab, config):
+    """
+    Boolean m/z x charge grid of allowed species. Limited by the mass range, native charge
+    range and mass list (if mfileflag is set).
+    :param mzvals: m/z axis
+    :param ztab: Charge states
+    :param config: UniDecConfig object
+    :return: Boolean array (N x Z)
+    """
+    masses = np.outer(mzvals - config.adductmass, ztab)
+    barr = (masses >= config.masslb) & (masses <= config.massub)
+
+    if config.nativezub != 100 or config.nativezlb != -100:
+        nativez = ztab[np.newaxis, :] - 0.0467 * np.power(np.abs(masses), 0.533)
+        barr &= (nativez >= config.nativezlb) & (nativez <= config.nativezub)
+
+    if config.mfileflag == 1 and len(config.masslist) > 0:
+        masslist = np.sort(np.asarray(config.masslist, dtype=float))
+        window = config.mtabsig if config.mtabsig > 0 else config.massbins
+        index = np.clip(np.searchsorted(masslist, masses), 1, len(masslist) - 1)
+        closest = np.minimum(np.abs(masses - masslist[index - 1]), np.abs(masses - masslist[index]))
+        if len(masslist) == 1:
+            closest = np.abs(masses - masslist[0])
+        barr &= closest <= window
+    return barr
+
+
+def make_charge_neighbours(mzvals, ztab, barr, zzsig, adductmass):
+    """
+    For each point of the grid find the points of the same mass in neighbouring charge states.
+    :param mzvals: m/z axis
+    :param ztab: Charge states
+    :param barr: Allowed grid (N x Z)
+    :param zzsig: Charge smoothing width. Neighbours up to int(abs(zzsig)) charges away are used.
+    :param adductmass: Mass of the charge carrier
+    :return: List of (offset, flat index of neighbour (N x Z), mask of valid neighbours)
+    """
+    numz = len(ztab)
+    width = max(int(abs(zzsig)), 1)
+    masses = np.outer(mzvals - adductmass, ztab)
+    neighbours = []
+    for offset in range(-width, width + 1):
+        if offset == 0:
+            continue
+        zcol = np.arange(numz) + offset
+        zvalid = (zcol >= 0) & (zcol < numz)
+        zcol = np.clip(zcol, 0, numz - 1)
+        znew = ztab[zcol].astype(float)
+        mznew = masses / znew + adductmass
+        # nearest point on the m/z axis
+        index = np.clip(np.searchsorted(mzvals, mznew), 1, len(mzvals) - 1)
+        index -= (mznew - mzvals[index - 1]) < (mzvals[index] - mznew)
+        valid = zvalid[np.newaxis, :] & (mznew >= mzvals[0]) & (mznew <= mzvals[-1])
+        flat = index * numz + zcol[np.newaxis, :]
+        valid &= barr.ravel()[flat]
+        neighbours.append((offset, flat, valid))
+    return neighbours
+
+
+def charge_smooth(blur, barr, neighbours, zzsig, zerolog):
+    """
+    Smooth grid along the charge dimension.
+
+    Positive zzsig uses geometric mean of the point and its neighbours, which suppresses
+    species with incomplete charge state distributions. Negative zzsig uses Gaussian weighted mean.
+    :param blur: Grid (N x Z)
+    :param barr: Allowed grid (N x Z)
+    :param neighbours: Output of make_charge_neighbours
+    :param zzsig: Charge smoothing width
+    :param zerolog: Log value used for zero intensity
+    :return: Smoothed grid
+    """
+    flat = blur.ravel()
+    if zzsig > 0:
+        logs = np.log(np.maximum(flat, np.exp(zerolog)))
+        total = logs.reshape(blur.shape).copy()
+        for offset, index, valid in neighbours:
+            total += np.where(valid, logs[index], zerolog)
+        newblur = np.exp(total / (len(neighbours) + 1))
+    else:
+        weights = [np.exp(-offset ** 2 / (2. * zzsig ** 2)) for offset, __, __ in neighbours]
+        total = blur.copy()
+        for weight, (offset, index, valid) in zip(weights, neighbours):
+            total += weight * np.where(valid, flat[index], 0)
+        newblur = total / (1. + np.sum(weights))
+    newblur[~barr] = 0
+    return newblur
+
+
+def mass_transform(mzvals, ztab, blur, config):
+    """
+    Transform m/z x charge grid onto mass axis.
+    :param mzvals: m/z axis
+    :param ztab: Charge states
+    :param blur: Grid (N x Z)
+    :param config: UniDecConfig object. poolflag 0 integrates points into nearest mass bin,
+    poolflag 1 interpolates grid at each mass bin.
+    :return: massaxis, massgrid (M x Z)
+    """
+    massaxis = np.arange(config.masslb, config.massub + config.massbins, config.massbins)
+    massaxis = massaxis[massaxis <= config.massub]
+    massgrid = np.zeros((len(massaxis), len(ztab)))
+
+    if config.poolflag == 0:
+        masses = np.outer(mzvals - config.adductmass, ztab)
+        index = np.round((masses - massaxis[0]) / config.massbins).astype(int)
+        valid = (index >= 0) & (index < len(massaxis)) & (blur > 0)
+        zindex = np.broadcast_to(np.arange(len(ztab)), blur.shape)
+        flat = index[valid] * len(ztab) + zindex[valid]
+        massgrid = np.bincount(flat, weights=blur[valid], minlength=massgrid.size).reshape(massgrid.shape)
+    else:
+        for j, z in enumerate(ztab):
+            mznew = massaxis / float(z) + config.adductmass
+            massgrid[:, j] = np.interp(mznew, mzvals, blur[:, j], left=0, right=0)
+    return massaxis, massgrid
+
+
+def run_unidec_core(data2, config, callback=None):
+    """
+    Deconvolve processed spectrum.
+    :param data2: Processed data (N x 2)
+    :param config: UniDecConfig object
+    :param callback: Function called with the iteration number after each iteration. If it returns True,
+    deconvolution is stopped.
+    :return: Dictionary with massdat, massgrid, mzgrid, fitdat, ztab, blur and error
+    """
+    mzvals = np.asarray(data2[:, 0], dtype=float)
+    inten = np.asarray(data2[:, 1], dtype=float)
+    inten = np.where(inten > 0, inten, 0)
+    ztab = np.arange(config.startz, config.endz + 1)
+
+    barr = make_allowed_grid(mzvals, ztab, config)
+    conv = PeakShapeConvolution(mzvals, config.psfun, config.mzsig)
+    neighbours = None
+    if config.zzsig != 0:
+        neighbours = make_charge_neighbours(mzvals, ztab, barr, config.zzsig, config.adductmass)
+
+    # Start with the data spread over all allowed charge states
+    blur = np.where(barr, inten[:, np.newaxis], 0.)
+    for iteration in xrange(int(config.numit)):
+        if neighbours is not None:
+            blur = charge_smooth(blur, barr, neighbours, config.zzsig, config.zerolog)
+        fit = conv.convolve(np.sum(blur, axis=1))
+        ratio = np.zeros_like(fit)
+        np.divide(inten, fit, out=ratio, where=fit > 0)
+        blur *= conv.correlate(ratio)[:, np.newaxis]
+        if callback is not None and callback(iteration):
+            break
+
+    fitdat = conv.convolve(np.sum(blur, axis=1))
+    sse = np.sum((fitdat - inten) ** 2)
+    error = 1 - sse / np.sum((inten - np.mean(inten)) ** 2)
+
+    massaxis, massgrid = mass_transform(mzvals, ztab, blur, config)
+
+    mzgrid = np.c_[np.repeat(mzvals, len(ztab)), np.tile(ztab, len(mzvals)), np.ravel(blur)]
+    return {'massdat': np.transpose([massaxis, np.sum(massgrid, axis=1)]),
+            'massgrid': np.ravel(massgrid),
+            'mzgrid': mzgrid,
+            'fitdat': fitdat,
+            'ztab': ztab,
+            'blur': blur,
+            'error': error}
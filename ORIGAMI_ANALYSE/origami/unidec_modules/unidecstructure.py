@@ -132,6 +132,11 @@ class UniDecConfig(object):
         self.noiseflag = 0
         self.isotopemode = 0
         self.orbimode = 0
+        # 0 = in-process core only if the binary is not available, 1 = always use in-process core
+        self.coreflag = 0
+        # write outputs of the binary to RAM-backed directory when available, they are moved to the _unidecfiles
+        # directory after they were imported
+        self.ramdiskflag = 0
 
         # Other
         self.mtabsig = 0
@@ -992,6 +997,58 @@ class DataContainer:
 #         hdf.close()
 
 
+
+class RunningStats:
+    def __init__(self):
+        """
+        Running mean and standard deviation of a series of arrays (Welford's algorithm).
+        Arrays are added one at a time so the whole series is never held in memory.
+        :return: None
+        """
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values, mask=None):
+        """
+        Add array to the statistics.
+        :param values: Array, same shape for each update
+        :param mask: Boolean array, values where mask is False are ignored. May have fewer dimensions than values.
+        :return: None
+        """
+        values = np.asarray(values, dtype=float)
+        if mask is None:
+            mask = np.ones(values.shape, dtype=bool)
+        else:
+            mask = np.asarray(mask, dtype=bool).reshape(np.shape(mask) + (1,) * (values.ndim - np.ndim(mask)))
+        if self.count is None:
+            self.count = np.zeros(values.shape)
+            self.mean = np.zeros(values.shape)
+            self.m2 = np.zeros(values.shape)
+        self.count += mask
+        delta = np.where(mask, values - self.mean, 0)
+        self.mean += np.where(mask, delta / np.maximum(self.count, 1), 0)
+        self.m2 += delta * np.where(mask, values - self.mean, 0)
+
+    def get_mean(self):
+        """
+        :return: Mean of the added arrays (nan where no values were added)
+        """
+        if self.count is None:
+            return None
+        with np.errstate(invalid="ignore"):
+            return np.where(self.count > 0, self.mean, np.nan)
+
+    def get_std(self):
+        """
+        :return: Population standard deviation of the added arrays (nan where no values were added)
+        """
+        if self.count is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.m2 / self.count)
+
+
 if __name__ == '__main__':
     fname = "test.hdf5"
     data = DataContainer()
@@ -786,28 +786,41 @@ def datacompsub(datatop, buff):
     :param buff: Width parameter
     :return: Subtracted data
     """
-    length = len(datatop)
-    mins = range(0, length)
-    indexes = range(0, length)
-    for i in indexes:
-        mins[i] = np.amin(datatop[int(max([0, i - abs(buff)])):int(min([i + abs(buff), length])), 1])
-    background = filt.gaussian_filter(mins, abs(buff) * 2)
+    # minimum of datatop[int(max(0, i - buff)):int(min(i + buff, length)), 1] for each point i
+    buff = abs(buff)
+    nbefore = int(math.ceil(buff))
+    nafter = int(math.floor(buff))
+    size = nbefore + nafter
+    mins = filt.minimum_filter1d(datatop[:, 1], size, mode="nearest", origin=nbefore - size // 2)
+    background = filt.gaussian_filter(mins, buff * 2)
     datatop[:, 1] = datatop[:, 1] - background
     return datatop
 
 
 def calc_local_mins(data, w):
+    """
+    Find the minimum in consecutive windows of width w. As in datachop, the window bounds are exclusive.
+    :param data: Data array (N x 2) sorted by the [:,0] column
+    :param w: Window width
+    :return: Array of [position, value] of the local minimum in each window
+    """
     start = np.amin(data[:, 0])
     stop = np.amax(data[:, 0])
     windows = np.arange(start, stop, step=w)
 
-    localmins = []
-    for winstart in windows:
-        chopdata = datachop(data, winstart, winstart + w)
-        localmin = np.amin(chopdata[:, 1])
-        localminpos = chopdata[np.argmin(chopdata[:, 1]), 0]
-        localmins.append([localminpos, localmin])
-    return np.array(localmins)
+    lower = np.searchsorted(data[:, 0], windows, side="right")
+    upper = np.searchsorted(data[:, 0], windows + w, side="left")
+    lengths = np.clip(upper - lower, 0, None)
+    if np.any(lengths == 0):
+        raise ValueError("Window without data points, increase the window width")
+
+    # Points of each window and the first minimum of each window (ties are resolved like np.argmin)
+    offsets = np.cumsum(lengths) - lengths
+    window = np.repeat(np.arange(len(windows)), lengths)
+    index = np.arange(np.sum(lengths)) - np.repeat(offsets, lengths) + np.repeat(lower, lengths)
+    order = np.lexsort((index, data[index, 1], window))
+    minindex = index[order[offsets]]
+    return data[minindex]
 
 
 def polynomial_background_subtract(datatop, polynomial_order=4, width=20, cutoff_percent=0.25):
@@ -979,24 +992,29 @@ def lintegrate(datatop, intx):
     :return: Integration of intensity from original data onto the new x-axis.
         Same shape as the old data but new length.
     """
-    length = len(datatop)
-    inty = np.zeros_like(intx)
-    for i in range(0, length):
-        if intx[0] < datatop[i, 0] < intx[len(intx) - 1]:
-            index = nearest(intx, datatop[i, 0])
-            # inty[index]+=datatop[i,1]
-            if intx[index] == datatop[i, 0]:
-                inty[index] += datatop[i, 1]
-            if intx[index] < datatop[i, 0] and index < length - 1:
-                index2 = index + 1
-                interpos = linear_interpolation(intx[index], intx[index2], datatop[i, 0])
-                inty[index] += (1 - interpos) * datatop[i, 1]
-                inty[index2] += interpos * datatop[i, 1]
-            if intx[index] > datatop[i, 0] and index > 0:
-                index2 = index - 1
-                interpos = linear_interpolation(intx[index], intx[index2], datatop[i, 0])
-                inty[index] += (1 - interpos) * datatop[i, 1]
-                inty[index2] += interpos * datatop[i, 1]
+    x = datatop[:, 0]
+    y = datatop[:, 1]
+    boo1 = np.logical_and(x > intx[0], x < intx[len(intx) - 1])
+    x = x[boo1]
+    y = y[boo1]
+
+    # Nearest point of the new axis (as in nearest) and its neighbour on the other side of x
+    index2 = np.searchsorted(intx, x, side="left")
+    index = index2 - 1
+    closer = np.logical_or(np.abs(intx[index2] - x) <= np.abs(intx[index] - x), index2 == len(intx) - 1)
+    index[closer] = index2[closer]
+    index2[closer] -= 1
+    index2[intx[index] == x] = index[intx[index] == x]
+
+    # Each point is split between the two neighbours. The contributions are interleaved so that they are
+    # summed in the same order as adding them point by point.
+    interpos = np.zeros_like(x)
+    split = index != index2
+    interpos[split] = (x[split] - intx[index[split]]) / (intx[index2[split]] - intx[index[split]])
+    indices = np.column_stack((index, index2)).ravel()
+    weights = np.column_stack(((1 - interpos) * y, interpos * y))
+    weights[~split, 1] = 0
+    inty = np.bincount(indices, weights=weights.ravel(), minlength=len(intx))
     newdat = np.column_stack((intx, inty))
     return newdat
 
@@ -1012,8 +1030,9 @@ def linterpolate(datatop, intx):
     :return: Interpolation of intensity from original data onto the new x-axis.
         Same shape as the old data but new length.
     """
-    f = interp1d(datatop[:, 0], datatop[:, 1])
-    inty = f(intx)
+    if intx[0] < datatop[0, 0] or intx[len(intx) - 1] > datatop[len(datatop) - 1, 0]:
+        raise ValueError("A value in x_new is outside of the interpolation range.")
+    inty = np.interp(intx, datatop[:, 0], datatop[:, 1])
     newdat = np.column_stack((intx, inty))
     return newdat
 
@@ -1075,14 +1094,11 @@ def removeduplicates(datatop):
     testunique = np.unique(datatop[:, 0])
     if len(testunique) != len(datatop):
         print "Removing Duplicates"
+        # The last bin of np.histogram is closed, so the last two unique values are merged
         num, start = np.histogram(datatop[:, 0], bins=testunique)
-        means = []
-        xvals = []
-        index = 0
-        for i in range(0, len(testunique) - 1):
-            xvals.append(np.mean(datatop[index:index + num[i], 0]))
-            means.append(np.sum(datatop[index:index + num[i], 1]))
-            index = index + num[i]
+        index = np.cumsum(num) - num
+        xvals = np.add.reduceat(datatop[:, 0], index) / num
+        means = np.add.reduceat(datatop[:, 1], index)
         datatop = np.column_stack((xvals, means))
     return datatop
 
@@ -1098,7 +1114,7 @@ def normalize(datatop):
     :return: Normalized data array (N x 2)
     """
     maxval = np.amax(datatop[:, 1])
-    datatop[:, 1] = datatop[:, 1] / maxval
+    datatop[:, 1] /= maxval
     return datatop
 
 
@@ -1129,7 +1145,7 @@ def remove_middle_zeros(data):
     return data[boo6]
 
 
-def dataprep(datatop, config):
+def dataprep(datatop, config, timings=None):
     """
     Main function to process 1D MS data. The order is:
 
@@ -1142,10 +1158,22 @@ def dataprep(datatop, config):
     Normalization (normalize)
     Intensity Threshold with a threshold of 0 (intthresh)
 
+    The data is copied once when it is cropped and the following steps work on the copy in place where possible.
+
     :param datatop: Raw data array (N x 2)
     :param config: UniDecConfig object
+    :param timings: Optional dictionary which is filled with the time (s) spent in each step
     :return: Processed data
     """
+    if timings is None:
+        timings = {}
+    tstart = [time.time()]
+
+    def step_done(name):
+        tend = time.time()
+        timings[name] = timings.get(name, 0) + tend - tstart[0]
+        tstart[0] = tend
+
     newmin = config.minmz
     newmax = config.maxmz
     buff = config.subbuff
@@ -1157,18 +1185,22 @@ def dataprep(datatop, config):
     linflag = config.linflag
     # Crop Data
     data2 = datachop(datatop, newmin, newmax)
+    step_done("crop")
 
     # correct for detector efficiency
     if va != 0:
         # data2=detectoreff(data2,9.1)
         data2 = detectoreff(data2, va)
+        step_done("detector efficiency")
 
     # Smooth Data
     if smooth > 0:
         data2 = gsmooth(data2, smooth)
+        step_done("smooth")
 
     # Remove Duplicate Data Points
     data2 = removeduplicates(data2)
+    step_done("remove duplicates")
 
     # Linearize Data
     if binsize > 0:
@@ -1176,6 +1208,7 @@ def dataprep(datatop, config):
             data2 = linearize(data2, binsize, linflag)
         else:
             data2 = nonlinearize(data2, binsize)
+        step_done("linearize")
 
     # Baseline Subtraction
     buff = abs(buff)
@@ -1184,7 +1217,7 @@ def dataprep(datatop, config):
     elif subtype == 2 and buff != 0:
         data2 = datacompsub(data2, buff)
     elif subtype == 0 and buff != 0:
-        data2[:, 1] = data2[:, 1] - np.amin(data2[:, 1])
+        data2[:, 1] -= np.amin(data2[:, 1])
     elif subtype == 4 and buff != 0:
         data2 = polynomial_background_subtract(data2, buff)
     elif subtype == 5 and buff != 0:
@@ -1196,9 +1229,11 @@ def dataprep(datatop, config):
         pass
     else:
         print "Background subtraction code unsupported", subtype, buff
+    step_done("background subtraction")
 
     # Intensity Threshold
     data2 = intensitythresh(data2, 0)  # thresh
+    step_done("threshold")
     # data2=data2[data2[:,1]>0]
 
     # Scale Adjustment
@@ -1214,9 +1249,11 @@ def dataprep(datatop, config):
         except:
             pass
         pass
+    step_done("scale")
 
     # Normalization
     data2 = normalize(data2)
+    step_done("normalize")
 
     return data2
 
@@ -1228,6 +1265,17 @@ def dataprep(datatop, config):
 # ............................................................................
 
 
+def get_exchange_directory():
+    """
+    Find RAM-backed directory for the config and output files of the UniDec binary.
+    :return: Path or None if not available
+    """
+    for path in ["/dev/shm", "/run/shm"]:
+        if os.path.isdir(path) and os.access(path, os.W_OK):
+            return path
+    return None
+
+
 def unidec_call(config, silent=False, **kwargs):
     """
     Run the UniDec binary specified by exepath with the configuration file specified by configfile.
@@ -1276,21 +1324,15 @@ def peakdetect(data, config=None, window=10, threshold=0):
     if config is not None:
         window = config.peakwindow / config.massbins
         threshold = config.peakthresh
-    peaks = []
-    length = len(data)
     maxval = np.amax(data[:, 1])
-    for i in range(1, length):
-        if data[i, 1] > maxval * threshold:
-            start = i - window
-            end = i + window
-            if start < 0:
-                start = 0
-            if end > length:
-                end = length
-            testmax = np.amax(data[int(start):int(end) + 1, 1])
-            if data[i, 1] == testmax and data[i, 1] != data[i - 1, 1]:
-                peaks.append([data[i, 0], data[i, 1]])
-    return np.array(peaks)
+    # maximum of data[int(max(0, i - window)):int(i + window) + 1, 1] for each point i
+    nbefore = int(math.ceil(window))
+    size = nbefore + int(math.floor(window)) + 1
+    testmax = filt.maximum_filter1d(data[:, 1], size, mode="nearest", origin=nbefore - size // 2)
+    boo1 = np.logical_and(data[:, 1] > maxval * threshold, data[:, 1] == testmax)
+    boo1[1:] = np.logical_and(boo1[1:], data[1:, 1] != data[:-1, 1])
+    boo1[0] = False
+    return data[boo1, :2]
 
 
 def mergepeaks(peaks1, peaks2, window):
@@ -1308,15 +1350,43 @@ def mergepeaks(peaks1, peaks2, window):
     """
     newpeaks = deepcopy(peaks1)
     newpeaks[:, 1] = newpeaks[:, 1] * 0
-    for peak in peaks2:
-        i = np.argmin(abs(peaks1[:, 0] - peak[0]))
-        minval = np.amin(abs(peaks1[:, 0] - peak[0]))
-        closest = np.sort(np.abs(peaks2[:, 0] - peaks1[i, 0]))[0]
-        if minval < window and minval == closest:
-            newpeaks[i] = peak
+    if len(peaks1) == 0 or len(peaks2) == 0:
+        return newpeaks
+
+    # Closest reference peak of each test peak. Ties go to the first reference peak, as with np.argmin.
+    refx, first = np.unique(peaks1[:, 0], return_index=True)
+    index, minval = nearest_sorted(refx, peaks2[:, 0], first)
+    # Distance from the matched reference peak to the closest test peak
+    testx = np.sort(peaks2[:, 0])
+    closest = nearest_sorted(testx, refx[index])[1]
+
+    # Mutual nearest neighbours. If several test peaks match the same reference peak, the last one is used.
+    boo1 = np.logical_and(minval < window, minval == closest)
+    newpeaks[first[index[boo1]]] = peaks2[boo1]
     return newpeaks
 
 
+def nearest_sorted(array, targets, order=None):
+    """
+    For each target, find the position of the element of the sorted array closest to it.
+    :param array: Sorted array
+    :param targets: Array of values
+    :param order: Values used to break ties between two equally close elements (lower wins).
+        If None, the lower element wins.
+    :return: Positions in array and distances to the closest element
+    """
+    length = len(array)
+    hi = np.clip(np.searchsorted(array, targets, side="left"), 0, length - 1)
+    lo = np.clip(hi - 1, 0, length - 1)
+    dlo = np.abs(array[lo] - targets)
+    dhi = np.abs(array[hi] - targets)
+    if order is None:
+        uselo = dlo <= dhi
+    else:
+        uselo = np.logical_or(dlo < dhi, np.logical_and(dlo == dhi, order[lo] < order[hi]))
+    return np.where(uselo, lo, hi), np.where(uselo, dlo, dhi)
+
+
 def make_peaks_mztab(mzgrid, pks, adductmass, index=None):
     """
     For each peak in pks, get the charge state distribution.
@@ -1337,16 +1407,35 @@ def make_peaks_mztab(mzgrid, pks, adductmass, index=None):
     ylen = len(yvals)
     newgrid = np.reshape(mzgrid[:, 2], (xlen, ylen))
     plen = pks.plen
-    ftab = [interp1d(xvals, newgrid[:, k]) for k in xrange(0, ylen)]
-    mztab = [[makespecfun(i, k, pks.masses, adductmass, yvals, xvals, ftab, xmax, xmin) for k in xrange(0, ylen)] for i
-             in xrange(0, plen)]
+    masses = np.asarray(pks.masses[:plen], dtype=np.float64)
+
+    # m/z of each peak at each charge state (P x Z)
+    intx = np.true_divide(masses[:, np.newaxis] + adductmass * yvals[np.newaxis, :], yvals[np.newaxis, :])
+
+    # Linear interpolation of each charge column at intx, same arithmetic as interp1d
+    hi = np.clip(np.searchsorted(xvals, intx, side="left"), 1, xlen - 1)
+    lo = hi - 1
+    cols = np.arange(ylen)[np.newaxis, :]
+    slope = (newgrid[hi, cols] - newgrid[lo, cols]) / (xvals[hi] - xvals[lo])
+    inty = slope * (intx - xvals[lo]) + newgrid[lo, cols]
+    inty[np.logical_not(np.logical_and(intx > xmin, intx < xmax))] = 0
+
+    # Nearest point of xvals, same as nearest
+    pos = np.searchsorted(xvals, intx, side="left")
+    inner = np.logical_and(pos > 0, pos < xlen - 1)
+    below = np.clip(pos - 1, 0, xlen - 1)
+    lower = np.logical_and(inner, np.abs(xvals[np.clip(pos, 0, xlen - 1)] - intx) > np.abs(xvals[below] - intx))
+    pos[lower] -= 1
+    pos = np.clip(pos, 0, xlen - 1)
+
+    mztab = np.stack((intx, inty, pos), axis=2)
     if index is None:
         for i in xrange(0, plen):
-            pks.peaks[i].mztab = np.array(mztab[i])
+            pks.peaks[i].mztab = mztab[i]
     else:
         for i in xrange(0, plen):
-            pks.peaks[i].mztab.append(np.array(mztab[i]))
-    return np.array(mztab)
+            pks.peaks[i].mztab.append(mztab[i])
+    return mztab
 
 
 def makespecfun(i, k, peaks_masses, adductmass, charges, xvals, ftab, xmax, xmin):
@@ -1385,20 +1474,16 @@ def make_peaks_mztab_spectrum(mzgrid, pks, data2, mztab, index=None):
     :param mztab: Prior mztab from make_peaks_mztab
     :return: mztab but with intensities replaced by value at the spectrum.
     """
-    zvals = np.unique(mzgrid[:, 1])
-    zlen = len(zvals)
     plen = pks.plen
-    mztab2 = deepcopy(mztab)
+    mztab2 = np.array(mztab, dtype=np.float64)
+    mztab2[:, :, 1] = data2[mztab2[:, :, 2].astype(np.int), 1]
 
     if index is None:
-        mztab2[:, :, 1] = [[data2[int(pks.peaks[i].mztab[k, 2]), 1] for k in range(0, zlen)] for i in range(0, plen)]
         for i in xrange(0, plen):
-            pks.peaks[i].mztab2 = np.array(mztab2[i])
+            pks.peaks[i].mztab2 = mztab2[i]
     else:
-        mztab2[:, :, 1] = [[data2[int(pks.peaks[i].mztab[index][k, 2]), 1] for k in range(0, zlen)] for i in
-                           range(0, plen)]
         for i in xrange(0, plen):
-            pks.peaks[i].mztab2.append(np.array(mztab2[i]))
+            pks.peaks[i].mztab2.append(mztab2[i])
 
     return mztab2
 
@@ -1434,13 +1519,18 @@ def makeconvspecies(processed_data, pks, config):
     return np.array(stickdat)
 
 
-def nonlinstickconv(xvals, mztab, fwhm, psfun):
+def nonlinstickconv(xvals, mztab, fwhm, psfun, method="sparse"):
     """
     Python-based Nonlinear convolution. First makes a stick spectrum. Then, convolved with peak shape kernel.
+
+    With method="sparse", the peak shape is only evaluated within the window around each non-zero stick, which gives
+    the same result as evaluating the kernel at every point. With method="fft", the sticks are resampled on an
+    evenly spaced axis, convolved with FFT and interpolated back (see fftstickconv).
     :param xvals: x-axis
     :param mztab: mztab from make_peaks_mztab
     :param fwhm: Full width half max
     :param psfun: Peak shape function integer
+    :param method: "sparse" or "fft"
     :return: Convolved output
     """
     if psfun == 0:
@@ -1450,10 +1540,56 @@ def nonlinstickconv(xvals, mztab, fwhm, psfun):
     xlen = len(xvals)
     stick = np.zeros(xlen)
     stick[np.array(mztab[:, 2]).astype(np.int)] = mztab[:, 1]
-    bool1 = [np.abs(xvals - xvals[i]) < window for i in xrange(0, xlen)]
-    kernels = np.array([make_peak_shape(-xvals[bool1[i]], psfun, fwhm, -xvals[i]) for i in xrange(0, xlen)])
-    output = np.array([np.sum(kernels[i] * stick[bool1[i]]) for i in xrange(0, xlen)])
-    return output
+    if method == "fft":
+        return fftstickconv(xvals, stick, fwhm, psfun, window)
+
+    # Band of the convolution matrix for the columns of the non-zero sticks
+    cols = np.flatnonzero(stick)
+    starts = np.searchsorted(xvals, xvals[cols] - window, side="left")
+    ends = np.searchsorted(xvals, xvals[cols] + window, side="right")
+    lengths = ends - starts
+    rows = np.arange(np.sum(lengths)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    cols = np.repeat(cols, lengths)
+    diffs = xvals[rows] - xvals[cols]
+    inside = np.abs(diffs) < window
+    rows, cols, diffs = rows[inside], cols[inside], diffs[inside]
+    values = make_peak_shape(diffs, psfun, fwhm, 0) * stick[cols]
+    return np.bincount(rows, weights=values, minlength=xlen)
+
+
+def fftstickconv(xvals, stick, fwhm, psfun, window, oversample=25., maxlength=2 ** 22):
+    """
+    Convolution of stick spectrum on nonlinear axis by resampling.
+
+    Each stick is split between the two nearest points of an evenly spaced axis with oversample points per fwhm,
+    the sticks are convolved with the peak shape by FFT and the result is interpolated back on the original axis.
+    Memory use is limited by maxlength points of the evenly spaced axis.
+    :param xvals: x-axis
+    :param stick: Stick spectrum on the x-axis
+    :param fwhm: Full width half max
+    :param psfun: Peak shape function integer
+    :param window: Distance from the peak centre after which peak shape is ignored
+    :param oversample: Number of points of the evenly spaced axis per fwhm
+    :param maxlength: Maximum number of points of the evenly spaced axis
+    :return: Convolved output
+    """
+    xmin = xvals[0]
+    xmax = xvals[len(xvals) - 1]
+    binsize = max(fwhm / float(oversample), (xmax - xmin) / float(maxlength - 1))
+    length = int(math.ceil((xmax - xmin) / binsize)) + 1
+    intx = xmin + np.arange(length) * binsize
+
+    cols = np.flatnonzero(stick)
+    pos = (xvals[cols] - xmin) / binsize
+    index = np.clip(np.floor(pos).astype(np.int), 0, length - 2)
+    interpos = pos - index
+    inty = np.bincount(index, weights=(1 - interpos) * stick[cols], minlength=length)
+    inty += np.bincount(index + 1, weights=interpos * stick[cols], minlength=length)
+
+    limit = int(min(window / binsize, length - 1))
+    kernel = make_peak_shape(np.arange(-limit, limit + 1) * binsize, psfun, fwhm, 0)
+    output = signal.fftconvolve(inty, kernel, mode="same")
+    return np.interp(xvals, intx, output)
 
 
 def stickconv(mztab, kernel):
@@ -1900,42 +2036,129 @@ def windowed_fft_single(data, mean, sigma, diffrange=None):
     return maxpos, fft2
 
 
+def window_chunks(nwindows, length, maxsize=2 ** 22):
+    """
+    Split windows into groups which are processed at once so that memory use is limited.
+    :param nwindows: Number of windows
+    :param length: Length of the data
+    :param maxsize: Maximum number of elements (number of windows x length) in one group
+    :return: Generator of slices
+    """
+    step = max(1, int(maxsize / max(length, 1)))
+    for start in xrange(0, nwindows, step):
+        yield slice(start, min(start + step, nwindows))
+
+
+def windowed_data(data, means, sigmas):
+    """
+    Copies of the intensities multiplied by Gaussian window at each of the means.
+    :param data: Data array (N x 2)
+    :param means: Centres of the windows (W)
+    :param sigmas: Standard deviations of the windows (single value or W)
+    :return: Windowed intensities (W x N)
+    """
+    means = np.asarray(means, dtype=float)[:, np.newaxis]
+    sigmas = np.asarray(sigmas, dtype=float)
+    if sigmas.ndim == 1:
+        sigmas = sigmas[:, np.newaxis]
+    return data[:, 1] * ndis_std(data[:, 0], means, sigmas)
+
+
+def full_spectrum_index(index, length):
+    """
+    Position in the output of rfft for positions of full FFT of real data (which is symmetric).
+    :param index: Positions in the full FFT output
+    :param length: Length of the data
+    :return: Positions in the rfft output
+    """
+    return np.minimum(index, length - index)
+
+
+def make_grid(xvals, yvals, intdat):
+    """
+    Flatten grid of intensities to columns.
+    :param xvals: Values along the first axis of intdat
+    :param yvals: Values along the second axis of intdat
+    :param intdat: Intensities
+    :return: Array (x, y, intensity)
+    """
+    xgrid, ygrid = np.meshgrid(xvals, yvals, indexing="ij")
+    return np.transpose([np.ravel(xgrid), np.ravel(ygrid), np.ravel(intdat)])
+
+
 def win_fft_grid(rawdata, binsize, wbin, window_fwhm, diffrange):
+    """
+    Grid of double FFT (as in windowed_fft) of the data windowed at a series of m/z values.
+    All windows are transformed at once along one axis.
+    :param rawdata: Data array (N x 2)
+    :param binsize: Bin size for linearization
+    :param wbin: Spacing of the window centres
+    :param window_fwhm: Width (standard deviation) of the windows
+    :param diffrange: Range of the second FFT to keep
+    :return: Grid (window centre, difference, intensity)
+    """
     # Prepare data
     mindat = np.amin(rawdata[:, 0])
     maxdat = np.amax(rawdata[:, 0])
 
     mzdata = linearize(rawdata, binsize, 3)
     mzdata = pad_two_power(mzdata)
+    length = len(mzdata)
 
     xvals = np.arange(mindat, maxdat, wbin)
 
-    results = np.array([windowed_fft(mzdata, x, window_fwhm, diffrange=diffrange)[1] for x in xvals])
+    # Axes of the first and second FFT as in double_fft_diff
+    fvals = fftpack.fftfreq(length, d=mzdata[1, 0] - mzdata[0, 0])
+    fvals2 = fftpack.fftfreq(length, d=fvals[1] - fvals[0])
+    index = np.flatnonzero(np.logical_and(fvals2 < diffrange[1], fvals2 > diffrange[0]))
+    rindex = full_spectrum_index(index, length)
 
-    intdat = results[:, :, 1]
-    yvals = np.unique(results[:, :, 0])
-    xgrid, ygrid = np.meshgrid(xvals, yvals, indexing="ij")
-    out = np.transpose([np.ravel(xgrid), np.ravel(ygrid), np.ravel(intdat)])
-    return out
+    intdat = np.zeros((len(xvals), len(index)))
+    for chunk in window_chunks(len(xvals), length):
+        fftdat = np.abs(np.fft.rfft(windowed_data(mzdata, xvals[chunk], window_fwhm), axis=1))
+        # Magnitude of the full FFT
+        fftdat = np.concatenate((fftdat, fftdat[:, (length - 1) // 2:0:-1]), axis=1)
+        fft2 = np.abs(np.fft.rfft(fftdat, axis=1))
+        fft2 = fft2[:, rindex] / np.amax(fft2, axis=1)[:, np.newaxis]
+        intdat[chunk] = fft2 - np.amin(fft2, axis=1)[:, np.newaxis]
+
+    return make_grid(xvals, np.unique(fvals2[index]), intdat)
 
 
 def win_fft_grid_single(rawdata, binsize, wbin, window_fwhm, diffrange):
+    """
+    Grid of FFT (as in windowed_fft_single) of the data windowed at a series of m/z values.
+    All windows are transformed at once along one axis.
+    :param rawdata: Data array (N x 2)
+    :param binsize: Bin size for linearization
+    :param wbin: Spacing of the window centres
+    :param window_fwhm: Width (standard deviation) of the windows
+    :param diffrange: Range of differences (1 / frequency) to keep
+    :return: Grid (window centre, frequency, intensity)
+    """
     # Prepare data
     mindat = np.amin(rawdata[:, 0])
     maxdat = np.amax(rawdata[:, 0])
 
     mzdata = linearize(rawdata, binsize, 3)
     mzdata = pad_two_power(mzdata)
+    length = len(mzdata)
 
     xvals = np.arange(mindat, maxdat, wbin)
 
-    results = np.array([windowed_fft_single(mzdata, x, window_fwhm, diffrange=diffrange)[1] for x in xvals])
+    # Axis of the FFT as in fft_diff
+    fvals = fftpack.fftfreq(length, d=mzdata[1, 0] - mzdata[0, 0])
+    ftrange = [1. / diffrange[1], 1. / diffrange[0]]
+    index = np.flatnonzero(np.logical_and(fvals < ftrange[1], fvals > ftrange[0]))
+    rindex = full_spectrum_index(index, length)
 
-    intdat = results[:, :, 1]
-    yvals = np.unique(results[:, :, 0])
-    xgrid, ygrid = np.meshgrid(xvals, yvals, indexing="ij")
-    out = np.transpose([np.ravel(xgrid), np.ravel(ygrid), np.ravel(intdat)])
-    return out
+    intdat = np.zeros((len(xvals), len(index)))
+    for chunk in window_chunks(len(xvals), length):
+        fftdat = np.abs(np.fft.rfft(windowed_data(mzdata, xvals[chunk], window_fwhm), axis=1))
+        fftdat = fftdat[:, rindex] / np.amax(fftdat, axis=1)[:, np.newaxis]
+        intdat[chunk] = fftdat - np.amin(fftdat, axis=1)[:, np.newaxis]
+
+    return make_grid(xvals, np.unique(fvals[index]), intdat)
 
 
 def win_fft_diff(rawdata, binsize=0.05, sigma=1000, diffrange=None):
@@ -1961,22 +2184,44 @@ def windowed_autocorr(data, mean, sigma, diffrange=None):
 
 
 def win_autocorr_grid(rawdata, binsize, wbin, window_fwhm, diffrange):
+    """
+    Grid of autocorrelation (as in windowed_autocorr) of the data windowed at a series of m/z values.
+    The width of each window is proportional to its centre. All windows are correlated at once with FFT.
+    :param rawdata: Data array (N x 2)
+    :param binsize: Bin size for linearization
+    :param wbin: Spacing of the window centres
+    :param window_fwhm: Width (standard deviation) of the windows relative to their centres
+    :param diffrange: Range of the shifts to keep
+    :return: Grid (window centre, shift, intensity)
+    """
     # Prepare data
     mindat = np.amin(rawdata[:, 0])
     maxdat = np.amax(rawdata[:, 0])
 
     mzdata = linearize(rawdata, binsize, 3)
     mzdata = pad_two_power(mzdata)
+    length = len(mzdata)
 
     xvals = np.arange(mindat, maxdat, wbin)
 
-    results = np.array([windowed_autocorr(mzdata, x, x * window_fwhm, diffrange=diffrange)[1] for x in xvals])
-
-    intdat = results[:, :, 1]
-    yvals = np.unique(results[:, :, 0])
-    xgrid, ygrid = np.meshgrid(xvals, yvals, indexing="ij")
-    out = np.transpose([np.ravel(xgrid), np.ravel(ygrid), np.ravel(intdat)])
-    return out
+    # Shifts of the autocorrelation as in autocorr (same length as the data, zero shift at length / 2)
+    # Median spacing is not affected by the join of the padding
+    xdiff = np.median(np.diff(mzdata[:, 0]))
+    shifts = np.arange(-(length / 2), length - length / 2)
+    corrx = shifts * xdiff
+    boo1 = np.logical_and(corrx >= diffrange[0], corrx < diffrange[1])
+    # Padded to avoid circular correlation
+    nfft = 2 * length
+    index = shifts[boo1] % nfft
+
+    intdat = np.zeros((len(xvals), len(index)))
+    for chunk in window_chunks(len(xvals), nfft):
+        ftdat = np.fft.rfft(windowed_data(mzdata, xvals[chunk], xvals[chunk] * window_fwhm), n=nfft, axis=1)
+        corry = np.fft.irfft(ftdat.real ** 2 + ftdat.imag ** 2, n=nfft, axis=1)
+        # Maximum is at zero shift
+        intdat[chunk] = corry[:, index] / corry[:, 0][:, np.newaxis]
+
+    return make_grid(xvals, np.unique(corrx[boo1]), intdat)
 
 
 def correlation_integration(dat1, dat2, alpha=0.01, plot_corr=False, **kwargs):